@@ -0,0 +1,143 @@
+import asyncio
+import socket
+import time
+
+from eventlog import get_logger
+from outbox import AsyncOutbox
+from protocol import JSON_CODEC, FrameDecoder, RECV_CHUNK_SIZE
+from server import GameServer
+
+log = get_logger('async_server')
+
+
+class AsyncGameServer(GameServer):
+    """
+    Сервер Дурак на asyncio.
+    Один потік з подієвою петлею обслуговує всі з'єднання замість потоку на клієнта,
+    тому процес тримає десятки тисяч неактивних гравців без витрат на стеки потоків.
+    Логіка обробки повідомлень (process_message, handle_join, create_game, ...)
+    успадкована від GameServer без змін: роль сокета клієнта виконує asyncio.StreamWriter.
+    """
+
+    def __init__(self, host='localhost', port=12345, **options):
+        super().__init__(host, port, **options)
+        self.loop = None
+        self.stop_event = None
+
+    def start(self):
+        """Запуск подієвої петлі сервера"""
+        try:
+            asyncio.run(self.serve())
+        except Exception as e:
+            log.exception('server_crashed', "Критична помилка сервера: {error}", error=str(e))
+        finally:
+            self.running = False
+
+    async def serve(self):
+        """Основна корутина: приймає підключення до сигналу зупинки"""
+        self.loop = asyncio.get_running_loop()
+        self.stop_event = asyncio.Event()
+
+        self.socket.bind((self.host, self.port))
+        self.socket.listen(self.backlog)
+        self.socket.setblocking(False)
+
+        # start_server повторно викликає listen(backlog) і приймає до backlog підключень за одне пробудження
+        # (accept_batch тут не потрібен); без параметра черга ядра скоротилася б до 100
+        server = await asyncio.start_server(self.handle_connection, sock=self.socket, backlog=self.backlog)
+        log.info('server_started', "🎮 Сервер Дурак (asyncio) запущено на {host}:{port}. Очікуємо підключення гравців...",
+                 host=self.host, port=self.port)
+        self.restore_checkpoint()
+        self.start_timers()
+
+        try:
+            async with server:
+                await self.stop_event.wait()
+        finally:
+            self.cleanup()
+            # Даємо транспортам шанс відправити повідомлення про зупинку
+            await asyncio.sleep(0)
+
+    async def handle_connection(self, reader, writer):
+        """Обробка підключення клієнта (аналог GameServer.handle_client)"""
+        addr = writer.get_extra_info('peername')
+        sock = writer.get_extra_info('socket')
+        if sock is not None:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+        self.total_connections += 1
+        self.connections_counter.inc()
+        if self.max_clients and len(self.sessions) >= self.max_clients:
+            self.reject_connection(writer, addr)
+            return
+        client_id = self.client_ids.next_id()
+        log.debug('client_connected', "📱 Новий клієнт підключився: {addr} (ID: {client_id}, Загалом: {total})",
+                  addr=addr, client_id=client_id, total=self.total_connections)
+
+        decoder = FrameDecoder(self.max_frame_size)
+        session = self.open_session(writer, addr)
+
+        try:
+            while self.running:
+                data = await reader.read(RECV_CHUNK_SIZE)
+                if not data:
+                    log.debug('client_closed', "📤 Клієнт {addr} закрив з'єднання", addr=addr)
+                    break
+                session['last_activity'] = time.monotonic()
+
+                decoder.feed(data)
+                if not self.handle_frames(writer, decoder, addr):
+                    break
+
+        except (ConnectionError, OSError) as e:
+            log.info('socket_error', "🔌 Помилка сокета з клієнтом {addr}: {error}", addr=addr, error=str(e))
+        except Exception as e:
+            log.exception('handler_crashed', "💥 Необроблена помилка з клієнтом {addr}: {error}", addr=addr, error=str(e))
+        finally:
+            self.disconnect_client(writer, addr)
+
+    def start_timers(self):
+        """Колесо таймерів просувається самою петлею - колбеки виконуються в її потоці"""
+        self.loop.create_task(self.run_timers())
+        self.deck_pool.start()
+        if self.journal is not None:
+            self.journal.start()
+        if self.checkpoint is not None:
+            self.checkpoint.start()
+
+    async def run_timers(self):
+        while self.running:
+            await asyncio.sleep(self.timers.tick)
+            self.timers.advance()
+
+    def reap_session(self, client_socket):
+        """Обриває транспорт; reader.read() поверне кінець потоку"""
+        client_socket.transport.abort()
+
+    def reject_connection(self, client_socket, addr):
+        """Відповідь server_busy та закриття з'єднання (аналог GameServer.reject_connection)"""
+        self.connections_rejected.inc()
+        log.debug('client_rejected', "🚧 Сервер переповнений - відхилено підключення {addr}", addr=addr)
+        client_socket.write(JSON_CODEC.encode(self.busy_message()))
+        client_socket.write_eof()
+        self.timers.schedule(1.0, client_socket.close)
+
+    def close_client(self, client_socket):
+        """Транспорт дописує буфер і закриває з'єднання сам"""
+        client_socket.close()
+
+    def create_outbox(self, client_socket):
+        """Черга поверх буфера транспорту: дописує його сама петля"""
+        return AsyncOutbox(client_socket, self.loop, self.outbound_high_water,
+                           self.outbound_policy, self.outbound_overflow)
+
+    def stop(self):
+        """Зупинка сервера (безпечно викликати з іншого потоку)"""
+        log.info('server_stopping', "🛑 Отримано сигнал зупинки сервера...")
+        self.running = False
+        if self.loop and self.stop_event and not self.loop.is_closed():
+            try:
+                self.loop.call_soon_threadsafe(self.stop_event.set)
+            except RuntimeError:
+                # Петля вже завершилась
+                pass
@@ -1,15 +1,15 @@
 import pygame
 from pygame.locals import *
-from random import shuffle
-from constants import *
 from math import ceil, floor
 
-class Card:
-    def __init__(self, rank, suit):
-        self.rank = rank
-        self.suit = suit
-        self.uber = False
+import game_model
+
 
+class Card(game_model.Card):
+    """Карта клієнта: модель з game_model плюс зображення та стан анімації"""
+
+    def __init__(self, rank, suit):
+        super().__init__(rank, suit)
 
         # current and goal vars for animation
         self.regular_card_factor = 0.8
@@ -86,77 +86,8 @@ class Card:
         self.front_image = pygame.transform.smoothscale(self.front_image, (new_width, new_height))
         self.current_image = self.back_image
 
-    def __str__(self):
-        if self.suit != self.uber:
-            return "{} of {}".format(self.rank, self.suit)
-        else:
-            return "{} of {}-->".format(self.rank, self.suit)
-
-    def __gt__(self, other):
-        # self > other
-        # Needs to be tested
-        if self.uber and other.uber:
-            return self.rank > other.rank
-        elif self.uber and not other.uber:
-            return True
-        elif not self.uber and other.uber:
-            return False
-        elif self.suit == other.suit:
-            return self.rank > other.rank
-        else:
-            print("Incorrectly comparing two cards")
-            return None
-
-    def to_dict(self):
-        """Серіалізація карти для передачі по мережі"""
-        return {
-            'rank': self.rank,
-            'suit': self.suit,
-            'is_trump': self.uber == self.suit
-        }
-
-    @classmethod
-    def from_dict(cls, data, trump_suit=None):
-        """Десеріалізація карти з мережевих даних"""
-        card = cls(data['rank'], data['suit'])
-        if trump_suit:
-            card.uber = trump_suit
-        elif data.get('is_trump', False):
-            card.uber = card.suit
-        return card
-
-class Deck:
-    def __init__(self):
-        self.suits = ['Spades', 'Hearts', 'Diamonds', 'Clubs']
-        self.ranks = list(range(2, 15))
-        self.cards_list = []
-        self.uber = None
-        self.top_card = None
-        self.build()
-
-    def build(self):
-        for s in self.suits:
-            for r in self.ranks:
-                self.cards_list.append(Card(r, s))
-        self.shuffle()
-        self.flip_top_card()
-
-    def flip_top_card(self):
-        # To be called at the start of the game, before cards are dealt
-        self.top_card = self.pop()
-        self.uber = self.top_card.suit
-        for c in self.cards_list:
-            c.uber = self.uber
-        self.cards_list.insert(0, self.top_card)
-
-    def shuffle(self):
-        shuffle(self.cards_list)
-
-    def pop(self):
-        return self.cards_list.pop()
-
-    def __len__(self):
-        return len(self.cards_list)
-
-    def __str__(self):
-        return "Deck has {} cards left".format(len(self.cards_list))
+
+class Deck(game_model.Deck):
+    """Колода карт з зображеннями"""
+    __slots__ = ()
+    card_class = Card
@@ -0,0 +1,155 @@
+"""
+Компактні набори карт на основі бітової маски.
+Біт cid (0..51, див. protocol.card_id) встановлено, якщо карта є в наборі.
+Масті займають послідовні 13-бітні блоки, тому запити на кшталт
+"карти масті X, старші за ранг R" чи "ранги на столі" - кілька бітових операцій.
+"""
+from constants import SUITS, RANKS
+
+RANK_COUNT = len(RANKS)
+CARD_COUNT = len(SUITS) * RANK_COUNT
+FULL_SUIT = (1 << RANK_COUNT) - 1
+FULL_DECK = (1 << CARD_COUNT) - 1
+
+# Множник, що копіює 13-бітну маску рангів у кожну масть
+_SPREAD = sum(1 << (suit_index * RANK_COUNT) for suit_index in range(len(SUITS)))
+
+SUIT_MASKS = tuple(FULL_SUIT << (suit_index * RANK_COUNT) for suit_index in range(len(SUITS)))
+CARD_BITS = tuple(1 << cid for cid in range(CARD_COUNT))
+
+
+def _above_mask(cid):
+    suit_index, rank_index = divmod(cid, RANK_COUNT)
+    return (FULL_SUIT & ~((1 << (rank_index + 1)) - 1)) << (suit_index * RANK_COUNT)
+
+
+# Карти тієї ж масті, старші за дану
+ABOVE_MASKS = tuple(_above_mask(cid) for cid in range(CARD_COUNT))
+
+# BEATERS[trump_index][cid] - маска карт, що б'ють cid при даному козирі
+BEATERS = tuple(
+    tuple(ABOVE_MASKS[cid] | (SUIT_MASKS[trump_index] if cid // RANK_COUNT != trump_index else 0)
+          for cid in range(CARD_COUNT))
+    for trump_index in range(len(SUITS))
+)
+
+
+def rank_bits(mask):
+    """13-бітна маска рангів, присутніх у наборі (незалежно від масті)"""
+    return (mask | (mask >> RANK_COUNT) | (mask >> (2 * RANK_COUNT)) | (mask >> (3 * RANK_COUNT))) & FULL_SUIT
+
+
+def cards_of_ranks(ranks):
+    """Маска всіх карт з рангами з 13-бітної маски рангів"""
+    return ranks * _SPREAD
+
+
+def lowest(mask):
+    """Ідентифікатор наймолодшої (за номером) карти набору; -1 для порожнього"""
+    return (mask & -mask).bit_length() - 1
+
+
+def iter_ids(mask):
+    """Ідентифікатори карт набору за зростанням"""
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+def mask_of(card_ids):
+    """Маска набору з ідентифікаторів карт"""
+    mask = 0
+    for cid in card_ids:
+        mask |= 1 << cid
+    return mask
+
+
+class CardSet:
+    """
+    Набір карт у вигляді бітової маски.
+    Методи add/discard/update змінюють набір на місці; оператори повертають новий набір.
+    """
+    __slots__ = ('mask',)
+
+    def __init__(self, mask=0):
+        self.mask = mask
+
+    @classmethod
+    def from_ids(cls, card_ids):
+        return cls(mask_of(card_ids))
+
+    def add(self, cid):
+        self.mask |= 1 << cid
+
+    def discard(self, cid):
+        self.mask &= ~(1 << cid)
+
+    def remove(self, cid):
+        bit = 1 << cid
+        if not self.mask & bit:
+            raise KeyError(cid)
+        self.mask ^= bit
+
+    def update(self, other_mask):
+        """Додає всі карти з маски"""
+        self.mask |= other_mask
+
+    def clear(self):
+        self.mask = 0
+
+    def of_suit_above(self, suit_index, rank):
+        """Карти масті suit_index, старші за rank"""
+        rank_index = rank - RANKS[0]
+        return CardSet(self.mask & ABOVE_MASKS[suit_index * RANK_COUNT + rank_index])
+
+    def of_suit(self, suit_index):
+        return CardSet(self.mask & SUIT_MASKS[suit_index])
+
+    def ranks(self):
+        """13-бітна маска рангів у наборі"""
+        return rank_bits(self.mask)
+
+    def with_ranks(self, ranks):
+        """Карти набору з рангами з маски рангів"""
+        return CardSet(self.mask & cards_of_ranks(ranks))
+
+    def beaters_of(self, cid, trump_index):
+        """Карти набору, що б'ють cid"""
+        return CardSet(self.mask & BEATERS[trump_index][cid])
+
+    def ids(self):
+        return list(iter_ids(self.mask))
+
+    def copy(self):
+        return CardSet(self.mask)
+
+    def __contains__(self, cid):
+        return (self.mask >> cid) & 1 == 1
+
+    def __len__(self):
+        return self.mask.bit_count()
+
+    def __bool__(self):
+        return self.mask != 0
+
+    def __iter__(self):
+        return iter_ids(self.mask)
+
+    def __or__(self, other):
+        return CardSet(self.mask | other.mask)
+
+    def __and__(self, other):
+        return CardSet(self.mask & other.mask)
+
+    def __sub__(self, other):
+        return CardSet(self.mask & ~other.mask)
+
+    def __eq__(self, other):
+        return isinstance(other, CardSet) and self.mask == other.mask
+
+    def __hash__(self):
+        return hash(self.mask)
+
+    def __repr__(self):
+        return f"CardSet({self.ids()})"
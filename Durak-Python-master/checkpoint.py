@@ -0,0 +1,283 @@
+"""
+Контрольні точки стану сервера: перезапуск без втрати ігор.
+Файл відображено в пам'ять (mmap) і поділено на слоти по SLOT_SIZE байтів; кожна гра та
+кожен гравець займає власний слот. Фоновий потік раз на interval переписує лише слоти
+записів, що змінилися з минулого проходу (звільнені слоти позначаються вільними), і
+скидає сторінки на диск (msync). Після перезапуску load() читає всі слоти за кілька
+мілісекунд, а гравці відновлюють сесії своїми токенами (див. replay.py).
+
+Кожен слот має контрольну суму, тож слот, запис якого обірвало падіння ОС, відкидається.
+"""
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+
+from eventlog import get_logger
+from rules import DurakGame
+
+log = get_logger('checkpoint')
+
+CHECKPOINT_MAGIC = b'DURAKCP\0'
+CHECKPOINT_VERSION = 1
+SLOT_SIZE = 256
+INITIAL_SLOTS = 1024
+DEFAULT_CHECKPOINT_INTERVAL = 1.0
+# Клієнт міг отримати кадри, новіші за контрольну точку: нумерація кадрів відновленого гравця
+# продовжується з запасом, і замість відтворення пропущених кадрів він отримує повний знімок стану
+RESTORED_MSEQ_GAP = 1 << 20
+
+# Заголовок у нульовому слоті: magic, версія, розмір слота, кількість слотів, час запису
+HEADER = struct.Struct('<8sIIId')
+# Слот: тип запису, crc32 вмісту, далі вміст
+SLOT_HEADER = struct.Struct('<BI')
+FREE_RECORD, GAME_RECORD, PLAYER_RECORD = 0, 1, 2
+
+# id гри, стан, козир, колода, руки, відбій, стіл (пари карт), нападник, ліміт розіграшу,
+# завершено, дурень, версія стану, ходів, час створення, зерно колоди, id гравців на місцях
+GAME = struct.Struct('<32pBB53pQQQ13pBBBBIIdQQQ')
+# id, ім'я, токен сесії, формат кадрів, id гри, місце, останній mseq, час приєднання
+PLAYER = struct.Struct('<Q64p32p16p32pBQd')
+GAME_STATES = ('waiting', 'dealing', 'playing', 'finished')
+NONE = 0xFF
+
+
+class DetachedSocket:
+    """Заглушка сокета відновленого гравця, доки він не перепідключиться"""
+    __slots__ = ('token',)
+
+    def __init__(self, token):
+        self.token = token
+
+    def shutdown(self, how):
+        pass
+
+    def close(self):
+        pass
+
+    def __repr__(self):
+        return f"DetachedSocket({self.token[:6]}...)"
+
+
+def _text(value, size):
+    """Рядок для поля 'p' розміру size (обрізається по межі символу UTF-8)"""
+    return value.encode()[:size - 1].decode(errors='ignore').encode()
+
+
+def pack_game(game, player_ids):
+    """Вміст слота гри; player_ids - id гравців на місцях 0 та 1"""
+    rules = game['rules']
+    table = bytearray()
+    for attack, defense in rules.table:
+        table += bytes((attack, NONE if defense is None else defense))
+    return GAME.pack(
+        _text(game['id'], 32), GAME_STATES.index(game['state']), rules.trump_card, bytes(rules.deck),
+        rules.hands[0].mask, rules.hands[1].mask, rules.discard.mask, bytes(table),
+        rules.attacker, rules.bout_limit, rules.finished, NONE if rules.loser is None else rules.loser,
+        game['seq'], game['moves'], game['created_time'], game.get('deck_seed') or 0, *player_ids)
+
+
+def pack_player(player_data):
+    position = player_data.get('position') if player_data.get('game_id') else None
+    return PLAYER.pack(
+        player_data['id'], _text(player_data['name'], 64), player_data['resume_token'].encode(),
+        player_data['codec'].name.encode(), _text(player_data.get('game_id') or '', 32),
+        NONE if position is None else position, player_data['replay'].last_seq, player_data['join_time'])
+
+
+def unpack_game(payload):
+    """Словник полів гри з відновленими правилами ('rules')"""
+    (game_id, state, trump_card, deck, hand0, hand1, discard, table, attacker, bout_limit,
+     finished, loser, seq, moves, created_time, deck_seed, player0, player1) = GAME.unpack(payload)
+
+    pairs = [(table[index], None if table[index + 1] == NONE else table[index + 1])
+             for index in range(0, len(table), 2)]
+    rules = DurakGame.from_state(trump_card, deck, attacker, (hand0, hand1), discard, pairs, bout_limit,
+                                 bool(finished), None if loser == NONE else loser)
+
+    return {
+        'id': game_id.decode(),
+        'state': GAME_STATES[state],
+        'rules': rules,
+        'seq': seq,
+        'moves': moves,
+        'created_time': created_time,
+        'deck_seed': deck_seed,
+        'player_ids': (player0, player1)
+    }
+
+
+def unpack_player(payload):
+    player_id, name, token, codec, game_id, position, mseq, join_time = PLAYER.unpack(payload)
+    return {
+        'id': player_id,
+        'name': name.decode(errors='replace'),
+        'resume_token': token.decode(),
+        'codec': codec.decode(),
+        'game_id': game_id.decode() or None,
+        'position': None if position == NONE else position,
+        'mseq': mseq,
+        'join_time': join_time
+    }
+
+
+class Checkpoint:
+    """
+    Файл контрольної точки.
+    collect() повертає записи поточного стану: (ключ, відбиток, pack), де pack() -> (тип, вміст);
+    слот переписується лише тоді, коли відбиток запису змінився.
+    on_write(секунд) викликається після кожного проходу, що щось записав.
+    """
+
+    def __init__(self, path, collect, interval=DEFAULT_CHECKPOINT_INTERVAL, on_write=None):
+        self.path = path
+        self.collect = collect
+        self.interval = interval
+        self.on_write = on_write
+        self.lock = threading.Lock()  # Прохід запису: фоновий потік або close()
+        self.stopped = threading.Event()
+        self.slots = {}  # {ключ: [слот, відбиток]}
+        self.thread = None
+
+        self.file = open(path, 'r+b' if os.path.exists(path) else 'w+b')
+        self.slot_count = self._read_slot_count()
+        if self.slot_count is None:
+            self.slot_count = INITIAL_SLOTS
+            self.file.truncate(0)
+            self.file.truncate((self.slot_count + 1) * SLOT_SIZE)
+        self.map = mmap.mmap(self.file.fileno(), (self.slot_count + 1) * SLOT_SIZE)
+        self.free = list(range(self.slot_count, 0, -1))  # Вільні слоти, найменший - в кінці
+        self._write_header()
+
+    def _read_slot_count(self):
+        """Кількість слотів наявного файлу; None - файл новий або не є контрольною точкою"""
+        size = os.fstat(self.file.fileno()).st_size
+        if size < SLOT_SIZE:
+            return None
+        self.file.seek(0)
+        magic, version, slot_size, slot_count, _ = HEADER.unpack(self.file.read(HEADER.size))
+        if (magic != CHECKPOINT_MAGIC or version != CHECKPOINT_VERSION or slot_size != SLOT_SIZE
+                or size < (slot_count + 1) * SLOT_SIZE):
+            log.warning('checkpoint_invalid', "⚠️ {path} не є контрольною точкою сервера - буде перезаписаний",
+                        path=self.path)
+            return None
+        return slot_count
+
+    def _write_header(self):
+        self.map[:HEADER.size] = HEADER.pack(CHECKPOINT_MAGIC, CHECKPOINT_VERSION, SLOT_SIZE, self.slot_count,
+                                             time.time())
+
+    def load(self):
+        """
+        Записи з файлу: список (тип, вміст). Слоти відновлених записів лишаються зайнятими, доки
+        перший прохід не перепише їх (або не звільнить, якщо запису більше немає).
+        """
+        records = []
+        used = set()
+        for slot in range(1, self.slot_count + 1):
+            offset = slot * SLOT_SIZE
+            kind, crc = SLOT_HEADER.unpack_from(self.map, offset)
+            if kind == GAME_RECORD:
+                record = GAME
+            elif kind == PLAYER_RECORD:
+                record = PLAYER
+            else:
+                continue
+            start = offset + SLOT_HEADER.size
+            payload = self.map[start:start + record.size]
+            if zlib.crc32(payload) != crc:
+                log.warning('checkpoint_slot_corrupt', "⚠️ Пошкоджений слот {slot} контрольної точки", slot=slot)
+                continue
+            # Ключ - id гри або токен гравця (перше текстове поле)
+            key = (kind, record.unpack(payload)[0 if kind == GAME_RECORD else 2].decode())
+            self.slots[key] = [slot, None]
+            used.add(slot)
+            records.append((kind, payload))
+        self.free = [slot for slot in range(self.slot_count, 0, -1) if slot not in used]
+        return records
+
+    def write(self):
+        """Один прохід: змінені записи у свої слоти, зниклі - звільнити. Повертає кількість змінених слотів"""
+        with self.lock:
+            if self.map.closed:
+                return 0
+            started = time.perf_counter()
+            changed = 0
+            seen = set()
+            for key, stamp, pack in self.collect():
+                seen.add(key)
+                slot = self.slots.get(key)
+                if slot is not None and slot[1] == stamp:
+                    continue
+                kind, payload = pack()
+                if slot is None:
+                    slot = self.slots[key] = [self._allocate(), stamp]
+                else:
+                    slot[1] = stamp
+                self._write_slot(slot[0], kind, payload)
+                changed += 1
+
+            for key in [key for key in self.slots if key not in seen]:
+                slot = self.slots.pop(key)[0]
+                self._write_slot(slot, FREE_RECORD, b'')
+                self.free.append(slot)
+                changed += 1
+
+            if changed:
+                self._write_header()
+                self.map.flush()
+                if self.on_write is not None:
+                    self.on_write(time.perf_counter() - started)
+            return changed
+
+    def _write_slot(self, slot, kind, payload):
+        offset = slot * SLOT_SIZE
+        start = offset + SLOT_HEADER.size
+        self.map[start:start + len(payload)] = payload
+        self.map[offset:start] = SLOT_HEADER.pack(kind, zlib.crc32(payload))
+
+    def _allocate(self):
+        if not self.free:
+            self._grow()
+        return self.free.pop()
+
+    def _grow(self):
+        """Подвоєння кількості слотів"""
+        old_count = self.slot_count
+        self.slot_count *= 2
+        self.map.flush()
+        self.map.close()
+        self.file.truncate((self.slot_count + 1) * SLOT_SIZE)
+        self.map = mmap.mmap(self.file.fileno(), (self.slot_count + 1) * SLOT_SIZE)
+        self.free.extend(range(self.slot_count, old_count, -1))
+        self._write_header()
+
+    def start(self):
+        """Запуск фонового потоку контрольних точок"""
+        if self.thread is not None:
+            return
+        self.thread = threading.Thread(target=self.run)
+        self.thread.daemon = True
+        self.thread.start()
+        log.info('checkpoint_started', "💾 Контрольна точка: {path} (кожні {interval} с)",
+                 path=self.path, interval=self.interval)
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            try:
+                self.write()
+            except Exception as e:
+                log.exception('checkpoint_failed', "❌ Помилка запису контрольної точки: {error}", error=str(e))
+
+    def close(self):
+        """Останній прохід (стан на момент зупинки) та закриття файлу"""
+        self.stopped.set()
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join(timeout=5)
+        changed = self.write()
+        with self.lock:
+            self.map.close()
+            self.file.close()
+        return changed
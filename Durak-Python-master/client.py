@@ -1,9 +1,16 @@
 import socket
 import threading
-import json
 import queue
 import time
 
+from eventlog import get_logger
+from protocol import CODECS, JSON_CODEC, FrameDecoder, FrameTooLarge, decode_frame
+from state_sync import apply_delta, apply_snapshot
+
+log = get_logger('client')
+
+SYNC_RETRY_INTERVAL = 1.0  # Сервер мовчки відкидає запити понад ліміт - повторюємо запит знімка
+
 
 class GameClient:
     def __init__(self, host='localhost', port=12345):
@@ -15,6 +22,10 @@ class GameClient:
         # Черга для повідомлень від сервера
         self.message_queue = queue.Queue()
 
+        # Формат кадрів: до підтвердження сервером - JSON
+        self.supported_codecs = list(CODECS)
+        self.codec = JSON_CODEC
+
         # Дані гравця
         self.player_id = None
         self.player_name = None
@@ -29,15 +40,32 @@ class GameClient:
         self.deck_size = 0
         self.is_attacker = False
         self.attacker_name = None
+        self.table = []  # [[атакуюча карта, карта захисту або None], ...]
+        self.opponent_hand_size = 0
+        self.game_result = None
+        self.seq = None  # Версія стану гри, до якої застосовано дельти
+        self.sync_pending = False  # Час надсилання запиту повного знімка (False - запиту немає)
 
         # Потік для отримання повідомлень
         self.receive_thread = None
         self.running = False
 
+        # Серцебиття: клієнт сам пінгує сервер після тиші, щоб його не вважали мертвим
+        self.heartbeat_interval = 15
+        self.last_sent = 0.0
+        self.send_lock = threading.Lock()
+
+        # Відновлення сесії після обриву зв'язку: токен з join_success та номер останнього кадру
+        self.resume_token = None
+        self.last_mseq = 0
+        self.resume_window = 30  # Скільки секунд пробувати перепідключитися
+        self.reconnecting = False
+
         # Статистика підключення
         self.connection_attempts = 0
         self.max_connection_attempts = 3
         self.last_error = None
+        self.retry_after = None  # Підказка server_busy: через скільки секунд повторити підключення
 
     def connect(self, player_name="Player", host=None, port=None):
         """Підключення до сервера з коротшим таймаутом"""
@@ -51,14 +79,19 @@ class GameClient:
         while self.connection_attempts < self.max_connection_attempts:
             try:
                 self.connection_attempts += 1
-                print(
-                    f"Спроба підключення {self.connection_attempts}/{self.max_connection_attempts} до {self.host}:{self.port}")
+                log.info('connect_attempt', "Спроба підключення {attempt}/{attempts} до {host}:{port}",
+                         attempt=self.connection_attempts, attempts=self.max_connection_attempts,
+                         host=self.host, port=self.port)
 
                 self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
                 self.socket.settimeout(5)  # Коротший таймаут - 5 секунд
                 self.socket.connect((self.host, self.port))
                 self.connected = True
                 self.player_name = player_name
+                self.codec = JSON_CODEC
+                self.resume_token = None
+                self.last_mseq = 0
+                self.retry_after = None
 
                 # Запускаємо потік для отримання повідомлень
                 self.running = True
@@ -69,26 +102,27 @@ class GameClient:
                 # Відправляємо запит на підключення
                 join_message = {
                     'type': 'join',
-                    'name': player_name
+                    'name': player_name,
+                    'codecs': self.supported_codecs
                 }
                 self.send_message(join_message)
 
-                print(f"Успішно підключено до сервера як {player_name}")
+                log.info('connected', "Успішно підключено до сервера як {name}", name=player_name)
                 self.last_error = None
                 return True
 
             except socket.timeout:
                 self.last_error = "Таймаут підключення"
-                print(f"Таймаут підключення до {self.host}:{self.port}")
+                log.warning('connect_timeout', "Таймаут підключення до {host}:{port}", host=self.host, port=self.port)
             except ConnectionRefusedError:
                 self.last_error = "Сервер відхилив підключення"
-                print(f"Сервер {self.host}:{self.port} відхилив підключення")
+                log.warning('connect_refused', "Сервер {host}:{port} відхилив підключення", host=self.host, port=self.port)
             except socket.gaierror:
                 self.last_error = "Невірна адреса сервера"
-                print(f"Не вдалося знайти сервер {self.host}")
+                log.warning('connect_bad_host', "Не вдалося знайти сервер {host}", host=self.host)
             except Exception as e:
                 self.last_error = str(e)
-                print(f"Помилка підключення: {e}")
+                log.warning('connect_failed', "Помилка підключення: {error}", error=str(e))
 
             # Закриваємо сокет при невдалому підключенні
             if self.socket:
@@ -101,27 +135,26 @@ class GameClient:
             self.connected = False
 
             if self.connection_attempts < self.max_connection_attempts:
-                print("Очікування перед наступною спробою...")
                 time.sleep(1)  # Коротша затримка - 1 секунда
 
-        print("Вичерпано всі спроби підключення")
+        log.error('connect_gave_up', "Вичерпано всі спроби підключення")
         return False
 
     def disconnect(self):
         """Від'єднання від сервера"""
-        print("Від'єднання від сервера...")
+        log.debug('disconnecting', "Від'єднання від сервера...")
         self.running = False
-        self.connected = False
 
         if self.socket:
             try:
-                # Відправляємо повідомлення про від'єднання
+                # Відправляємо повідомлення про від'єднання - сервер не чекатиме на перепідключення
                 disconnect_message = {
                     'type': 'disconnect'
                 }
                 self.send_message(disconnect_message)
             except:
                 pass
+            self.connected = False
 
             try:
                 self.socket.close()
@@ -135,7 +168,7 @@ class GameClient:
 
         # Очищуємо дані
         self.reset_game_data()
-        print("Від'єднано від сервера")
+        log.info('disconnected', "Від'єднано від сервера")
 
     def reset_game_data(self):
         """Скидає ігрові дані"""
@@ -149,63 +182,152 @@ class GameClient:
         self.deck_size = 0
         self.is_attacker = False
         self.attacker_name = None
+        self.table = []
+        self.opponent_hand_size = 0
+        self.game_result = None
+        self.seq = None
+        self.sync_pending = False
 
     def send_message(self, message):
         """Відправка повідомлення серверу"""
         if not self.connected or not self.socket:
-            print("Немає з'єднання з сервером")
+            log.debug('send_not_connected', "Немає з'єднання з сервером")
             return False
 
         try:
-            json_message = json.dumps(message, ensure_ascii=False)
-            self.socket.send(json_message.encode('utf-8'))
+            with self.send_lock:
+                self.socket.sendall(self.codec.encode(message))
+            self.last_sent = time.monotonic()
             return True
         except BrokenPipeError:
-            print("З'єднання розірвано сервером")
+            log.warning('send_broken_pipe', "З'єднання розірвано сервером")
             self.connected = False
             return False
         except Exception as e:
-            print(f"Помилка відправки: {e}")
+            log.warning('send_failed', "Помилка відправки: {error}", error=str(e))
             self.connected = False
             return False
 
     def receive_messages(self):
-        """Отримання повідомлень від сервера"""
-        buffer = ""
+        """Отримання повідомлень від сервера; після обриву зв'язку - спроба відновити сесію"""
+        while True:
+            self.receive_loop()
+            if not self.running or not self.resume_token or not self.resume_session():
+                break
+
+        self.connected = False
+        log.debug('receiver_stopped', "Потік отримання повідомлень завершено")
+
+    def receive_loop(self):
+        """Читання кадрів з поточного з'єднання, доки воно живе"""
+        decoder = FrameDecoder()
 
         while self.running and self.connected:
             try:
                 self.socket.settimeout(1)  # Таймаут для перевірки self.running
-                data = self.socket.recv(1024).decode('utf-8')
-                if not data:
-                    print("Сервер закрив з'єднання")
+                if not decoder.recv_into(self.socket):
+                    log.info('server_closed', "Сервер закрив з'єднання")
                     break
 
-                buffer += data
-
                 # Обробляємо всі повні повідомлення в буфері
-                while '\n' in buffer:
-                    line, buffer = buffer.split('\n', 1)
-                    if line.strip():
-                        try:
-                            message = json.loads(line.strip())
-                            self.message_queue.put(message)
-                        except json.JSONDecodeError as e:
-                            print(f"Некоректне повідомлення: {line} - {e}")
+                for frame in decoder.frames():
+                    try:
+                        message = decode_frame(frame)
+                        if not isinstance(message, dict):
+                            raise ValueError("повідомлення має бути об'єктом")
+                    except ValueError as e:
+                        log.warning('bad_message', "Некоректне повідомлення: {frame} - {error}", frame=repr(frame), error=str(e))
+                        continue
+
+                    mseq = message.get('mseq')
+                    if mseq is not None:
+                        if mseq <= self.last_mseq:
+                            continue  # Уже отримано до обриву
+                        self.last_mseq = mseq
+
+                    msg_type = message.get('type')
+                    if msg_type == 'join_success' or msg_type == 'resume_success':
+                        # Сервер підтвердив формат - далі відправляємо в ньому
+                        self.codec = CODECS.get(message.get('codec'), JSON_CODEC)
+                        if msg_type == 'join_success':
+                            self.resume_token = message.get('resume_token')
+                    elif msg_type == 'server_busy':
+                        # Сервер переповнений і закриє з'єднання; повторна спроба - не раніше retry_after
+                        self.retry_after = message.get('retry_after')
+                    elif msg_type == 'server_restarting':
+                        # Сервер зберіг стан і зараз перезапуститься - сесію відновимо після паузи
+                        self.retry_after = message.get('retry_after')
+                    elif msg_type == 'resume_failed' or msg_type == 'server_shutdown':
+                        # Сесії на сервері більше немає - відновлювати нічого
+                        self.resume_token = None
+                        if msg_type == 'resume_failed':
+                            self.connected = False
+                    elif msg_type == 'ping':
+                        # Серцебиття обробляємо тут, не чекаючи ігрового циклу
+                        self.send_message({'type': 'pong'})
+                        continue
+                    elif msg_type == 'pong':
+                        continue
+                    self.message_queue.put(message)
 
             except socket.timeout:
-                # Нормальний таймаут для перевірки self.running
+                # Нормальний таймаут для перевірки self.running; заодно серцебиття
+                if time.monotonic() - self.last_sent >= self.heartbeat_interval:
+                    self.ping_server()
                 continue
             except ConnectionResetError:
-                print("З'єднання скинуто сервером")
+                log.warning('connection_reset', "З'єднання скинуто сервером")
+                break
+            except FrameTooLarge as e:
+                log.error('bad_stream', "Некоректний потік від сервера: {error}", error=str(e))
                 break
             except Exception as e:
                 if self.running:
-                    print(f"Помилка отримання даних: {e}")
+                    log.error('receive_failed', "Помилка отримання даних: {error}", error=str(e))
                 break
 
+        # З токеном сесії потік одразу пробує перепідключитися
+        self.reconnecting = bool(self.running and self.resume_token)
         self.connected = False
-        print("Потік отримання повідомлень завершено")
+
+    def resume_session(self):
+        """Перепідключення з токеном сесії. True - нове з'єднання встановлено і запит resume надіслано"""
+        self.reconnecting = True
+        try:
+            if self.socket:
+                try:
+                    self.socket.close()
+                except OSError:
+                    pass
+
+            deadline = time.monotonic() + self.resume_window
+            delay = 0.5
+            while self.running and time.monotonic() < deadline:
+                if self.retry_after:
+                    time.sleep(min(self.retry_after, max(0, deadline - time.monotonic())))
+                    self.retry_after = None
+                    continue
+                log.info('resume_attempt', "Зв'язок втрачено - перепідключення до {host}:{port}...",
+                         host=self.host, port=self.port)
+                try:
+                    self.socket = socket.create_connection((self.host, self.port), timeout=5)
+                except OSError as e:
+                    log.debug('resume_connect_failed', "Не вдалося перепідключитися: {error}", error=str(e))
+                    time.sleep(delay)
+                    delay = min(delay * 2, 4)
+                    continue
+
+                self.connected = True
+                resume_message = {
+                    'type': 'resume',
+                    'token': self.resume_token,
+                    'last_mseq': self.last_mseq
+                }
+                if self.send_message(resume_message):
+                    return True
+            return False
+        finally:
+            self.reconnecting = False
 
     def get_messages(self):
         """Отримання всіх накопичених повідомлень"""
@@ -224,43 +346,111 @@ class GameClient:
         if msg_type == 'join_success':
             self.player_id = message.get('player_id')
             self.player_name = message.get('name')
-            print(f"Успішно підключено! ID: {self.player_id}, Ім'я: {self.player_name}")
+            log.info('joined', "Успішно підключено! ID: {player_id}, Ім'я: {name}",
+                     player_id=self.player_id, name=self.player_name)
 
         elif msg_type == 'game_created':
             self.game_id = message.get('game_id')
             self.position = message.get('position')
             self.opponent_name = message.get('opponent_name')
-            print(f"Гра створена! ID: {self.game_id}, Суперник: {self.opponent_name}")
+            log.info('game_created', "Гра створена! ID: {game_id}, Суперник: {opponent}",
+                     game_id=self.game_id, opponent=self.opponent_name)
+
+        elif msg_type == 'game_start_bundle':
+            # Весь початковий стан гри одним повідомленням
+            self.game_id = message.get('game_id')
+            self.position = message.get('position')
+            self.opponent_name = message.get('opponent_name')
+            self.hand = list(message.get('hand', []))
+            self.opponent_hand_size = len(self.hand)
+            self.table = []
+            self.game_result = None
+            self.trump_card = message.get('trump_card')
+            self.trump_suit = message.get('trump_suit')
+            self.deck_size = message.get('deck_size')
+            self.is_attacker = message.get('is_attacker')
+            self.attacker_name = message.get('attacker_name')
+            self.seq = message.get('seq', 0)
+            self.sync_pending = False
+            log.info('game_started', "Гра почалася! ID: {game_id}, Суперник: {opponent}, Козир: {trump}, Нападник: {attacker}",
+                     game_id=self.game_id, opponent=self.opponent_name, trump=self.trump_suit,
+                     attacker=self.attacker_name)
 
         elif msg_type == 'card_dealt':
             card_data = message.get('card')
             self.hand.append(card_data)
-            print(f"Отримано карту: {card_data['rank']} {card_data['suit']}")
+            log.debug('card_dealt', "Отримано карту: {rank} {suit}", rank=card_data['rank'], suit=card_data['suit'])
 
         elif msg_type == 'trump_card':
             self.trump_card = message.get('card')
             self.trump_suit = message.get('trump_suit')
             self.deck_size = message.get('deck_size')
-            print(f"Козир: {self.trump_suit}, Карт в колоді: {self.deck_size}")
+            log.debug('trump_card', "Козир: {trump}, Карт в колоді: {deck_size}", trump=self.trump_suit, deck_size=self.deck_size)
 
         elif msg_type == 'game_started':
             self.is_attacker = message.get('is_attacker')
             self.attacker_name = message.get('attacker_name')
-            print(f"Гра почалася! Нападник: {self.attacker_name}")
-            if self.is_attacker:
-                print("Ви нападаєте!")
+            log.info('game_started', "Гра почалася! Нападник: {attacker}. {role}", attacker=self.attacker_name,
+                     role="Ви нападаєте!" if self.is_attacker else "Ви захищаєтесь!")
+
+        elif msg_type == 'state_delta':
+            # Лише змінені поля; при пропуску версії просимо повний знімок
+            if not apply_delta(self, message):
+                self.request_sync()
+            elif message.get('bout_over'):
+                log.debug('bout_over', "Розіграш завершено: {result}",
+                          result="карти забрано" if message['bout_over'] == 'taken' else "бито")
+
+        elif msg_type == 'state_snapshot':
+            apply_snapshot(self, message)
+            self.sync_pending = False
+            log.debug('state_resync', "Отримано повний стан гри (версія {seq})", seq=self.seq)
+
+        elif msg_type == 'action_rejected':
+            log.info('action_rejected', "Хід відхилено: {reason}", reason=message.get('message'))
+
+        elif msg_type == 'game_over':
+            self.game_result = message
+            self.game_id = None
+            if message.get('loser') is None:
+                log.info('game_over', "Гру завершено внічию")
+            elif message.get('you_lost'):
+                log.info('game_over', "Ви - дурень!")
             else:
-                print("Ви захищаєтесь!")
+                log.info('game_over', "Ви перемогли! Дурень - {loser}", loser=message.get('loser_name'))
 
         elif msg_type == 'opponent_disconnected':
-            print("Суперник від'єднався")
+            log.info('opponent_disconnected', "Суперник від'єднався")
+
+        elif msg_type == 'opponent_reconnecting':
+            log.info('opponent_reconnecting', "Суперник втратив з'єднання, чекаємо до {grace} с",
+                     grace=message.get('grace'))
+
+        elif msg_type == 'opponent_reconnected':
+            log.info('opponent_reconnected', "Суперник повернувся")
+
+        elif msg_type == 'resume_success':
+            log.info('resumed', "Сесію відновлено, пропущених повідомлень: {replayed}",
+                     replayed=message.get('replayed'))
+
+        elif msg_type == 'resume_failed':
+            self.reset_game_data()
+            log.warning('resume_failed', "Не вдалося відновити сесію: {reason}", reason=message.get('message'))
+
+        elif msg_type == 'server_busy':
+            self.last_error = f"Сервер переповнений, спробуйте через {message.get('retry_after')} с"
+            log.warning('server_busy', "Сервер переповнений, повторна спроба - через {retry_after} с",
+                        retry_after=message.get('retry_after'))
+
+        elif msg_type == 'server_restarting':
+            log.info('server_restarting', "Сервер перезапускається - сесію буде відновлено")
 
         elif msg_type == 'error':
             error_msg = message.get('message', 'Невідома помилка')
-            print(f"Помилка від сервера: {error_msg}")
+            log.warning('server_error', "Помилка від сервера: {error}", error=error_msg)
 
         else:
-            print(f"Невідомий тип повідомлення: {msg_type}")
+            log.warning('unknown_message', "Невідомий тип повідомлення: {msg_type}", msg_type=msg_type)
 
     def send_ready(self):
         """Повідомлення про готовність"""
@@ -278,6 +468,34 @@ class GameClient:
         }
         return self.send_message(message)
 
+    def attack(self, card):
+        """Напад або підкидання карти"""
+        return self.send_game_action('attack', {'card': card})
+
+    def defend(self, card, target=None):
+        """Відбиття карти на столі (target - індекс, за замовчуванням перша неперебита)"""
+        data = {'card': card}
+        if target is not None:
+            data['target'] = target
+        return self.send_game_action('defend', data)
+
+    def request_sync(self):
+        """Запит повного знімка стану гри (один на пропуск версії, повтор - якщо відповіді немає)"""
+        now = time.monotonic()
+        if self.sync_pending and now - self.sync_pending < SYNC_RETRY_INTERVAL:
+            return False
+        self.sync_pending = now
+        log.debug('state_gap', "Пропущено версію стану гри (маємо {seq}) - запит знімка", seq=self.seq)
+        return self.send_message({'type': 'sync_request', 'seq': self.seq})
+
+    def take_cards(self):
+        """Забрати карти зі столу"""
+        return self.send_game_action('take')
+
+    def pass_turn(self):
+        """Бито - завершити розіграш"""
+        return self.send_game_action('pass')
+
     def is_connected(self):
         """Перевірка з'єднання"""
         return self.connected and self.socket is not None
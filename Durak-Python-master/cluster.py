@@ -0,0 +1,585 @@
+"""
+Багатопроцесний режим сервера (run_server.py --workers N).
+N процесів GameServer слухають один порт через SO_REUSEPORT, кожен володіє своїми іграми.
+Легкий координатор у батьківському процесі через локальний Unix-сокет з'єднує гравців,
+які потрапили на різні воркери: сокет гравця, що чекає, передається (SCM_RIGHTS)
+воркеру, де теж чекає самотній гравець.
+Координатор також знає, якому воркеру належить кожен токен сесії: перепідключення,
+яке ядро віддало іншому воркеру, тим самим шляхом передається воркеру-власнику.
+"""
+import json
+import multiprocessing
+import os
+import signal
+import socket
+import tempfile
+import threading
+import time
+import urllib.request
+
+import eventlog
+from metrics import MetricsEndpoint, merge_expositions
+from protocol import CODECS, JSON_CODEC
+from server import GameServer
+
+log = eventlog.get_logger('cluster')
+
+CONTROL_MESSAGE_SIZE = 64 * 1024
+STATS_INTERVAL = 2.0  # Як часто воркер надсилає статистику координатору
+RESTORED_BATCH = 1000  # Токенів в одному повідомленні про відновлені сесії
+RESTORE_WAIT = 10.0  # Скільки після запуску чекати, поки всі воркери відновлять сесії з контрольних точок
+
+
+def _encode(message):
+    return json.dumps(message, ensure_ascii=False).encode('utf-8')
+
+
+def _decode(data):
+    return json.loads(data.decode('utf-8'))
+
+
+class ClusterLink:
+    """Сторона воркера: з'єднання з координатором"""
+
+    def __init__(self, control_path, worker_id):
+        self.control_path = control_path
+        self.worker_id = worker_id
+        self.server = None
+        self.sock = None
+        self.send_lock = threading.Lock()
+        self.last_waiting = None
+        self.reader_thread = None
+
+    def attach(self, server):
+        """Підключення до координатора та запуск потоку читання команд"""
+        self.server = server
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        self.sock.connect(self.control_path)
+        self.sock.settimeout(STATS_INTERVAL)
+        self.send({'op': 'hello', 'worker': self.worker_id, 'pid': os.getpid()})
+
+        self.reader_thread = threading.Thread(target=self.read_commands)
+        self.reader_thread.daemon = True
+        self.reader_thread.start()
+
+    def send(self, message, fds=()):
+        """Відправка повідомлення координатору (з дескрипторами за потреби)"""
+        with self.send_lock:
+            if fds:
+                socket.send_fds(self.sock, [_encode(message)], list(fds))
+            else:
+                self.sock.send(_encode(message))
+
+    def report_waiting(self, count):
+        """Кількість гравців у черзі воркера (надсилається лише при зміні)"""
+        if count == self.last_waiting:
+            return
+        self.last_waiting = count
+        try:
+            self.send({'op': 'waiting', 'count': count})
+        except OSError as e:
+            log.error('coordinator_unavailable', "❌ Координатор недоступний: {error}", error=str(e))
+
+    def report_session(self, token, opened):
+        """Сесію з токеном відкрито (opened) або закрито на цьому воркері"""
+        try:
+            self.send({'op': 'session' if opened else 'session_closed', 'token': token})
+        except OSError as e:
+            log.error('coordinator_unavailable', "❌ Координатор недоступний: {error}", error=str(e))
+
+    def report_restored(self, tokens):
+        """Сесії, відновлені з контрольної точки; 'restored' означає, що воркер оголосив усі"""
+        tokens = list(tokens)
+        try:
+            for start in range(0, len(tokens), RESTORED_BATCH):
+                self.send({'op': 'sessions', 'tokens': tokens[start:start + RESTORED_BATCH]})
+            self.send({'op': 'restored'})
+        except OSError as e:
+            log.error('coordinator_unavailable', "❌ Координатор недоступний: {error}", error=str(e))
+
+    def route_resume(self, client_socket, message, address, pending):
+        """Передає сокет перепідключення з чужим токеном воркеру-власнику через координатора"""
+        self.send({
+            'op': 'resume',
+            'message': {'type': 'resume', 'token': message['token'], 'last_mseq': message.get('last_mseq')},
+            'address': list(address),
+            'pending': pending.hex()
+        }, fds=[client_socket.fileno()])
+
+    def hand_off(self, client_socket, player_data, target_worker, pending):
+        """Передає сокет гравця іншому воркеру через координатора"""
+        player = {
+            'name': player_data['name'],
+            'address': list(player_data['address']),
+            'join_time': player_data['join_time'],
+            'codec': player_data['codec'].name,
+            'resume_token': player_data['resume_token'],
+            'mseq': player_data['replay'].last_seq,
+        }
+        self.send({
+            'op': 'handoff',
+            'to': target_worker,
+            'player': player,
+            'pending': pending.hex()
+        }, fds=[client_socket.fileno()])
+
+    def read_commands(self):
+        """Потік обробки команд координатора"""
+        while self.server.running:
+            try:
+                data, fds, _, _ = socket.recv_fds(self.sock, CONTROL_MESSAGE_SIZE, 1)
+            except socket.timeout:
+                self.send_stats()
+                continue
+            except OSError:
+                break
+
+            if not data:
+                break
+
+            try:
+                self.process_command(_decode(data), fds)
+            except Exception as e:
+                log.exception('command_failed', "❌ Помилка обробки команди координатора: {error}", error=str(e))
+                for fd in fds:
+                    os.close(fd)
+
+        # Без координатора воркер не може працювати в кластері
+        if self.server.running:
+            log.error('coordinator_lost', "🔌 Втрачено зв'язок з координатором")
+            self.server.stop()
+
+    def process_command(self, command, fds):
+        """Виконання команди координатора"""
+        op = command.get('op')
+
+        if op == 'donate':
+            self.last_waiting = None
+            self.server.request_handoff(command['to'])
+            self.server.report_waiting()
+
+        elif op == 'adopt':
+            player = command['player']
+            client_socket = socket.socket(fileno=fds[0])
+            player_data = {
+                'name': player['name'],
+                'address': tuple(player['address']),
+                'join_time': player['join_time'],
+                'codec': CODECS.get(player['codec'], JSON_CODEC),
+                'resume_token': player.get('resume_token'),
+                'mseq': player.get('mseq', 0),
+            }
+            self.server.adopt_client(client_socket, player_data, bytes.fromhex(command.get('pending', '')))
+
+        elif op == 'resume':
+            client_socket = socket.socket(fileno=fds[0])
+            self.server.adopt_resume(client_socket, tuple(command['address']), command['message'],
+                                     bytes.fromhex(command.get('pending', '')))
+
+        elif op == 'shutdown':
+            self.server.stop()
+
+    def send_stats(self):
+        """Періодична статистика воркера для команди 'status' координатора"""
+        try:
+            self.send({
+                'op': 'stats',
+                'stats': self.server.get_server_stats(),
+                'metrics': self.server.metrics.summary_lines(),
+                'metrics_port': self.server.metrics_endpoint.port if self.server.metrics_endpoint else None,
+            })
+        except OSError:
+            pass
+
+
+def run_worker(host, port, worker_id, control_path, metrics_port=None, options=None):
+    """Точка входу процесу-воркера"""
+    # Ctrl+C обробляє батьківський процес і зупиняє воркери через координатора
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    # Фоновий потік журналу не успадковується при fork; файл журналу - окремий для воркера
+    eventlog.configure_child(f"w{worker_id}")
+
+    server = GameServer(host, port, reuse_port=True, **(options or {}))
+    if metrics_port:
+        # Кожен воркер на власному порту; координатор об'єднує їх на metrics_port
+        server.start_metrics_endpoint(metrics_port + 1 + worker_id)
+    server.attach_cluster(ClusterLink(control_path, worker_id))
+    server.start()
+
+
+class ClusterServer:
+    """
+    Батьківський процес кластера: запускає воркери та координує їх.
+    Має той самий інтерфейс, що й GameServer, тож run_server.py керує ним так само.
+    """
+
+    def __init__(self, host='localhost', port=12345, workers=2, **options):
+        self.host = host
+        self.port = port
+        self.worker_count = workers
+        self.server_options = options  # Параметри GameServer; max_clients - на весь кластер
+        self.metrics_port = None
+        self.metrics_endpoint = None
+        self.control_path = os.path.join(tempfile.gettempdir(), f"durak-cluster-{os.getpid()}.sock")
+        self.control_socket = None
+        self.processes = []
+
+        self.workers = {}  # {worker_id: {'conn', 'waiting', 'stats', 'pid'}}
+        self.sessions = {}  # {токен сесії: worker_id} - куди направляти перепідключення
+        self.workers_lock = threading.Lock()
+        self.restore_deadline = 0.0
+        self.parked_resumes = []  # [(воркер-відправник, запит, fds)] - чекають, поки воркери оголосять сесії
+        self.handoffs = 0
+        self.resumes_routed = 0
+
+        self.running = True
+
+    def worker_options(self, worker_id):
+        """Параметри GameServer воркера: ядро розподіляє підключення між воркерами порівну"""
+        options = dict(self.server_options)
+        if options.get('max_clients'):
+            options['max_clients'] = -(-options['max_clients'] // self.worker_count)
+        if options.get('deck_seed') is not None:
+            # Різні, але відтворювані послідовності колод у воркерах
+            options['deck_seed'] += worker_id
+        for name in ('journal_path', 'checkpoint_path'):
+            if options.get(name):
+                # Кожен воркер пише власний файл (як і файл журналу подій)
+                base, extension = os.path.splitext(options[name])
+                options[name] = f"{base}.w{worker_id}{extension}"
+        return options
+
+    def start_metrics_endpoint(self, port, host='127.0.0.1'):
+        """Об'єднані метрики всіх воркерів на http://host:port/metrics (мітка worker)"""
+        self.metrics_port = port
+        try:
+            self.metrics_endpoint = MetricsEndpoint(self.render_metrics, host, port)
+            self.metrics_endpoint.start()
+            log.info('metrics_endpoint', "📈 Метрики кластера доступні на http://{host}:{port}/metrics", host=host, port=port)
+            return True
+        except OSError as e:
+            log.error('metrics_endpoint_failed', "❌ Не вдалося запустити HTTP-порт метрик {host}:{port}: {error}",
+                      host=host, port=port, error=str(e))
+            self.metrics_endpoint = None
+            return False
+
+    def render_metrics(self):
+        """Збирає метрики з HTTP-портів воркерів"""
+        with self.workers_lock:
+            ports = [(worker_id, worker['metrics_port']) for worker_id, worker in sorted(self.workers.items())]
+        texts = []
+        for worker_id, port in ports:
+            if not port:
+                continue
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=2) as response:
+                    texts.append((worker_id, response.read().decode('utf-8')))
+            except OSError:
+                continue
+        return merge_expositions(texts, 'worker')
+
+    def start(self):
+        """Запуск координатора та процесів-воркерів"""
+        try:
+            if os.path.exists(self.control_path):
+                os.unlink(self.control_path)
+            self.control_socket = socket.socket(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+            self.control_socket.bind(self.control_path)
+            self.control_socket.listen(self.worker_count)
+            self.control_socket.settimeout(1)
+
+            self.restore_deadline = time.monotonic() + RESTORE_WAIT
+            context = multiprocessing.get_context('fork')
+            for worker_id in range(self.worker_count):
+                process = context.Process(
+                    target=run_worker,
+                    args=(self.host, self.port, worker_id, self.control_path, self.metrics_port,
+                          self.worker_options(worker_id)),
+                    daemon=True
+                )
+                process.start()
+                self.processes.append(process)
+
+            log.info('cluster_started', "🎮 Кластер Дурак: {workers} воркерів на {host}:{port}",
+                     workers=self.worker_count, host=self.host, port=self.port)
+
+            while self.running:
+                try:
+                    conn, _ = self.control_socket.accept()
+                except socket.timeout:
+                    self.release_parked_resumes()
+                    continue
+                except OSError:
+                    break
+
+                worker_thread = threading.Thread(target=self.serve_worker, args=(conn,))
+                worker_thread.daemon = True
+                worker_thread.start()
+
+        except Exception as e:
+            log.exception('coordinator_crashed', "Критична помилка координатора: {error}", error=str(e))
+        finally:
+            self.cleanup()
+
+    def serve_worker(self, conn):
+        """Обробка повідомлень одного воркера"""
+        worker_id = None
+        try:
+            while self.running:
+                data, fds, _, _ = socket.recv_fds(conn, CONTROL_MESSAGE_SIZE, 1)
+                if not data:
+                    break
+                message = _decode(data)
+                op = message.get('op')
+
+                if op == 'hello':
+                    worker_id = message['worker']
+                    with self.workers_lock:
+                        self.workers[worker_id] = {
+                            'conn': conn,
+                            'pid': message.get('pid'),
+                            'waiting': 0,
+                            'stats': {},
+                            'metrics': [],
+                            'metrics_port': None,
+                            'restored': False,
+                            'send_lock': threading.Lock(),
+                        }
+                    log.info('worker_connected', "🔗 Воркер {worker} (PID {pid}) підключився",
+                             worker=worker_id, pid=message.get('pid'))
+                elif op == 'waiting':
+                    with self.workers_lock:
+                        if worker_id in self.workers:
+                            self.workers[worker_id]['waiting'] = message['count']
+                    self.pair_workers()
+                elif op == 'handoff':
+                    self.forward_handoff(worker_id, message, fds)
+                elif op == 'session':
+                    with self.workers_lock:
+                        self.sessions[message['token']] = worker_id
+                elif op == 'sessions':
+                    with self.workers_lock:
+                        self.sessions.update(dict.fromkeys(message['tokens'], worker_id))
+                    self.release_parked_resumes()
+                elif op == 'restored':
+                    with self.workers_lock:
+                        if worker_id in self.workers:
+                            self.workers[worker_id]['restored'] = True
+                    self.release_parked_resumes()
+                elif op == 'session_closed':
+                    with self.workers_lock:
+                        # Переданий гравець міг уже відкрити сесію на іншому воркері
+                        if self.sessions.get(message['token']) == worker_id:
+                            del self.sessions[message['token']]
+                elif op == 'resume':
+                    self.route_resume(worker_id, message, fds)
+                elif op == 'stats':
+                    with self.workers_lock:
+                        if worker_id in self.workers:
+                            self.workers[worker_id]['stats'] = message['stats']
+                            self.workers[worker_id]['metrics'] = message.get('metrics', [])
+                            self.workers[worker_id]['metrics_port'] = message.get('metrics_port')
+        except OSError:
+            pass
+        finally:
+            with self.workers_lock:
+                self.workers.pop(worker_id, None)
+                # Сесії зниклого воркера більше ніде не відновити
+                for token in [token for token, owner in self.sessions.items() if owner == worker_id]:
+                    del self.sessions[token]
+            try:
+                conn.close()
+            except OSError:
+                pass
+            if self.running and worker_id is not None:
+                log.warning('worker_disconnected', "⚠️ Воркер {worker} від'єднався від координатора", worker=worker_id)
+
+    def send_to_worker(self, worker_id, message, fds=()):
+        """Відправка команди воркеру. False - воркер недоступний"""
+        with self.workers_lock:
+            worker = self.workers.get(worker_id)
+        if worker is None:
+            return False
+        try:
+            with worker['send_lock']:
+                if fds:
+                    socket.send_fds(worker['conn'], [_encode(message)], list(fds))
+                else:
+                    worker['conn'].send(_encode(message))
+            return True
+        except OSError:
+            return False
+
+    def pair_workers(self):
+        """Якщо самотні гравці чекають на різних воркерах - переносимо одного до іншого"""
+        with self.workers_lock:
+            lonely = [worker_id for worker_id, worker in self.workers.items() if worker['waiting'] > 0]
+            if len(lonely) < 2:
+                return
+            donor, receiver = lonely[0], lonely[1]
+            # Резервуємо обох, доки воркери не повідомлять нову довжину черги
+            self.workers[donor]['waiting'] -= 1
+            self.workers[receiver]['waiting'] -= 1
+
+        self.send_to_worker(donor, {'op': 'donate', 'to': receiver})
+
+    def forward_handoff(self, donor, message, fds):
+        """Пересилає сокет гравця від воркера-донора до воркера-отримувача"""
+        if not fds:
+            return
+        adopt = {'op': 'adopt', 'player': message['player'], 'pending': message.get('pending', '')}
+        try:
+            # Якщо отримувач зник - повертаємо гравця донору
+            if not self.send_to_worker(message['to'], adopt, fds):
+                self.send_to_worker(donor, adopt, fds)
+            else:
+                self.handoffs += 1
+        finally:
+            for fd in fds:
+                os.close(fd)
+
+    def route_resume(self, sender, message, fds):
+        """Пересилає сокет перепідключення воркеру, якому належить сесія"""
+        if not fds:
+            return
+        resume = {'op': 'resume', 'message': message['message'], 'address': message['address'],
+                  'pending': message.get('pending', '')}
+        with self.workers_lock:
+            owner = self.sessions.get(resume['message']['token'])
+            if owner is None and self.restoring():
+                # Одразу після перезапуску власник може ще відновлювати сесії з контрольної точки:
+                # запит чекає осторонь, не затримуючи інших повідомлень воркера
+                self.parked_resumes.append((sender, resume, fds))
+                return
+        self.deliver_resume(sender, owner, resume, fds)
+
+    def release_parked_resumes(self):
+        """Доставляє відкладені перепідключення, чиї власники вже відомі (або всі - після відновлення)"""
+        with self.workers_lock:
+            if not self.parked_resumes:
+                return
+            restoring = self.restoring()
+            ready = []
+            waiting = []
+            for sender, resume, fds in self.parked_resumes:
+                owner = self.sessions.get(resume['message']['token'])
+                if owner is None and restoring:
+                    waiting.append((sender, resume, fds))
+                else:
+                    ready.append((sender, owner, resume, fds))
+            self.parked_resumes = waiting
+        for sender, owner, resume, fds in ready:
+            self.deliver_resume(sender, owner, resume, fds)
+
+    def deliver_resume(self, sender, owner, resume, fds):
+        """Сокет перепідключення - власнику сесії або назад відправнику"""
+        try:
+            # Токен невідомий або власник зник - відправник сам відмовить клієнту
+            if owner is not None and owner != sender and self.send_to_worker(owner, resume, fds):
+                self.resumes_routed += 1
+            else:
+                self.send_to_worker(sender, resume, fds)
+        finally:
+            for fd in fds:
+                os.close(fd)
+
+    def restoring(self):
+        """Чи ще можуть з'явитися сесії, відновлені з контрольних точок (під workers_lock)"""
+        if time.monotonic() >= self.restore_deadline:
+            return False
+        return (len(self.workers) < self.worker_count
+                or not all(worker['restored'] for worker in self.workers.values()))
+
+    def cleanup(self):
+        """Зупинка воркерів та звільнення ресурсів координатора"""
+        log.info('cluster_cleanup', "🧹 Зупинка воркерів кластера...")
+        with self.workers_lock:
+            worker_ids = list(self.workers)
+            parked, self.parked_resumes = self.parked_resumes, []
+        for _, _, fds in parked:
+            for fd in fds:
+                os.close(fd)
+        for worker_id in worker_ids:
+            self.send_to_worker(worker_id, {'op': 'shutdown'})
+
+        deadline = time.time() + 5
+        for process in self.processes:
+            process.join(timeout=max(0, deadline - time.time()))
+            if process.is_alive():
+                process.terminate()
+
+        try:
+            self.control_socket.close()
+        except (OSError, AttributeError):
+            pass
+        if self.metrics_endpoint is not None:
+            self.metrics_endpoint.stop()
+            self.metrics_endpoint = None
+        if os.path.exists(self.control_path):
+            os.unlink(self.control_path)
+        log.info('cluster_stopped', "✅ Воркери зупинено")
+
+    def stop(self):
+        """Зупинка кластера"""
+        log.info('cluster_stopping', "🛑 Отримано сигнал зупинки кластера...")
+        self.running = False
+
+    def get_server_stats(self):
+        """Сумарна статистика всіх воркерів"""
+        with self.workers_lock:
+            worker_stats = [worker['stats'] for worker in self.workers.values()]
+        totals = {
+            'total_connections': 0,
+            'active_clients': 0,
+            'waiting_players': 0,
+            'active_games': 0,
+        }
+        for stats in worker_stats:
+            for key in totals:
+                totals[key] += stats.get(key, 0)
+        totals['workers'] = len(worker_stats)
+        totals['handoffs'] = self.handoffs
+        totals['resumes_routed'] = self.resumes_routed
+        totals['running'] = self.running
+        return totals
+
+    def print_status(self):
+        """Виведення статусу кластера"""
+        stats = self.get_server_stats()
+        print("\n" + "=" * 50)
+        print("📊 СТАТУС КЛАСТЕРА")
+        print("=" * 50)
+        print(f"🌐 Адреса сервера: {self.host}:{self.port}")
+        print(f"⚙️  Воркерів: {stats['workers']}/{self.worker_count}")
+        print(f"📈 Загальних підключень: {stats['total_connections']}")
+        print(f"👥 Активних клієнтів: {stats['active_clients']}")
+        print(f"⏳ Гравців в черзі: {stats['waiting_players']}")
+        print(f"🎮 Активних ігор: {stats['active_games']}")
+        print(f"🔀 Передано гравців між воркерами: {stats['handoffs']}")
+        print(f"🔁 Перепідключень до сесій інших воркерів: {stats['resumes_routed']}")
+        print("=" * 50)
+
+        with self.workers_lock:
+            workers = sorted(self.workers.items())
+        for worker_id, worker in workers:
+            worker_stats = worker['stats']
+            print(f"  Воркер {worker_id} (PID {worker['pid']}): "
+                  f"клієнтів {worker_stats.get('active_clients', 0)}, "
+                  f"ігор {worker_stats.get('active_games', 0)}, "
+                  f"в черзі {worker_stats.get('waiting_players', 0)}")
+        print()
+
+    def print_metrics(self):
+        """Виведення метрик воркерів (останні, надіслані разом зі статистикою)"""
+        print("\n" + "=" * 50)
+        print("📈 МЕТРИКИ КЛАСТЕРА")
+        print("=" * 50)
+        with self.workers_lock:
+            workers = sorted(self.workers.items())
+        for worker_id, worker in workers:
+            print(f"  Воркер {worker_id}:")
+            for line in worker['metrics']:
+                print(f"    {line}")
+        if self.metrics_endpoint is not None:
+            print(f"\n🌐 Prometheus: http://{self.metrics_endpoint.host}:{self.metrics_endpoint.port}/metrics")
+        print("=" * 50)
@@ -6,4 +6,8 @@ MENU_SCREEN = 0
 GAME_SCREEN = 1
 OPTION_SCREEN = 2
 
-GREEN = (7, 99, 36)
\ No newline at end of file
+GREEN = (7, 99, 36)
+
+# Масті та ранги карт (порядок визначає ідентифікатори карт 0..51)
+SUITS = ('Spades', 'Hearts', 'Diamonds', 'Clubs')
+RANKS = tuple(range(2, 15))
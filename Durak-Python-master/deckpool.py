@@ -0,0 +1,91 @@
+"""
+Запас перетасованих колод для створення ігор.
+Фоновий потік тримає до depth готових колод - кожна як 52 байти ідентифікаторів карт у
+порядку DurakGame (карти беруться з кінця, перший байт - відкритий козир), тож створення
+гри під час сплеску лише забирає готову колоду.
+
+Кожна колода тасується власним генератором з випадковим зерном; зерно повертається разом
+з колодою, і shuffled_deck(зерно) відтворює її для налагодження конкретної гри. Пул із
+заданим seed видає ту саму послідовність колод за будь-якого темпу споживання.
+"""
+import random
+import threading
+from collections import deque
+
+from eventlog import get_logger
+from rules import CARD_COUNT
+
+log = get_logger('deckpool')
+
+DEFAULT_POOL_DEPTH = 64
+_ORDERED_DECK = bytes(range(CARD_COUNT))
+
+
+def shuffled_deck(deck_seed):
+    """Колода, перетасована генератором з зерном deck_seed"""
+    deck = bytearray(_ORDERED_DECK)
+    random.Random(deck_seed).shuffle(deck)
+    return bytes(deck)
+
+
+class DeckPool:
+    """Черга готових колод; take() повертає (зерно, колода)"""
+
+    def __init__(self, depth=DEFAULT_POOL_DEPTH, seed=None):
+        self.depth = depth
+        self.seed = seed
+        self.seeds = random.Random(seed)  # Джерело зерен колод
+        self.decks = deque()
+        self.lock = threading.Lock()
+        self.low = threading.Condition(self.lock)
+        self.running = False
+        self.thread = None
+        self.misses = 0  # Скільки разів пул був порожній і колоду тасовано на місці
+
+    def __len__(self):
+        return len(self.decks)
+
+    def _next_locked(self):
+        # Зерна беруться по черзі під блокуванням - порядок колод не залежить від потоків
+        deck_seed = self.seeds.getrandbits(64)
+        return deck_seed, shuffled_deck(deck_seed)
+
+    def take(self):
+        """Наступна колода: з пулу за O(1), а якщо пул порожній - тасується одразу"""
+        with self.lock:
+            if self.decks:
+                deck = self.decks.popleft()
+            else:
+                self.misses += 1
+                deck = self._next_locked()
+            self.low.notify()
+        return deck
+
+    def fill(self):
+        """Доповнює пул до depth колод"""
+        with self.lock:
+            while len(self.decks) < self.depth:
+                self.decks.append(self._next_locked())
+
+    def start(self):
+        """Запуск фонового потоку, що доповнює пул після кожного take()"""
+        if self.running:
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self.run)
+        self.thread.daemon = True
+        self.thread.start()
+        log.debug('deck_pool_started', "🃏 Запас колод: {depth} (зерно: {seed})", depth=self.depth, seed=self.seed)
+
+    def run(self):
+        while self.running:
+            with self.lock:
+                self.low.wait_for(lambda: not self.running or len(self.decks) < self.depth)
+                if not self.running:
+                    return
+                self.decks.append(self._next_locked())
+
+    def stop(self):
+        with self.lock:
+            self.running = False
+            self.low.notify_all()
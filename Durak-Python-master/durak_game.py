@@ -7,7 +7,7 @@ import threading
 from cards import Deck, Card
 from board import Board
 from constants import *
-from player import Player
+from game_model import Player
 from client import GameClient
 
 
@@ -52,6 +52,7 @@ class NetworkDurak:
         self.trump_card = None
         self.deck_size = 0
         self.is_attacker = False
+        self.opponent_hand_size = 0
 
         # Потік для підключення
         self.connection_thread = None
@@ -149,8 +150,10 @@ class NetworkDurak:
             for message in messages:
                 self.process_server_message(message)
 
-        # Оновлюємо стан підключення
-        if not self.client.is_connected() and self.connection_state in ["connected", "connecting"]:
+        # Оновлюємо стан підключення (під час перепідключення гра лишається на екрані)
+        if self.client.reconnecting:
+            self.connection_message = "Зв'язок втрачено, перепідключення..."
+        elif not self.client.is_connected() and self.connection_state in ["connected", "connecting"]:
             self.connection_state = "disconnected"
             if self.game_state not in ["menu", "connection_dialog"]:
                 self.game_state = "menu"
@@ -209,8 +212,16 @@ class NetworkDurak:
                 card_rect = pygame.Rect(card_x, card_y, card_width, card_height)
 
                 if card_rect.collidepoint(self.mx, self.my):
-                    print(f"Клік по карті: {card.rank} {card.suit}")
-                    # Тут буде логіка гри
+                    self.play_card(card)
+                    break
+
+    def play_card(self, card):
+        """Напад або захист обраною картою - сервер перевіряє хід за правилами"""
+        card_data = {'rank': card.rank, 'suit': card.suit}
+        if self.is_attacker:
+            self.client.attack(card_data)
+        else:
+            self.client.defend(card_data)
 
     def handle_key_input(self, event):
         """Обробка введення з клавіатури"""
@@ -227,6 +238,12 @@ class NetworkDurak:
                     # Додаємо символи до введення
                     if len(self.connection_input) < 20:  # Обмеження довжини
                         self.connection_input += event.unicode
+        elif self.game_state == "playing" and event.type == pygame.KEYDOWN:
+            # T - забрати карти, P - бито
+            if event.key == pygame.K_t and not self.is_attacker:
+                self.client.take_cards()
+            elif event.key == pygame.K_p and self.is_attacker:
+                self.client.pass_turn()
 
     def process_server_message(self, message):
         """Обробка повідомлень від сервера"""
@@ -237,6 +254,23 @@ class NetworkDurak:
             self.connection_message = "Гра створена! Роздаю карти..."
             self.setup_players()
 
+        elif msg_type == 'game_start_bundle':
+            self.setup_players()
+
+            self.trump_card = message.get('trump_card')
+            self.trump_suit = message.get('trump_suit')
+            self.deck_size = message.get('deck_size')
+            self.is_attacker = message.get('is_attacker')
+            self.opponent_hand_size = len(message.get('hand', []))
+
+            if self.local_player:
+                for card_data in message.get('hand', []):
+                    self.local_player.hand.append(self.create_card_from_data(card_data))
+                self.local_player.sort_hand()
+
+            self.game_state = "playing"
+            self.connection_message = ""
+
         elif msg_type == 'card_dealt':
             # Додаємо карту до руки локального гравця
             if self.local_player:
@@ -258,10 +292,79 @@ class NetworkDurak:
             if self.local_player:
                 self.local_player.sort_hand()
 
+        elif msg_type == 'state_delta':
+            # Клієнт уже застосував дельту; якщо версію пропущено - чекаємо знімка
+            if message.get('seq') == self.client.seq:
+                self.apply_game_update(message)
+
+        elif msg_type == 'state_snapshot':
+            self.apply_game_update(message, full=True)
+
+        elif msg_type == 'action_rejected':
+            self.connection_message = message.get('message', '')
+
+        elif msg_type == 'game_over':
+            if message.get('loser') is None:
+                self.connection_message = "Нічия!"
+            elif message.get('you_lost'):
+                self.connection_message = "Ви - дурень!"
+            else:
+                self.connection_message = "Ви перемогли!"
+            self.game_state = "menu"
+
         elif msg_type == 'opponent_disconnected':
             self.connection_message = "Суперник від'єднався"
             self.game_state = "menu"
 
+        elif msg_type == 'opponent_reconnecting':
+            self.connection_message = "Суперник втратив зв'язок, чекаємо..."
+
+        elif msg_type in ('opponent_reconnected', 'resume_success'):
+            self.connection_message = ""
+
+        elif msg_type == 'resume_failed':
+            self.connection_message = "Не вдалося повернутися до гри"
+            self.game_state = "menu"
+
+        elif msg_type == 'server_restarting':
+            self.connection_message = "Сервер перезапускається, перепідключення..."
+
+        elif msg_type == 'server_busy':
+            if self.client.resume_token:
+                # Клієнт сам повторить відновлення сесії після паузи
+                self.connection_message = "Сервер переповнений, перепідключення..."
+            else:
+                self.connection_message = self.client.last_error
+                self.game_state = "menu"
+
+    def apply_game_update(self, message, full=False):
+        """Оновлення руки, столу та лічильників зі стану клієнта - лише тих частин, що змінилися"""
+        client = self.client
+        self.deck_size = client.deck_size
+        self.is_attacker = client.is_attacker
+        self.opponent_hand_size = client.opponent_hand_size
+        self.connection_message = ""
+
+        if self.local_player and (full or 'hand_add' in message or 'hand_remove' in message):
+            if full:
+                self.local_player.hand = [self.create_card_from_data(card_data) for card_data in client.hand]
+            else:
+                removed = {(card['rank'], card['suit']) for card in message.get('hand_remove', ())}
+                self.local_player.hand = [card for card in self.local_player.hand
+                                          if (card.rank, card.suit) not in removed]
+                self.local_player.hand.extend(self.create_card_from_data(card_data)
+                                              for card_data in message.get('hand_add', ()))
+            self.local_player.sort_hand()
+
+        if self.board and (full or 'table_len' in message):
+            self.board.attack_list = [self.create_card_from_data(attack) for attack, _ in client.table]
+            # Board малює захист поверх атаки з тим самим індексом
+            self.board.defense_list = []
+            for _, defense in client.table:
+                if defense is None:
+                    break
+                self.board.defense_list.append(self.create_card_from_data(defense))
+
     def setup_players(self):
         """Налаштування гравців"""
         game_info = self.client.get_game_info()
@@ -481,7 +584,7 @@ class NetworkDurak:
 
         # Відображення карт суперника (вгорі, тильною стороною)
         if self.opponent_player:
-            opponent_hand_size = len(getattr(self.opponent_player, 'hand', [])) or 6
+            opponent_hand_size = self.opponent_hand_size
             if opponent_hand_size > 0:
                 opponent_cards_x = SCREENWIDTH // 4
                 opponent_cards_x_end = SCREENWIDTH - SCREENWIDTH // 4
@@ -525,7 +628,7 @@ class NetworkDurak:
             screen.blit(player_surface, (10, 10))
 
         if self.opponent_player:
-            opponent_hand_size = len(getattr(self.opponent_player, 'hand', [])) or 6
+            opponent_hand_size = self.opponent_hand_size
             opponent_text = f"Суперник: {self.opponent_player.name} ({opponent_hand_size} карт)"
             opponent_surface = font.render(opponent_text, True, (255, 255, 255))
             screen.blit(opponent_surface, (10, 50))
@@ -0,0 +1,216 @@
+"""
+Структуроване журналювання поза гарячим шляхом.
+Обробник лише кладе запис у чергу (мікросекунди); форматування та запис у консоль
+і у файли JSON-lines з ротацією виконує фоновий потік (logging.handlers.QueueListener).
+
+Використання:
+    log = get_logger('server')
+    log.info('player_joined', "👤 Гравець '{name}' приєднався", name=name, addr=addr)
+
+Текст повідомлення - шаблон str.format, що заповнюється полями вже у фоновому потоці.
+Для частих подій можна задати частку записів, що потрапляють у журнал (sampling).
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+
+QUEUE_SIZE = 10000  # Якщо фоновий потік не встигає - нові записи відкидаються, а не блокують
+DEFAULT_MAX_BYTES = 10 * 1024 * 1024
+DEFAULT_BACKUP_COUNT = 5
+
+_lock = threading.Lock()
+_listener = None
+_queue_handler = None
+_sampling = {}  # {подія: частка записів, що журналюються}
+_config = {}  # Параметри останнього configure (для дочірніх процесів)
+
+
+class _EventQueueHandler(logging.handlers.QueueHandler):
+    """Кладе запис у чергу без форматування; переповнення рахується, а не блокує потік"""
+
+    def __init__(self, record_queue):
+        logging.handlers.QueueHandler.__init__(self, record_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class ConsoleFormatter(logging.Formatter):
+    """Людський вигляд: текст повідомлення, як раніше виводив print()"""
+
+    def format(self, record):
+        return render_message(record)
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """Один JSON-об'єкт на рядок: час, рівень, джерело, подія, текст та поля"""
+
+    def format(self, record):
+        entry = {
+            'ts': round(record.created, 6),
+            'level': record.levelname.lower(),
+            'logger': record.name,
+            'event': getattr(record, 'event', None),
+            'message': render_message(record),
+        }
+        fields = getattr(record, 'fields', None)
+        if fields:
+            entry['fields'] = fields
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def render_message(record):
+    """Заповнення шаблону повідомлення полями події"""
+    fields = getattr(record, 'fields', None)
+    message = record.msg if isinstance(record.msg, str) else str(record.msg)
+    if fields:
+        try:
+            return message.format(**fields)
+        except (KeyError, IndexError, ValueError):
+            return message
+    return message
+
+
+class EventLogger:
+    """Обгортка над logging.Logger: події з полями, перевірка рівня та семплінг до створення запису"""
+
+    def __init__(self, name):
+        self.logger = logging.getLogger(f"durak.{name}")
+
+    def log(self, level, event, message, fields, exc_info=False):
+        if not self.logger.isEnabledFor(level):
+            return
+        rate = _sampling.get(event)
+        if rate is not None and random.random() >= rate:
+            return
+        self.logger.log(level, message, extra={'event': event, 'fields': fields}, exc_info=exc_info)
+
+    def debug(self, event, message, **fields):
+        self.log(logging.DEBUG, event, message, fields)
+
+    def info(self, event, message, **fields):
+        self.log(logging.INFO, event, message, fields)
+
+    def warning(self, event, message, **fields):
+        self.log(logging.WARNING, event, message, fields)
+
+    def error(self, event, message, **fields):
+        self.log(logging.ERROR, event, message, fields)
+
+    def exception(self, event, message, **fields):
+        self.log(logging.ERROR, event, message, fields, exc_info=True)
+
+    def is_enabled(self, level):
+        return self.logger.isEnabledFor(level)
+
+
+def configure(level='INFO', console=True, json_path=None, max_bytes=DEFAULT_MAX_BYTES,
+              backup_count=DEFAULT_BACKUP_COUNT, sampling=None):
+    """
+    Налаштування журналювання процесу (повторний виклик замінює попереднє).
+    json_path - файл JSON-lines з ротацією за розміром; sampling - {подія: частка 0..1}.
+    """
+    global _listener, _queue_handler
+    with _lock:
+        _stop_listener()
+        _config.clear()
+        _config.update(level=level, console=console, json_path=json_path, max_bytes=max_bytes,
+                       backup_count=backup_count, sampling=dict(sampling or {}))
+
+        handlers = []
+        if console:
+            console_handler = logging.StreamHandler(sys.stdout)
+            console_handler.setFormatter(ConsoleFormatter())
+            handlers.append(console_handler)
+        if json_path:
+            file_handler = logging.handlers.RotatingFileHandler(
+                json_path, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8')
+            file_handler.setFormatter(JsonLinesFormatter())
+            handlers.append(file_handler)
+
+        _sampling.clear()
+        _sampling.update(sampling or {})
+
+        record_queue = queue.Queue(QUEUE_SIZE)
+        _queue_handler = _EventQueueHandler(record_queue)
+        root = logging.getLogger('durak')
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        root.addHandler(_queue_handler)
+        root.setLevel(level.upper() if isinstance(level, str) else level)
+        root.propagate = False
+
+        _listener = logging.handlers.QueueListener(record_queue, *handlers, respect_handler_level=True)
+        _listener.start()
+
+
+def _stop_listener():
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+
+def configure_child(tag):
+    """
+    Перезапуск журналювання в дочірньому процесі після fork: потік батька тут не існує,
+    а файл JSON-lines отримує суфікс tag, щоб процеси не ротували один файл.
+    """
+    global _listener
+    _listener = None
+    config = dict(_config)
+    json_path = config.get('json_path')
+    if json_path:
+        base, extension = os.path.splitext(json_path)
+        config['json_path'] = f"{base}.{tag}{extension}"
+    configure(**config)
+
+
+def shutdown():
+    """Дописує всі записи з черги та зупиняє фоновий потік"""
+    with _lock:
+        _stop_listener()
+
+
+def dropped_records():
+    """Скільки записів відкинуто через переповнення черги"""
+    return _queue_handler.dropped if _queue_handler is not None else 0
+
+
+def get_logger(name):
+    """Журнал компонента; якщо журналювання ще не налаштовано - консоль, рівень INFO"""
+    if _listener is None:
+        configure()
+    return EventLogger(name)
+
+
+def parse_sampling(specs):
+    """Розбір параметрів виду 'подія=частка' з командного рядка"""
+    sampling = {}
+    for spec in specs or ():
+        event, _, rate = spec.partition('=')
+        try:
+            sampling[event] = max(0.0, min(1.0, float(rate)))
+        except ValueError:
+            raise ValueError(f"Некоректний семплінг '{spec}', очікується подія=частка")
+    return sampling
+
+
+atexit.register(shutdown)
@@ -0,0 +1,132 @@
+"""
+Чиста модель гри: карта, колода, гравець з рукою.
+Не залежить від pygame, тож її імпортують сервер, боти та симулятор; анімацію та
+зображення додає клієнтський шар у cards.py, що успадковує ці класи.
+"""
+from random import shuffle
+
+from constants import SUITS, RANKS
+
+
+class Card:
+    __slots__ = ('rank', 'suit', 'uber')
+
+    def __init__(self, rank, suit):
+        self.rank = rank
+        self.suit = suit
+        self.uber = False
+
+    def __str__(self):
+        if self.suit != self.uber:
+            return "{} of {}".format(self.rank, self.suit)
+        else:
+            return "{} of {}-->".format(self.rank, self.suit)
+
+    def __gt__(self, other):
+        # self > other
+        # Needs to be tested
+        if self.uber and other.uber:
+            return self.rank > other.rank
+        elif self.uber and not other.uber:
+            return True
+        elif not self.uber and other.uber:
+            return False
+        elif self.suit == other.suit:
+            return self.rank > other.rank
+        else:
+            print("Incorrectly comparing two cards")
+            return None
+
+    def to_dict(self):
+        """Серіалізація карти для передачі по мережі"""
+        return {
+            'rank': self.rank,
+            'suit': self.suit,
+            'is_trump': self.uber == self.suit
+        }
+
+    @classmethod
+    def from_dict(cls, data, trump_suit=None):
+        """Десеріалізація карти з мережевих даних"""
+        card = cls(data['rank'], data['suit'])
+        if trump_suit:
+            card.uber = trump_suit
+        elif data.get('is_trump', False):
+            card.uber = card.suit
+        return card
+
+
+class Deck:
+    __slots__ = ('suits', 'ranks', 'cards_list', 'uber', 'top_card')
+    card_class = Card  # Клієнт підставляє карту з зображеннями (cards.Card)
+
+    def __init__(self):
+        self.suits = list(SUITS)
+        self.ranks = list(RANKS)
+        self.cards_list = []
+        self.uber = None
+        self.top_card = None
+        self.build()
+
+    def build(self):
+        for s in self.suits:
+            for r in self.ranks:
+                self.cards_list.append(self.card_class(r, s))
+        self.shuffle()
+        self.flip_top_card()
+
+    def flip_top_card(self):
+        # To be called at the start of the game, before cards are dealt
+        self.top_card = self.pop()
+        self.uber = self.top_card.suit
+        for c in self.cards_list:
+            c.uber = self.uber
+        self.cards_list.insert(0, self.top_card)
+
+    def shuffle(self):
+        shuffle(self.cards_list)
+
+    def pop(self):
+        return self.cards_list.pop()
+
+    def __len__(self):
+        return len(self.cards_list)
+
+    def __str__(self):
+        return "Deck has {} cards left".format(len(self.cards_list))
+
+
+class Player:
+    __slots__ = ('name', 'is_user', 'id', 'hand', 'uber_count')
+
+    def __init__(self, name, is_user, id):
+        self.name = name
+        self.is_user = is_user
+        self.id = id
+        self.hand = []
+        self.uber_count = 0
+
+    def __len__(self):
+        return len(self.hand)
+
+    def __str__(self):
+        return str(self.name) + "\n" + "".join([str(c) + "\n" for c in self.hand])[:-1]
+
+    def get_lowest_card(self):
+        # hand must be sorted
+        return self.hand[0]
+
+    def draw_card(self, card):
+        self.hand.append(card)
+
+    def need_more_cards(self):
+        return len(self) < 6
+
+    def sort_hand(self):
+        non_uber_cards = [c for c in self.hand if c.uber is not c.suit]
+        non_uber_cards.sort(key=lambda c: c.rank)
+
+        uber_cards = [c for c in self.hand if c.uber is c.suit]
+        uber_cards.sort(key=lambda c: c.rank)
+
+        self.hand = non_uber_cards + uber_cards
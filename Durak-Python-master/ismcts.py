@@ -0,0 +1,216 @@
+"""
+Пошук ходу методом Монте-Карло по дереву для множин інформації (ISMCTS).
+Бот не бачить руки суперника та порядку колоди, тож кожна ітерація спершу "домислює" їх:
+відомі карти суперника (ті, що він забрав зі столу) лишаються в його руці, решту руки та
+колоду заповнюють випадкові карти з тих, яких бот ще не бачив; відкритий козир - на дні колоди.
+Одне дерево накопичує статистику за всіма такими світами (SO-ISMCTS): дочірній вузол
+обирається за UCB серед дій, допустимих у поточному світі.
+
+Пошук обмежений часом (anytime): найкращий на момент дедлайну хід - результат.
+Root-parallel: кілька процесів незалежно шукають з однієї множини інформації,
+відвідування кореневих дій підсумовуються.
+"""
+import math
+import multiprocessing
+import random
+import time
+
+from cardset import FULL_DECK, SUIT_MASKS, cards_of_ranks, iter_ids, lowest, rank_bits
+
+DEFAULT_TIME_BUDGET = 0.05  # Секунд на хід
+EXPLORATION = 0.7  # Коефіцієнт дослідження UCB (виграш - від 0 до 1)
+ROLLOUT_LIMIT = 200  # Запобіжник від нескінченного доігравання
+ROLLOUT_RANDOMNESS = 0.1  # Частка випадкових дій у доіграванні
+
+
+class InfoSet:
+    """
+    Те, що знає гравець seat: своя рука, стіл, відбій, розмір колоди та руки суперника,
+    карти суперника, які він забрав зі столу. Решта прихована.
+    """
+    __slots__ = ('game', 'seat', 'opponent_known')
+
+    def __init__(self, game, seat, opponent_known=0):
+        self.game = game
+        self.seat = seat
+        self.opponent_known = opponent_known
+
+    def determinize(self, rng):
+        """Випадковий повний стан гри, сумісний з відомим гравцю"""
+        game = self.game.copy()
+        opponent = 1 - self.seat
+        deck_size = len(game.deck)
+        trump_bit = 1 << game.trump_card if deck_size else 0
+        seen = game.hands[self.seat].mask | game.table_mask | game.discard.mask | trump_bit
+        known = self.opponent_known & ~seen
+        if not deck_size:
+            # Колода скінчилась: відкритий козир, якого не видно, - у руці суперника
+            known |= (1 << game.trump_card) & ~seen
+        unknown = list(iter_ids(FULL_DECK & ~seen & ~known))
+        rng.shuffle(unknown)
+
+        hidden = len(game.hands[opponent]) - known.bit_count()
+        if hidden < 0:
+            # Облік карт розійшовся з грою (напр. бот підключився посеред гри) - менше знань
+            known = 0
+            hidden = len(game.hands[opponent])
+        hand = known
+        for card in unknown[:hidden]:
+            hand |= 1 << card
+        game.hands[opponent].mask = hand
+        if deck_size:
+            game.deck = [game.trump_card] + unknown[hidden:hidden + deck_size - 1]
+        return game
+
+
+class Node:
+    """Вузол дерева: дія, що веде до нього, та статистика з погляду гравця, який її виконав"""
+    __slots__ = ('action', 'seat', 'children', 'visits', 'available', 'wins')
+
+    def __init__(self, action=None, seat=None):
+        self.action = action
+        self.seat = seat
+        self.children = {}
+        self.visits = 0
+        self.available = 0  # Скільки разів дія була допустимою під час вибору
+        self.wins = 0.0
+
+
+def mover(game):
+    """Хто ходить: захисник, поки є неперебиті карти, інакше нападник"""
+    return game.defender if game.unbeaten_count else game.attacker
+
+
+def apply(game, seat, action):
+    kind, card, target = action
+    if kind == 'attack':
+        game.attack(seat, card)
+    elif kind == 'defend':
+        game.defend(seat, card, target)
+    elif kind == 'take':
+        game.take(seat)
+    else:
+        game.pass_turn(seat)
+
+
+def cheapest(mask, trumps):
+    """Наймолодша карта маски, некозирні раніше за козирі; -1 для порожньої"""
+    plain = mask & ~trumps
+    if plain:
+        mask = plain
+    ranks = rank_bits(mask)
+    return lowest(mask & cards_of_ranks(ranks & -ranks))
+
+
+def rollout(game, rng):
+    """
+    Доігравання до кінця швидкою політикою simpleBot (бітові маски замість legal_actions):
+    наймолодша карта, козирі берегти, не підкидати козирів; з імовірністю ROLLOUT_RANDOMNESS -
+    випадкова дія. Повертає місце дурня (None - нічия або запобіжник)
+    """
+    trumps = SUIT_MASKS[game.trump_index]
+    for _ in range(ROLLOUT_LIMIT):
+        if game.finished:
+            return game.loser
+        seat = mover(game)
+        if rng.random() < ROLLOUT_RANDOMNESS:
+            apply(game, seat, rng.choice(game.legal_actions(seat)))
+            continue
+
+        hand = game.hands[seat].mask
+        if game.unbeaten_count:
+            target = game.first_unbeaten()
+            card = cheapest(hand & game.beaters[game.table[target][0]], trumps)
+            if card < 0:
+                game.take(seat)
+            else:
+                game.defend(seat, card, target)
+        elif not game.table:
+            game.attack(seat, cheapest(hand, trumps))
+        else:
+            card = -1
+            if len(game.table) < game.bout_limit and game.unbeaten_count < len(game.hands[game.defender]):
+                card = cheapest(hand & cards_of_ranks(game.table_ranks) & ~trumps, trumps)
+            if card < 0:
+                game.pass_turn(seat)
+            else:
+                game.attack(seat, card)
+    return game.loser
+
+
+def search(info, time_budget=DEFAULT_TIME_BUDGET, iterations=None, seed=None, exploration=EXPLORATION):
+    """
+    Пошук з кореня info до дедлайну (або iterations ітерацій).
+    Повертає {дія: (відвідувань, виграшів)} для дій кореня.
+    """
+    rng = random.Random(seed)
+    root = Node()
+    deadline = time.perf_counter() + time_budget
+    count = 0
+    while (count < iterations) if iterations is not None else (time.perf_counter() < deadline):
+        count += 1
+        game = info.determinize(rng)
+        node = root
+        path = [root]
+
+        # Вибір та розширення
+        while not game.finished:
+            seat = mover(game)
+            actions = game.legal_actions(seat)
+            children = node.children
+            untried = [action for action in actions if action not in children]
+            if untried:
+                action = rng.choice(untried)
+                apply(game, seat, action)
+                child = children[action] = Node(action, seat)
+                path.append(child)
+                break
+
+            best = None
+            best_score = -1.0
+            for action in actions:
+                child = children[action]
+                child.available += 1
+                score = (child.wins / child.visits
+                         + exploration * math.sqrt(math.log(child.available) / child.visits))
+                if score > best_score:
+                    best, best_score = child, score
+            apply(game, seat, best.action)
+            node = best
+            path.append(node)
+
+        # Доігравання та зворотне поширення
+        loser = rollout(game, rng)
+        for node in path:
+            node.visits += 1
+            if node.seat is not None:
+                node.wins += 0.5 if loser is None else float(loser != node.seat)
+
+    return {action: (child.visits, child.wins) for action, child in root.children.items()}
+
+
+def _search_worker(args):
+    info, time_budget, iterations, seed = args
+    return search(info, time_budget, iterations, seed)
+
+
+def best_action(stats):
+    """Найвідвідуваніша дія кореня (стійкіша за найкращий середній виграш)"""
+    return max(stats, key=lambda action: stats[action][0])
+
+
+def parallel_search(info, pool, workers, time_budget=DEFAULT_TIME_BUDGET, iterations=None, seed=None):
+    """Root-parallel: workers незалежних пошуків у пулі процесів; статистика кореня підсумовується"""
+    rng = random.Random(seed)
+    jobs = [(info, time_budget, iterations, rng.getrandbits(32)) for _ in range(workers)]
+    total = {}
+    for stats in pool.map(_search_worker, jobs):
+        for action, (visits, wins) in stats.items():
+            previous = total.get(action, (0, 0.0))
+            total[action] = (previous[0] + visits, previous[1] + wins)
+    return total
+
+
+def make_pool(processes=None):
+    """Пул процесів для root-parallel пошуку (один на всіх ботів процесу)"""
+    return multiprocessing.Pool(processes)
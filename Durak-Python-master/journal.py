@@ -0,0 +1,562 @@
+#!/usr/bin/env python3
+"""
+Журнал ігор: двійковий файл, у який сервер лише дописує.
+Для кожної гри записується порядок колоди та перший нападник (з них правила однозначно
+відтворюють початкову роздачу і весь добір), далі кожна прийнята дія та результат гри.
+Записи накопичуються в пам'яті, а фоновий потік раз на flush_interval дописує їх одним
+write і одним fsync, тож обробник ходу ніколи не чекає на диск.
+
+Формат (little-endian), кожен запис починається з байта типу:
+    SEGMENT  тип, b'DJ', версія, час (f64)        - кожне відкриття файлу сервером
+    START    тип, гра (u32), нападник, час (f64), 52 байти колоди, довжина id, id гри
+    RESUME   тип, гра (u32), нападник, ліміт розіграшу, час (f64), козир, довжина колоди, колода
+             (52 байти), руки та відбій (маски u64), довжина столу, стіл (12 байтів), довжина id, id гри
+             - гра, відновлена з контрольної точки: далі журналюється з відновленого стану
+    ACTION   тип, гра (u32), дія (| FORCED_FLAG - хід за гравця після тайм-ауту), місце, карта, ціль
+    END      тип, гра (u32), результат, місце дурня
+Номер гри (u32) - локальний для сегмента; 255 у полі карти, цілі чи дурня - "немає".
+Обірваний запис у кінці файлу (аварійна зупинка) ігнорується.
+
+Відтворення: python journal.py FILE [FILE ...] [--game ID] [--processes P]
+Прогін журналу через правила без сокетів: перевіряє, що кожна дія допустима і результат збігається.
+"""
+import argparse
+import multiprocessing
+import os
+import struct
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from eventlog import get_logger
+from protocol import card_from_id
+from rules import CARD_COUNT, DurakGame, RuleError
+
+log = get_logger('journal')
+
+JOURNAL_VERSION = 2  # 2 - записи RESUME
+JOURNAL_MAGIC = b'DJ'
+DEFAULT_FLUSH_INTERVAL = 0.05  # Секунд між груповими fsync
+MAX_PENDING_BYTES = 1024 * 1024  # Більший буфер дописується, не чекаючи інтервалу
+
+SEGMENT_RECORD, START_RECORD, ACTION_RECORD, END_RECORD, RESUME_RECORD = 1, 2, 3, 4, 5
+SEGMENT = struct.Struct('<B2sBd')
+START = struct.Struct(f'<BIBd{CARD_COUNT}sB')
+ACTION = struct.Struct('<BIBBBB')
+END = struct.Struct('<BIBB')
+RESUME = struct.Struct(f'<BIBBdBB{CARD_COUNT}sQQQB12sB')
+ACTION_INDEX = struct.Struct('<xI4s')  # Номер гри та 4 байти дії - для index_journal
+ACTION_RUN = 4096  # Скільки записів дій index_journal перевіряє за один зріз
+MOVE = struct.Struct('<BBBB')  # Дія в індексі: код, місце, карта, ціль
+HANDLE = struct.Struct('<I')  # Номер гри одразу після байта типу
+
+ACTIONS = ('attack', 'defend', 'take', 'pass')
+ACTION_CODES = {action: code for code, action in enumerate(ACTIONS)}
+FORCED_FLAG = 0x80
+OUTCOMES = ('completed', 'abandoned', 'aborted')
+OUTCOME_CODES = {outcome: code for code, outcome in enumerate(OUTCOMES)}
+NONE = 0xFF
+
+
+class JournalError(ValueError):
+    """Файл не є журналом ігор"""
+
+
+class Journal:
+    """
+    Запис журналу. Методи запису потокобезпечні і лише додають байти до буфера;
+    on_sync(секунд) викликається після кожного fsync (гістограма затримки).
+    """
+
+    def __init__(self, path, flush_interval=DEFAULT_FLUSH_INTERVAL, sync=True, on_sync=None):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.sync = sync  # False - без fsync (дані переживуть падіння процесу, але не ОС)
+        self.on_sync = on_sync
+        self.file = open(path, 'ab')
+        self.buffer = bytearray(SEGMENT.pack(SEGMENT_RECORD, JOURNAL_MAGIC, JOURNAL_VERSION, time.time()))
+        self.lock = threading.Lock()
+        self.pending = threading.Condition(self.lock)
+        self.io_lock = threading.Lock()  # Запис у файл: фоновий потік або close()
+        self.next_game = 0
+        self.bytes_written = 0
+        self.syncs = 0
+        self.running = False
+        self.thread = None
+
+    def __len__(self):
+        return len(self.buffer)
+
+    def game_started(self, game_id, rules):
+        """Запис нової гри (до роздачі). Повертає номер гри в журналі"""
+        name = game_id.encode()[:255]
+        with self.lock:
+            self.next_game += 1
+            handle = self.next_game
+            self.buffer += START.pack(START_RECORD, handle, rules.attacker, time.time(),
+                                      bytes(rules.deck), len(name))
+            self.buffer += name
+        return handle
+
+    def game_resumed(self, game_id, rules):
+        """Запис гри, відновленої з контрольної точки, з її поточного стану. Повертає номер гри"""
+        name = game_id.encode()[:255]
+        table = bytearray()
+        for attack, defense in rules.table:
+            table += bytes((attack, NONE if defense is None else defense))
+        with self.lock:
+            self.next_game += 1
+            handle = self.next_game
+            self.buffer += RESUME.pack(RESUME_RECORD, handle, rules.attacker, rules.bout_limit, time.time(),
+                                       rules.trump_card, len(rules.deck), bytes(rules.deck), rules.hands[0].mask,
+                                       rules.hands[1].mask, rules.discard.mask, len(table), bytes(table), len(name))
+            self.buffer += name
+        return handle
+
+    def action(self, handle, seat, action, card=None, target=None, forced=False):
+        """Прийнята дія гравця (або дія за нього після тайм-ауту)"""
+        code = ACTION_CODES[action] | (FORCED_FLAG if forced else 0)
+        record = ACTION.pack(ACTION_RECORD, handle, code, seat,
+                             NONE if card is None else card, NONE if target is None else target)
+        with self.lock:
+            self.buffer += record
+            if len(self.buffer) >= MAX_PENDING_BYTES:
+                self.pending.notify()
+
+    def game_ended(self, handle, outcome, loser=None):
+        """Кінець гри: результат (див. OUTCOMES) та місце дурня"""
+        record = END.pack(END_RECORD, handle, OUTCOME_CODES.get(outcome, OUTCOME_CODES['aborted']),
+                          NONE if loser is None else loser)
+        with self.lock:
+            self.buffer += record
+
+    def start(self):
+        """Запуск фонового потоку групового запису"""
+        if self.running:
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self.run)
+        self.thread.daemon = True
+        self.thread.start()
+        log.info('journal_opened', "📼 Журнал ігор: {path} (fsync кожні {interval} с)",
+                 path=self.path, interval=self.flush_interval)
+
+    def run(self):
+        while self.running:
+            with self.lock:
+                self.pending.wait_for(lambda: not self.running or len(self.buffer) >= MAX_PENDING_BYTES,
+                                      self.flush_interval)
+            self.flush()
+
+    def flush(self):
+        """Дописує накопичене одним write та fsync"""
+        with self.io_lock:
+            with self.lock:
+                if not self.buffer or self.file.closed:
+                    return
+                data, self.buffer = self.buffer, bytearray()
+            started = time.perf_counter()
+            try:
+                self.file.write(data)
+                self.file.flush()
+                if self.sync:
+                    os.fsync(self.file.fileno())
+            except OSError as e:
+                log.error('journal_write_failed', "❌ Помилка запису журналу {path}: {error}",
+                          path=self.path, error=str(e))
+                return
+            self.bytes_written += len(data)
+            self.syncs += 1
+            if self.on_sync is not None:
+                self.on_sync(time.perf_counter() - started)
+
+    def close(self):
+        """Зупинка потоку, дописування залишку та закриття файлу"""
+        with self.lock:
+            self.running = False
+            self.pending.notify_all()
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join(timeout=5)
+        self.flush()
+        with self.io_lock:
+            self.file.close()
+
+
+def read_journal(path):
+    """Весь файл журналу в пам'яті; перевіряє, що він починається з сегмента"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    if data and (len(data) < SEGMENT.size or data[0] != SEGMENT_RECORD
+                 or data[1:3] != JOURNAL_MAGIC):
+        raise JournalError(f"{path}: не журнал ігор")
+    return data
+
+
+def iter_records(data):
+    """
+    Записи журналу як кортежі (тип, ...), id гри START - рядок.
+    Останнім може бути ('torn', байтів) - обірваний запис у кінці файлу.
+    """
+    pos = 0
+    end = len(data)
+    while pos < end:
+        kind = data[pos]
+        if kind == ACTION_RECORD:
+            size = ACTION.size
+        elif kind == END_RECORD:
+            size = END.size
+        elif kind == START_RECORD:
+            size = START.size + (data[pos + START.size - 1] if pos + START.size <= end else 0)
+        elif kind == RESUME_RECORD:
+            size = RESUME.size + (data[pos + RESUME.size - 1] if pos + RESUME.size <= end else 0)
+        elif kind == SEGMENT_RECORD:
+            size = SEGMENT.size
+        else:
+            raise JournalError(f"Невідомий тип запису {kind} на позиції {pos}")
+        if pos + size > end:
+            yield ('torn', end - pos)
+            return
+
+        if kind == ACTION_RECORD:
+            yield ACTION.unpack_from(data, pos)
+        elif kind == END_RECORD:
+            yield END.unpack_from(data, pos)
+        elif kind == START_RECORD:
+            record = START.unpack_from(data, pos)
+            yield record[:-1] + (data[pos + START.size:pos + size].decode(),)
+        elif kind == RESUME_RECORD:
+            record = RESUME.unpack_from(data, pos)
+            yield record[:-1] + (data[pos + RESUME.size:pos + size].decode(),)
+        else:
+            record = SEGMENT.unpack_from(data, pos)
+            if record[1] != JOURNAL_MAGIC or record[2] > JOURNAL_VERSION:
+                raise JournalError(f"Непідтримуваний сегмент журналу на позиції {pos}")
+            yield record
+        pos += size
+
+
+def index_journal(data):
+    """
+    Один прохід по журналу: дії кожної гри збираються поспіль, тож ігри можна відтворювати
+    незалежно (і ділити між процесами), не розбираючи записів інших ігор.
+    Повертає (ігри, обірваних байтів у кінці). Гра - (id, початок, дії, результат, дурень):
+    початок - запис START або RESUME без id (див. initial_rules), дії - по 4 байти
+    (код, місце, карта, ціль), результат None - гра обірвана без запису END.
+    """
+    games = []
+    open_games = {}  # {номер гри: (id, початок, bytearray дій)}
+    iter_actions = ACTION_INDEX.iter_unpack
+    action_size = ACTION.size
+    run_marker = bytes((ACTION_RECORD,))
+    start_size = START.size
+    pos = 0
+    end = len(data)
+    torn = 0
+    while pos < end:
+        kind = data[pos]
+        if kind == ACTION_RECORD:
+            # Серія записів дій поспіль: типи на кроці ACTION.size перевіряються зрізом,
+            # а самі дії розбираються iter_unpack, без окремого кроку циклу на кожен запис
+            window = data[pos:min(end, pos + action_size * ACTION_RUN):action_size]
+            count = min(len(window) - len(window.lstrip(run_marker)), (end - pos) // action_size)
+            if not count:
+                torn = end - pos
+                break
+            run_end = pos + count * action_size
+            last = moves = None
+            for handle, move in iter_actions(data[pos:run_end]):
+                if handle != last:
+                    last = handle
+                    entry = open_games.get(handle)
+                    moves = entry[2] if entry is not None else None
+                if moves is not None:
+                    moves += move
+            pos = run_end
+
+        elif kind == END_RECORD:
+            if pos + END.size > end:
+                torn = end - pos
+                break
+            _, handle, outcome, loser = END.unpack_from(data, pos)
+            pos += END.size
+            entry = open_games.pop(handle, None)
+            if entry is not None:
+                games.append((entry[0], entry[1], bytes(entry[2]), outcome, loser))
+
+        elif kind == START_RECORD or kind == RESUME_RECORD:
+            size = start_size if kind == START_RECORD else RESUME.size
+            if pos + size > end or pos + size + data[pos + size - 1] > end:
+                torn = end - pos
+                break
+            (handle,) = HANDLE.unpack_from(data, pos + 1)
+            name_start = pos + size
+            setup = data[pos:name_start]
+            pos = name_start + data[name_start - 1]
+            entry = open_games.pop(handle, None)
+            if entry is not None:
+                games.append((entry[0], entry[1], bytes(entry[2]), None, NONE))
+            open_games[handle] = (data[name_start:pos].decode(), setup, bytearray())
+
+        elif kind == SEGMENT_RECORD:
+            if pos + SEGMENT.size > end:
+                torn = end - pos
+                break
+            # Сервер перезапущено: номери ігор почнуться знову, незавершені ігри обірвано
+            for entry in open_games.values():
+                games.append((entry[0], entry[1], bytes(entry[2]), None, NONE))
+            open_games.clear()
+            pos += SEGMENT.size
+
+        else:
+            raise JournalError(f"Невідомий тип запису {kind} на позиції {pos}")
+
+    for entry in open_games.values():
+        games.append((entry[0], entry[1], bytes(entry[2]), None, NONE))
+    return games, torn
+
+
+def resumed_rules(record):
+    """Правила з розібраного запису RESUME (стан гри на момент відновлення)"""
+    (_, _, attacker, bout_limit, _, trump_card, deck_length, deck, hand0, hand1, discard,
+     table_length, table) = record[:13]
+    pairs = [(table[index], None if table[index + 1] == NONE else table[index + 1])
+             for index in range(0, table_length, 2)]
+    return DurakGame.from_state(trump_card, deck[:deck_length], attacker, (hand0, hand1), discard, pairs, bout_limit)
+
+
+def initial_rules(setup):
+    """Правила на початок гри в журналі: роздача за записом START або стан із запису RESUME"""
+    if setup[0] == RESUME_RECORD:
+        return resumed_rules(RESUME.unpack(setup))
+    _, _, attacker, _, deck, _ = START.unpack(setup)
+    rules = DurakGame(deck, attacker)
+    rules.deal_initial()
+    return rules
+
+
+def replay_games(games):
+    """Прогін ігор з index_journal() через правила. Повертає словник з результатами"""
+    finished = incomplete = broken = actions = 0
+    divergences = []
+    iter_moves = MOVE.iter_unpack
+    completed = OUTCOME_CODES['completed']
+
+    # Гарячий цикл: методи правил прив'язуються раз на гру, дії - без розбору записів
+    started = time.perf_counter()
+    for game_id, setup, moves, outcome, loser in games:
+        rules = initial_rules(setup)
+        attack, defend, take, pass_turn = rules.attack, rules.defend, rules.take, rules.pass_turn
+        count = 0
+        try:
+            for code, seat, card, target in iter_moves(moves):
+                code &= 0x7F
+                if code == 0:
+                    attack(seat, card)
+                elif code == 1:
+                    defend(seat, card, target)
+                elif code == 2:
+                    take(seat)
+                elif code == 3:
+                    pass_turn(seat)
+                else:
+                    raise RuleError(f"Невідомий код дії {code}")
+                count += 1
+        except RuleError as e:
+            divergences.append((game_id, count, str(e)))
+            broken += 1
+            actions += count
+            continue
+        actions += count
+
+        if outcome is None:
+            incomplete += 1
+            continue
+        finished += 1
+        if outcome == completed:
+            if not rules.finished:
+                divergences.append((game_id, count, "Журнал завершує гру, а правила - ні"))
+            elif rules.loser != (None if loser == NONE else loser):
+                divergences.append((game_id, count, f"Дурень за журналом {loser}, за правилами {rules.loser}"))
+        elif rules.finished:
+            divergences.append((game_id, count, f"Гру завершено правилами, а журнал каже {OUTCOMES[outcome]}"))
+
+    return {
+        'games': finished + incomplete + broken,
+        'finished': finished,
+        'incomplete': incomplete,
+        'actions': actions,
+        'divergences': divergences,
+        'elapsed': time.perf_counter() - started,
+    }
+
+
+def replay(data):
+    """Прогін журналу через правила в поточному процесі. Повертає словник з результатами"""
+    games, torn = index_journal(data)
+    result = replay_games(games)
+    result['torn_bytes'] = torn
+    return result
+
+
+def _index_file(path):
+    return index_journal(read_journal(path))
+
+
+def split_games(games, parts):
+    """Розбиття ігор на частини з приблизно однаковою кількістю дій"""
+    chunks = [[] for _ in range(parts)]
+    sizes = [0] * parts
+    for game in sorted(games, key=lambda game: len(game[2]), reverse=True):
+        part = sizes.index(min(sizes))
+        chunks[part].append(game)
+        sizes[part] += len(game[2])
+    return [chunk for chunk in chunks if chunk]
+
+
+def replay_files(paths, processes=1):
+    """
+    Відтворення кількох журналів (напр. воркерів кластера). Файли індексуються один раз,
+    після чого кожен процес отримує лише свої ігри
+    """
+    start = time.perf_counter()
+    if processes > 1:
+        with multiprocessing.Pool(processes) as pool:
+            indexed = pool.map(_index_file, paths)
+            games = [game for file_games, _ in indexed for game in file_games]
+            results = pool.map(replay_games, split_games(games, processes))
+    else:
+        indexed = [_index_file(path) for path in paths]
+        results = [replay_games([game for file_games, _ in indexed for game in file_games])]
+    elapsed = time.perf_counter() - start
+
+    actions = sum(result['actions'] for result in results)
+    return {
+        'games': sum(result['games'] for result in results),
+        'finished': sum(result['finished'] for result in results),
+        'incomplete': sum(result['incomplete'] for result in results),
+        'actions': actions,
+        'divergences': [divergence for result in results for divergence in result['divergences']],
+        'torn_bytes': sum(torn for _, torn in indexed),
+        'elapsed': elapsed,
+        'actions_per_sec': actions / elapsed if elapsed else 0.0,
+    }
+
+
+def card_name(card):
+    rank, suit = card_from_id(card)
+    return f"{rank} {suit}"
+
+
+def trace_game(data, game_id):
+    """Покроковий опис однієї гри (останньої з таким id). Повертає список рядків"""
+    lines = []
+    handle = rules = None
+    moves = 0
+    for record in iter_records(data):
+        kind = record[0]
+        if kind == SEGMENT_RECORD:
+            handle = None
+        elif kind == START_RECORD and record[-1] == game_id:
+            _, handle, attacker, created, deck, _ = record
+            rules = DurakGame(deck, attacker)
+            hands = rules.deal_initial()
+            moves = 0
+            lines = [f"🎲 {game_id} {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(created))}, "
+                     f"козир {card_name(rules.trump_card)}, нападає місце {attacker}"]
+            for seat, hand in enumerate(hands):
+                lines.append(f"   місце {seat}: " + ", ".join(card_name(card) for card in hand))
+        elif kind == RESUME_RECORD and record[-1] == game_id:
+            # Продовження гри після перезапуску сервера (з контрольної точки)
+            handle, created = record[1], record[4]
+            rules = resumed_rules(record)
+            if not lines:
+                moves = 0
+            lines.append(f"♻️  {game_id} відновлено {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(created))}, "
+                         f"козир {card_name(rules.trump_card)}, нападає місце {rules.attacker}, "
+                         f"у колоді {len(rules.deck)}")
+            for seat, hand in enumerate(rules.hands):
+                lines.append(f"   місце {seat}: " + ", ".join(card_name(card) for card in hand))
+            if rules.table:
+                lines.append("   стіл: " + ", ".join(
+                    card_name(attack) + (f" / {card_name(defense)}" if defense is not None else "")
+                    for attack, defense in rules.table))
+        elif kind == ACTION_RECORD and record[1] == handle and rules is not None:
+            _, _, code, seat, card, target = record
+            action = ACTIONS[code & 0x7F] if code & 0x7F < len(ACTIONS) else str(code)
+            moves += 1
+            line = f"{moves:4d}. місце {seat}: {action}"
+            if card != NONE:
+                line += f" {card_name(card)}"
+            if code & FORCED_FLAG:
+                line += " (тайм-аут)"
+            try:
+                result = rules.apply(seat, action, None if card == NONE else card, None if target == NONE else target)
+            except RuleError as e:
+                lines.append(f"{line} ❌ {e}")
+                rules = None
+                continue
+            if result.get('bout_over'):
+                line += f" - {result['bout_over']}, у колоді {len(rules.deck)}"
+            lines.append(line)
+        elif kind == END_RECORD and record[1] == handle:
+            _, _, outcome, loser = record
+            lines.append(f"🏁 {OUTCOMES[outcome]}, дурень: {'немає' if loser == NONE else f'місце {loser}'}")
+            handle = None
+        elif kind == 'torn':
+            lines.append(f"✂️  Обірваний запис у кінці файлу ({record[1]} байтів)")
+    return lines
+
+
+def parse_args(argv=None):
+    """Розбір аргументів командного рядка"""
+    parser = argparse.ArgumentParser(description="Відтворення журналу ігор Дурак")
+    parser.add_argument('paths', nargs='+', metavar='FILE', help="файли журналу (--journal сервера)")
+    parser.add_argument('--game', help="покроково показати одну гру за її id")
+    parser.add_argument('--processes', type=int, default=1,
+                        help="кількість процесів (0 - за кількістю ядер)")
+    args = parser.parse_args(argv)
+
+    if args.processes < 0:
+        parser.error("--processes не може бути від'ємним")
+    if args.processes == 0:
+        args.processes = os.cpu_count() or 1
+    return args
+
+
+def main():
+    args = parse_args()
+
+    try:
+        if args.game:
+            for path in args.paths:
+                lines = trace_game(read_journal(path), args.game)
+                if lines:
+                    print("\n".join(lines))
+                    return 0
+            print(f"❓ Гру {args.game} не знайдено")
+            return 1
+        stats = replay_files(args.paths, args.processes)
+    except (OSError, JournalError) as e:
+        print(f"❌ {e}")
+        return 1
+
+    print("=" * 50)
+    print("📼 ВІДТВОРЕННЯ ЖУРНАЛУ ІГОР")
+    print("=" * 50)
+    print(f"🎮 Ігор: {stats['games']} (завершено {stats['finished']}, обірвано {stats['incomplete']})")
+    print(f"🃏 Дій: {stats['actions']}")
+    print(f"⏱️  Час: {stats['elapsed']:.2f} с, дій за секунду: {stats['actions_per_sec']:.0f}")
+    if stats['torn_bytes']:
+        print(f"✂️  Обірваний запис у кінці: {stats['torn_bytes']} байтів")
+    for game_id, move, message in stats['divergences'][:20]:
+        print(f"❌ {game_id}, хід {move + 1}: {message}")
+    if len(stats['divergences']) > 20:
+        print(f"   ... ще {len(stats['divergences']) - 20}")
+    print("=" * 50)
+    return 1 if stats['divergences'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
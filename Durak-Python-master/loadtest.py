@@ -0,0 +1,498 @@
+#!/usr/bin/env python3
+"""
+Навантажувальний тест сервера: рій фейкових гравців на asyncio (без pygame).
+Гравці говорять тим самим протоколом, що й client.GameClient (join/ready/game_action/ping),
+та грають партії до кінця найпростішою стратегією.
+Використання:
+    python loadtest.py [host] [port] [--clients N] [--spawn] [--engine threads|asyncio] [--workers N]
+    python loadtest.py [host] [port] [--clients N] --server-pid PID
+"""
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from protocol import CODECS, JSON_CODEC, RECV_CHUNK_SIZE, FrameDecoder, decode_frame
+from state_sync import apply_delta, apply_snapshot
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Метрики затримок, що збирає тест
+METRICS = (
+    ('connect', "Підключення"),
+    ('join', "join -> join_success"),
+    ('game_start', "join -> game_start_bundle"),
+    ('action', "game_action -> state_delta"),
+    ('ping', "ping -> pong"),
+)
+PERCENTILES = (50, 90, 99)
+
+
+class LatencyStats:
+    """Накопичувач затримок з обчисленням перцентилів"""
+
+    def __init__(self):
+        self.samples = []
+
+    def add(self, seconds):
+        self.samples.append(seconds)
+
+    def percentile(self, percent):
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, int(round(percent / 100 * (len(ordered) - 1))))
+        return ordered[index]
+
+    def __len__(self):
+        return len(self.samples)
+
+
+class ProcessSampler:
+    """Періодичні заміри CPU та RSS процесу сервера (та його воркерів) через /proc"""
+
+    def __init__(self, pid, interval=0.5):
+        self.pid = pid
+        self.interval = interval
+        self.clock_ticks = os.sysconf('SC_CLK_TCK') if hasattr(os, 'sysconf') else 100
+        self.page_size = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+        self.cpu_samples = []
+        self.peak_rss = 0
+        self.available = os.path.exists(f"/proc/{pid}/stat")
+
+    def process_tree(self):
+        """PID сервера та всіх його дочірніх процесів (воркерів кластера)"""
+        pids = [self.pid]
+        index = 0
+        while index < len(pids):
+            pid = pids[index]
+            index += 1
+            try:
+                for task in os.listdir(f"/proc/{pid}/task"):
+                    with open(f"/proc/{pid}/task/{task}/children") as f:
+                        pids.extend(int(child) for child in f.read().split())
+            except OSError:
+                continue
+        return pids
+
+    def read_usage(self):
+        """Сумарний процесорний час (с) та RSS (байти) дерева процесів"""
+        cpu_time = 0.0
+        rss = 0
+        for pid in self.process_tree():
+            try:
+                with open(f"/proc/{pid}/stat") as f:
+                    # Поля після назви процесу; utime та stime - 14 та 15 поля stat
+                    fields = f.read().rsplit(')', 1)[1].split()
+                with open(f"/proc/{pid}/statm") as f:
+                    rss += int(f.read().split()[1]) * self.page_size
+            except (OSError, IndexError, ValueError):
+                continue
+            cpu_time += (int(fields[11]) + int(fields[12])) / self.clock_ticks
+        return cpu_time, rss
+
+    async def run(self, stop_event):
+        if not self.available:
+            return
+        last_cpu, _ = self.read_usage()
+        last_time = time.perf_counter()
+        while not stop_event.is_set():
+            try:
+                await asyncio.wait_for(stop_event.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            cpu, rss = self.read_usage()
+            now = time.perf_counter()
+            if now > last_time:
+                self.cpu_samples.append(100.0 * (cpu - last_cpu) / (now - last_time))
+            self.peak_rss = max(self.peak_rss, rss)
+            last_cpu, last_time = cpu, now
+
+
+class FakePlayer:
+    """Один фейковий гравець: підключення, join, ready, гра до кінця"""
+
+    def __init__(self, tester, index):
+        self.tester = tester
+        self.name = f"load_{index}"
+        self.reader = None
+        self.writer = None
+        self.codec = JSON_CODEC
+        self.decoder = FrameDecoder()
+
+        self.join_sent = None
+        self.action_sent = None
+        self.ping_sent = None
+
+        self.position = None
+        self.hand = []
+        self.table = []
+        self.is_attacker = False
+        self.opponent_hand_size = 0
+        self.deck_size = 0
+        self.seq = None
+        self.sync_pending = False
+        self.in_game = False
+        self.retry_after = None  # Підказка server_busy: через скільки секунд повторити підключення
+
+    async def run(self):
+        """Гра з повторними підключеннями, поки сервер відповідає server_busy"""
+        while True:
+            self.retry_after = None
+            await self.play_session()
+            if self.retry_after is None:
+                return
+            await asyncio.sleep(self.retry_after)
+
+    async def play_session(self):
+        tester = self.tester
+        host, port = tester.host, tester.port
+        self.codec = JSON_CODEC
+        self.decoder = FrameDecoder()
+        try:
+            start = time.perf_counter()
+            self.reader, self.writer = await asyncio.wait_for(
+                asyncio.open_connection(host, port), tester.timeout)
+            tester.record('connect', time.perf_counter() - start)
+        except (OSError, asyncio.TimeoutError) as e:
+            tester.fail('connect', e)
+            return
+
+        try:
+            self.join_sent = time.perf_counter()
+            self.send({'type': 'join', 'name': self.name, 'codecs': tester.codecs})
+            await self.writer.drain()
+            await self.read_loop()
+        except (OSError, asyncio.IncompleteReadError) as e:
+            tester.fail('connection', e)
+        finally:
+            self.close()
+
+    def send(self, message):
+        self.writer.write(self.codec.encode(message))
+
+    async def read_loop(self):
+        tester = self.tester
+        deadline = time.perf_counter() + tester.duration
+        next_ping = time.perf_counter() + tester.ping_interval
+
+        while True:
+            now = time.perf_counter()
+            if now >= deadline:
+                tester.fail('timeout', "гра не завершилась вчасно")
+                return
+            if self.ping_sent is None and now >= next_ping:
+                self.ping_sent = now
+                self.send({'type': 'ping'})
+                next_ping = now + tester.ping_interval
+
+            try:
+                data = await asyncio.wait_for(self.reader.read(RECV_CHUNK_SIZE),
+                                              min(tester.ping_interval, deadline - now))
+            except asyncio.TimeoutError:
+                continue
+            if not data:
+                tester.fail('connection', "сервер закрив з'єднання")
+                return
+
+            self.decoder.feed(data)
+            for frame in self.decoder.frames():
+                if not self.handle_message(decode_frame(frame)):
+                    return
+            await self.writer.drain()
+
+    def handle_message(self, message):
+        """Обробка повідомлення сервера. False - гравець завершив роботу"""
+        tester = self.tester
+        msg_type = message.get('type')
+        now = time.perf_counter()
+
+        if msg_type == 'server_busy':
+            tester.busy += 1
+            self.retry_after = message.get('retry_after', 1)
+            return False
+
+        elif msg_type == 'join_success':
+            tester.record('join', now - self.join_sent)
+            self.codec = CODECS.get(message.get('codec'), JSON_CODEC)
+            self.send({'type': 'ready'})
+
+        elif msg_type == 'game_start_bundle':
+            tester.record('game_start', now - self.join_sent)
+            tester.games_started += 1
+            self.in_game = True
+            self.position = message.get('position')
+            self.hand = message.get('hand', [])
+            self.table = []
+            self.is_attacker = message.get('is_attacker', False)
+            self.seq = message.get('seq', 0)
+            self.play()
+
+        elif msg_type in ('state_delta', 'action_rejected'):
+            if self.action_sent is not None and (msg_type == 'action_rejected' or message.get('seat') == self.position):
+                tester.record('action', now - self.action_sent)
+                self.action_sent = None
+            if msg_type == 'action_rejected':
+                tester.rejected += 1
+                return True
+            if not apply_delta(self, message):
+                if not self.sync_pending:
+                    self.sync_pending = True
+                    tester.resyncs += 1
+                    self.send({'type': 'sync_request', 'seq': self.seq})
+                return True
+            self.play()
+
+        elif msg_type == 'state_snapshot':
+            apply_snapshot(self, message)
+            self.sync_pending = False
+            self.play()
+
+        elif msg_type == 'game_over':
+            tester.games_finished += 1
+            return False
+
+        elif msg_type == 'opponent_disconnected':
+            tester.fail('opponent', "суперник від'єднався")
+            return False
+
+        elif msg_type == 'pong':
+            if self.ping_sent is not None:
+                tester.record('ping', now - self.ping_sent)
+                self.ping_sent = None
+
+        elif msg_type == 'ping':
+            self.send({'type': 'pong'})
+
+        return True
+
+    def play(self):
+        """Найпростіша стратегія: ходити першою картою, відбиватися найменшою можливою, інакше брати"""
+        if not self.in_game or self.action_sent is not None:
+            return
+        unbeaten = [index for index, (_, defense) in enumerate(self.table) if defense is None]
+
+        if self.is_attacker:
+            if not self.table and self.hand:
+                self.send_action('attack', {'card': self.hand[0]})
+            elif self.table and not unbeaten:
+                self.send_action('pass', {})
+        elif unbeaten:
+            attack = self.table[unbeaten[0]][0]
+            beaters = [card for card in self.hand if self.beats(card, attack)]
+            if beaters:
+                card = min(beaters, key=lambda c: (c.get('is_trump', False), c['rank']))
+                self.send_action('defend', {'card': card, 'target': unbeaten[0]})
+            else:
+                self.send_action('take', {})
+
+    @staticmethod
+    def beats(card, attack):
+        if card['suit'] == attack['suit']:
+            return card['rank'] > attack['rank']
+        return card.get('is_trump', False)
+
+    def send_action(self, action, data):
+        self.action_sent = time.perf_counter()
+        self.send({'type': 'game_action', 'action': action, 'data': data})
+
+    def close(self):
+        if self.writer is None:
+            return
+        try:
+            self.send({'type': 'disconnect'})
+        except (OSError, RuntimeError):
+            pass
+        self.writer.close()
+
+
+class LoadTester:
+    """Керує роєм гравців та збирає статистику"""
+
+    def __init__(self, host, port, clients, connect_rate=500, duration=120,
+                 ping_interval=5.0, timeout=10.0, codecs=None):
+        self.host = host
+        self.port = port
+        self.clients = clients
+        self.connect_rate = connect_rate
+        self.duration = duration
+        self.ping_interval = ping_interval
+        self.timeout = timeout
+        self.codecs = codecs or list(CODECS)
+
+        self.stats = {name: LatencyStats() for name, _ in METRICS}
+        self.failures = {}
+        self.games_started = 0
+        self.games_finished = 0
+        self.rejected = 0
+        self.resyncs = 0
+        self.busy = 0
+        self.elapsed = 0.0
+
+    def record(self, metric, seconds):
+        self.stats[metric].add(seconds)
+
+    def fail(self, kind, error):
+        self.failures[kind] = self.failures.get(kind, 0) + 1
+
+    async def run(self, sampler=None):
+        stop_event = asyncio.Event()
+        sampler_task = asyncio.ensure_future(sampler.run(stop_event)) if sampler else None
+
+        start = time.perf_counter()
+        players = []
+        for index in range(self.clients):
+            players.append(asyncio.ensure_future(FakePlayer(self, index).run()))
+            # Рівномірне нарощування підключень
+            if self.connect_rate and (index + 1) % max(1, self.connect_rate // 10) == 0:
+                await asyncio.sleep(0.1)
+        await asyncio.gather(*players)
+        self.elapsed = time.perf_counter() - start
+
+        stop_event.set()
+        if sampler_task:
+            await sampler_task
+
+    def print_report(self, sampler=None):
+        print("\n" + "=" * 60)
+        print("📊 РЕЗУЛЬТАТИ НАВАНТАЖУВАЛЬНОГО ТЕСТУ")
+        print("=" * 60)
+        print(f"👥 Гравців: {self.clients}, час: {self.elapsed:.1f} с")
+        print(f"🎮 Ігор розпочато (гравцями): {self.games_started}, завершено: {self.games_finished}")
+        print(f"🚫 Відхилених дій: {self.rejected}")
+        print(f"🔄 Запитів повного стану: {self.resyncs}")
+        print(f"🚧 Відповідей server_busy: {self.busy}")
+        if self.failures:
+            failures = ", ".join(f"{kind}: {count}" for kind, count in sorted(self.failures.items()))
+            print(f"❌ Збої: {failures}")
+
+        header = "".join(f"{'p' + str(p):>10}" for p in PERCENTILES)
+        print(f"\n{'Метрика':<32}{'N':>8}{header}{'max':>10}   (мс)")
+        for name, title in METRICS:
+            stats = self.stats[name]
+            if not stats:
+                print(f"{title:<32}{0:>8}")
+                continue
+            values = "".join(f"{stats.percentile(p) * 1000:>10.1f}" for p in PERCENTILES)
+            print(f"{title:<32}{len(stats):>8}{values}{max(stats.samples) * 1000:>10.1f}")
+
+        if sampler is not None:
+            if sampler.available and sampler.cpu_samples:
+                average = sum(sampler.cpu_samples) / len(sampler.cpu_samples)
+                print(f"\n🖥️  CPU сервера: середнє {average:.0f}%, пік {max(sampler.cpu_samples):.0f}%")
+                print(f"🧠 RSS сервера (пік): {sampler.peak_rss / (1024 * 1024):.1f} МБ")
+            else:
+                print("\n⚠️ Заміри CPU/RSS сервера недоступні (потрібен Linux /proc)")
+        print("=" * 60)
+
+
+def raise_file_limit():
+    """Піднімає ліміт дескрипторів до жорсткого - тисячі сокетів у одному процесі"""
+    if resource is None:
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        try:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+        except (ValueError, OSError):
+            pass
+
+
+def spawn_server(host, port, engine, workers, max_clients=None):
+    """Запускає run_server.py окремим процесом і чекає, поки порт почне приймати з'єднання"""
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'run_server.py')
+    command = [sys.executable, script, host, str(port), '--engine', engine, '--workers', str(workers)]
+    if max_clients is not None:
+        command += ['--max-clients', str(max_clients)]
+    process = subprocess.Popen(
+        command,
+        stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    deadline = time.time() + 10
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("Сервер завершився під час запуску")
+        try:
+            with socket.create_connection((host, port), timeout=0.5):
+                return process
+        except OSError:
+            time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError("Сервер не почав приймати з'єднання")
+
+
+def stop_server(process):
+    """Коректна зупинка запущеного сервера командою quit"""
+    try:
+        process.stdin.write(b"quit\n")
+        process.stdin.flush()
+        process.wait(timeout=10)
+    except (OSError, subprocess.TimeoutExpired):
+        process.terminate()
+        process.wait()
+
+
+def parse_args(argv=None):
+    """Розбір аргументів командного рядка"""
+    parser = argparse.ArgumentParser(description="Навантажувальний тест сервера гри Дурак")
+    parser.add_argument('host', nargs='?', default='localhost', help="адреса сервера")
+    parser.add_argument('port', nargs='?', type=int, default=12345, help="порт сервера")
+    parser.add_argument('--clients', type=int, default=1000, help="кількість фейкових гравців")
+    parser.add_argument('--connect-rate', type=int, default=500, help="нових підключень за секунду (0 - без обмеження)")
+    parser.add_argument('--duration', type=float, default=120, help="максимальний час гри одного гравця, с")
+    parser.add_argument('--ping-interval', type=float, default=5.0, help="інтервал пінгу, с")
+    parser.add_argument('--codec', choices=sorted(CODECS), help="примусовий формат кадрів")
+    parser.add_argument('--server-pid', type=int, help="PID вже запущеного сервера для замірів CPU/RSS")
+    parser.add_argument('--spawn', action='store_true', help="запустити сервер самостійно")
+    parser.add_argument('--engine', default='threads', help="рушій сервера для --spawn")
+    parser.add_argument('--workers', type=int, default=1, help="кількість воркерів для --spawn")
+    parser.add_argument('--max-clients', type=int, help="ліміт з'єднань сервера для --spawn (перевірка server_busy)")
+    args = parser.parse_args(argv)
+
+    if args.clients < 1:
+        parser.error("--clients має бути не менше 1")
+    return args
+
+
+def main():
+    args = parse_args()
+    raise_file_limit()
+
+    process = None
+    if args.spawn:
+        process = spawn_server(args.host, args.port, args.engine, args.workers, args.max_clients)
+        args.server_pid = process.pid
+        print(f"🚀 Сервер запущено (PID {process.pid}, рушій {args.engine}, воркерів {args.workers})")
+
+    sampler = ProcessSampler(args.server_pid) if args.server_pid else None
+    tester = LoadTester(
+        args.host, args.port, args.clients,
+        connect_rate=args.connect_rate,
+        duration=args.duration,
+        ping_interval=args.ping_interval,
+        codecs=[args.codec] if args.codec else None
+    )
+
+    print(f"🐝 {args.clients} гравців -> {args.host}:{args.port}")
+    try:
+        asyncio.run(tester.run(sampler))
+    except KeyboardInterrupt:
+        print("\n🛑 Тест перервано")
+    finally:
+        if process is not None:
+            stop_server(process)
+
+    tester.print_report(sampler)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,93 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class MatchQueue:
+    """
+    Потокобезпечна черга очікування гравців.
+    Побудована на OrderedDict, тому додавання, вилучення з голови, повернення в голову
+    та скасування довільного гравця виконуються за O(1).
+    Для кожного гравця зберігається час постановки в чергу;
+    on_matched(seconds) викликається з часом очікування кожного гравця, що потрапив у пару.
+    """
+
+    def __init__(self, on_matched=None):
+        self._entries = OrderedDict()  # {key: enqueue_time}
+        self._lock = threading.Lock()
+        self.on_matched = on_matched
+
+    def push(self, key):
+        """Додає гравця в кінець черги. False - гравець вже в черзі"""
+        with self._lock:
+            if key in self._entries:
+                return False
+            self._entries[key] = time.time()
+            return True
+
+    def push_front(self, key, enqueue_time=None):
+        """Повертає гравця в голову черги (зі збереженням часу очікування)"""
+        with self._lock:
+            self._entries[key] = enqueue_time or self._entries.get(key) or time.time()
+            self._entries.move_to_end(key, last=False)
+
+    def pop(self):
+        """Вилучає гравця з голови черги; None, якщо черга порожня"""
+        with self._lock:
+            if not self._entries:
+                return None
+            key, _ = self._entries.popitem(last=False)
+            return key
+
+    def remove(self, key):
+        """Скасовує очікування гравця. False - гравця в черзі не було"""
+        with self._lock:
+            return self._entries.pop(key, None) is not None
+
+    def pop_pairs(self, is_alive=None):
+        """
+        Забирає з голови черги всі можливі пари гравців за один прохід.
+        Гравці, для яких is_alive повертає False, відкидаються;
+        непарний живий гравець залишається в голові черги.
+        Повертає список пар (key1, key2).
+        """
+        pairs = []
+        waits = []
+        with self._lock:
+            entries = self._entries
+            pending = None
+            while entries:
+                key, enqueue_time = entries.popitem(last=False)
+                if is_alive is not None and not is_alive(key):
+                    continue
+                if pending is None:
+                    pending = (key, enqueue_time)
+                    continue
+                pairs.append((pending[0], key))
+                waits.extend((pending[1], enqueue_time))
+                pending = None
+
+            if pending is not None:
+                entries[pending[0]] = pending[1]
+                entries.move_to_end(pending[0], last=False)
+
+        if self.on_matched is not None and waits:
+            now = time.time()
+            for enqueue_time in waits:
+                self.on_matched(now - enqueue_time)
+        return pairs
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __iter__(self):
+        with self._lock:
+            return iter(list(self._entries))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
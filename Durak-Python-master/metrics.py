@@ -0,0 +1,351 @@
+"""
+Легка підсистема метрик сервера: лічильники, датчики та гістограми в стилі HDR.
+Запис метрики - кілька арифметичних операцій під власним блокуванням метрики.
+Метрики віддаються у текстовому форматі Prometheus (render) через локальний HTTP-порт.
+"""
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Гістограма: значення в мікросекундах, 2**SUB_BUCKET_BITS під-кошиків на кожну степінь двійки,
+# тобто відносна похибка не більша за 1/8
+SUB_BUCKET_BITS = 3
+SUB_BUCKET_COUNT = 1 << SUB_BUCKET_BITS
+MAX_EXPONENT = 36  # ~19 годин у мікросекундах - більші значення потрапляють в останній кошик
+BUCKET_COUNT = (MAX_EXPONENT - SUB_BUCKET_BITS + 1) * SUB_BUCKET_COUNT
+
+
+def bucket_index(value_us):
+    """Номер кошика для цілого значення в мікросекундах - O(1), без пошуку"""
+    if value_us < SUB_BUCKET_COUNT:
+        return max(value_us, 0)
+    exponent = value_us.bit_length() - SUB_BUCKET_BITS - 1
+    index = (exponent + 1) * SUB_BUCKET_COUNT + (value_us >> exponent) - SUB_BUCKET_COUNT
+    return min(index, BUCKET_COUNT - 1)
+
+
+def bucket_upper_bound(index):
+    """Найбільше значення (мкс), що потрапляє в кошик"""
+    if index < SUB_BUCKET_COUNT:
+        return index
+    exponent = index // SUB_BUCKET_COUNT - 1
+    mantissa = index % SUB_BUCKET_COUNT + SUB_BUCKET_COUNT
+    return ((mantissa + 1) << exponent) - 1
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_value(value):
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+
+class _CounterChild:
+    __slots__ = ('value', 'lock')
+
+    def __init__(self):
+        self.value = 0
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+
+class _GaugeChild:
+    __slots__ = ('value', 'lock')
+
+    def __init__(self):
+        self.value = 0
+        self.lock = threading.Lock()
+
+    def set(self, value):
+        self.value = value
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+    def dec(self, amount=1):
+        with self.lock:
+            self.value -= amount
+
+
+class _HistogramChild:
+    __slots__ = ('counts', 'count', 'total', 'lock')
+
+    def __init__(self):
+        self.counts = [0] * BUCKET_COUNT
+        self.count = 0
+        self.total = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, seconds):
+        """Запис значення в секундах"""
+        index = bucket_index(int(seconds * 1_000_000))
+        with self.lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.total += seconds
+
+    def percentile(self, percent):
+        """Оцінка перцентиля (с) за верхніми межами кошиків; None - значень ще немає"""
+        with self.lock:
+            if not self.count:
+                return None
+            rank = max(1, -(-self.count * percent // 100))
+            seen = 0
+            for index, bucket in enumerate(self.counts):
+                seen += bucket
+                if seen >= rank:
+                    return bucket_upper_bound(index) / 1_000_000
+        return bucket_upper_bound(BUCKET_COUNT - 1) / 1_000_000
+
+    def snapshot(self):
+        with self.lock:
+            return list(self.counts), self.count, self.total
+
+
+class Metric:
+    """Метрика з необов'язковими мітками; labels(...) повертає дочірню метрику для значень міток"""
+    kind = 'untyped'
+    child_class = None
+
+    def __init__(self, name, documentation, label_names=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._children = {}
+        self._lock = threading.Lock()
+        if not self.label_names:
+            self._default = self.labels()
+
+    def labels(self, *values):
+        values = tuple(str(value) for value in values)
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.label_names):
+                raise ValueError(f"{self.name}: очікувались мітки {self.label_names}")
+            with self._lock:
+                child = self._children.setdefault(values, self.child_class())
+        return child
+
+    def children(self):
+        with self._lock:
+            return sorted(self._children.items())
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in self.children():
+            lines.extend(self.render_child(values, child))
+        return lines
+
+    def render_child(self, values, child):
+        labels = _format_labels(self.label_names, values)
+        return [f"{self.name}{labels} {_format_value(child.value)}"]
+
+
+class Counter(Metric):
+    kind = 'counter'
+    child_class = _CounterChild
+
+    def inc(self, amount=1):
+        self._default.inc(amount)
+
+
+class Gauge(Metric):
+    """Датчик; з function значення обчислюється під час читання"""
+    kind = 'gauge'
+    child_class = _GaugeChild
+
+    def __init__(self, name, documentation, label_names=(), function=None):
+        Metric.__init__(self, name, documentation, label_names)
+        self.function = function
+
+    def set(self, value):
+        self._default.set(value)
+
+    def inc(self, amount=1):
+        self._default.inc(amount)
+
+    def dec(self, amount=1):
+        self._default.dec(amount)
+
+    def render_child(self, values, child):
+        if self.function is not None:
+            child.set(self.function())
+        return Metric.render_child(self, values, child)
+
+
+class Histogram(Metric):
+    """Гістограма затримок у секундах (логарифмічно-лінійні кошики)"""
+    kind = 'histogram'
+    child_class = _HistogramChild
+
+    def observe(self, seconds):
+        self._default.observe(seconds)
+
+    def percentile(self, percent):
+        return self._default.percentile(percent)
+
+    def render_child(self, values, child):
+        counts, count, total = child.snapshot()
+        lines = []
+        cumulative = 0
+        # Prometheus отримує межі лише на степенях двійки - дрібні кошики лишаються для перцентилів
+        for index in range(BUCKET_COUNT):
+            cumulative += counts[index]
+            if index % SUB_BUCKET_COUNT == SUB_BUCKET_COUNT - 1:
+                bound = (bucket_upper_bound(index) + 1) / 1_000_000
+                labels = _format_labels(self.label_names, values, ('le', repr(bound)))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = _format_labels(self.label_names, values, ('le', '+Inf'))
+        lines.append(f"{self.name}_bucket{labels} {count}")
+        labels = _format_labels(self.label_names, values)
+        lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+        lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """Набір метрик процесу"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Метрику {metric.name} вже зареєстровано")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, label_names=()):
+        return self._register(Counter(name, documentation, label_names))
+
+    def gauge(self, name, documentation, label_names=(), function=None):
+        return self._register(Gauge(name, documentation, label_names, function))
+
+    def histogram(self, name, documentation, label_names=()):
+        return self._register(Histogram(name, documentation, label_names))
+
+    def get(self, name):
+        return self._metrics.get(name)
+
+    def render(self):
+        """Усі метрики у текстовому форматі Prometheus"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def summary_lines(self):
+        """Короткий людський звіт: лічильники, датчики та p50/p99 гістограм"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            for values, child in metric.children():
+                labels = _format_labels(metric.label_names, values)
+                if isinstance(metric, Histogram):
+                    if not child.count:
+                        continue
+                    p50 = child.percentile(50) * 1000
+                    p99 = child.percentile(99) * 1000
+                    lines.append(f"{metric.name}{labels}: n={child.count} p50={p50:.2f}мс p99={p99:.2f}мс")
+                else:
+                    if isinstance(metric, Gauge) and metric.function is not None:
+                        child.set(metric.function())
+                    lines.append(f"{metric.name}{labels}: {child.value}")
+        return lines
+
+
+def _label_sample(line, name, value):
+    """Додає мітку до рядка-зразка тексту Prometheus"""
+    label = f'{name}="{_escape(value)}"'
+    sample, _, rest = line.partition(' ')
+    if sample.endswith('}'):
+        brace = sample.index('{')
+        sample = f"{sample[:brace + 1]}{label},{sample[brace + 1:]}"
+    else:
+        sample = f"{sample}{{{label}}}"
+    return f"{sample} {rest}"
+
+
+def merge_expositions(texts, label_name):
+    """
+    Об'єднує тексти Prometheus кількох процесів в один.
+    texts - пари (значення мітки, текст); зразки кожного процесу отримують мітку label_name,
+    а HELP/TYPE кожної метрики виводяться один раз.
+    """
+    families = {}  # {назва метрики: (заголовки, зразки)}
+    for value, text in texts:
+        family = None
+        for line in text.splitlines():
+            if line.startswith('# HELP ') or line.startswith('# TYPE '):
+                family = families.setdefault(line.split(' ', 3)[2], ([], []))
+                if line not in family[0]:
+                    family[0].append(line)
+            elif line and not line.startswith('#') and family is not None:
+                family[1].append(_label_sample(line, label_name, value))
+
+    lines = []
+    for headers, samples in families.values():
+        lines.extend(headers)
+        lines.extend(samples)
+    return "\n".join(lines) + "\n"
+
+
+class MetricsEndpoint:
+    """Локальний HTTP-сервер, що віддає метрики на /metrics"""
+
+    def __init__(self, render, host='127.0.0.1', port=9108):
+        self.render = render
+        self.host = host
+        self.port = port
+        self.httpd = None
+        self.thread = None
+
+    def start(self):
+        render = self.render
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?', 1)[0] not in ('/', '/metrics'):
+                    self.send_error(404)
+                    return
+                body = render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer((self.host, self.port), Handler)
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        if self.httpd is not None:
+            self.httpd.shutdown()
+            self.httpd.server_close()
+            self.httpd = None
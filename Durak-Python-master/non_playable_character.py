@@ -1,5 +1,89 @@
-from player import Player
+import random
+
+from game_model import Player
+from constants import RANKS
+import ismcts
 
 class simpleBot(Player):
+    __slots__ = ()
+
     def __init__(self, name, id):
-        Player.__init__(self, name, False, id)
\ No newline at end of file
+        Player.__init__(self, name, False, id)
+
+    @staticmethod
+    def card_cost(game, card):
+        # козирі найдорожчі, далі за рангом
+        return (card // len(RANKS) == game.trump_index, card % len(RANKS))
+
+    def choose_action(self, game, seat):
+        """Найпростіша стратегія: ходити та відбиватися наймолодшою картою, козирі берегти"""
+        actions = game.legal_actions(seat)
+        card_actions = [a for a in actions if a[1] is not None]
+        other_actions = [a for a in actions if a[1] is None]
+
+        if seat == game.attacker and game.table:
+            # підкидаємо лише некозирні карти
+            card_actions = [a for a in card_actions if a[1] // len(RANKS) != game.trump_index]
+
+        if card_actions:
+            return min(card_actions, key=lambda a: self.card_cost(game, a[1]))
+        return other_actions[0] if other_actions else None
+
+
+class mctsBot(simpleBot):
+    """
+    Бот на ISMCTS (див. ismcts.py): на кожен хід - пошук у межах time_budget секунд.
+    Бачить лише те, що бачив би гравець: карти, які суперник забрав зі столу, запам'ятовує,
+    решту його руки домислює випадково.
+    pool + workers - root-parallel пошук у пулі процесів (ismcts.make_pool()).
+    """
+    __slots__ = ('time_budget', 'iterations', 'pool', 'workers', 'rng',
+                 'tracked_game', 'opponent_known', 'last_table', 'last_stats')
+
+    def __init__(self, name, id, time_budget=ismcts.DEFAULT_TIME_BUDGET, iterations=None,
+                 pool=None, workers=None, seed=None):
+        simpleBot.__init__(self, name, id)
+        self.time_budget = time_budget
+        self.iterations = iterations
+        self.pool = pool
+        self.workers = workers
+        self.rng = random.Random(seed)
+        self.tracked_game = None
+        self.opponent_known = 0
+        self.last_table = 0
+        self.last_stats = None
+
+    def observe(self, game, seat):
+        """
+        Облік карт суперника за відкритим станом: карти, що були на столі минулого ходу бота
+        і не потрапили ні у відбій, ні в його руку, забрав суперник
+        """
+        if game is not self.tracked_game:
+            self.tracked_game = game
+            self.opponent_known = 0
+            self.last_table = 0
+        own = game.hands[seat].mask
+        taken = self.last_table & ~game.table_mask & ~game.discard.mask & ~own
+        self.opponent_known = (self.opponent_known | taken) & ~game.table_mask & ~game.discard.mask
+
+    def choose_action(self, game, seat):
+        """Найвідвідуваніша дія кореня пошуку"""
+        self.observe(game, seat)
+        actions = game.legal_actions(seat)
+        if len(actions) <= 1:
+            action = actions[0] if actions else None
+        else:
+            info = ismcts.InfoSet(game, seat, self.opponent_known)
+            seed = self.rng.getrandbits(32)
+            if self.pool is not None:
+                self.last_stats = ismcts.parallel_search(info, self.pool, self.workers or 1, self.time_budget,
+                                                         self.iterations, seed)
+            else:
+                self.last_stats = ismcts.search(info, self.time_budget, self.iterations, seed)
+            action = ismcts.best_action(self.last_stats)
+
+        # Стіл після власного ходу: наступного разу видно, що з ним сталося
+        self.last_table = game.table_mask
+        if action is not None and action[1] is not None:
+            self.last_table |= 1 << action[1]
+        return action
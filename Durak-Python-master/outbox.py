@@ -0,0 +1,354 @@
+"""
+Черги вихідних кадрів з'єднань.
+Відправник ніколи не чекає на повільного клієнта: кадр записується одразу неблокуючим
+send (MSG_DONTWAIT), а те, що не влізло в буфер ядра, лишається в черзі з'єднання -
+її дописує спільний потік OutboundWriter, коли сокет знову готовий до запису.
+Усе, що накопичилось у черзі (або поки з'єднання "закорковане" на час обробки пачки
+вхідних кадрів), відправляється одним записом.
+
+Якщо черга перевищує high_water байтів, спрацьовує політика з'єднання:
+    disconnect - з'єднання розривається (гравець може відновити сесію, див. replay.py);
+    drop       - новий кадр відкидається;
+    block      - кадр приймається, а обробник з'єднання не читає нових запитів клієнта, доки
+                 черга не спаде до low_water (не довше block_timeout, потім розрив).
+                 Відправник - зазвичай обробник суперника під блокуванням гри - не чекає ніколи;
+                 черга понад BLOCK_HARD_LIMIT * high_water розриває з'єднання одразу.
+"""
+import asyncio
+import selectors
+import socket
+import threading
+
+from eventlog import get_logger
+
+log = get_logger('outbox')
+
+POLICIES = ('disconnect', 'drop', 'block')
+DEFAULT_HIGH_WATER = 256 * 1024
+DEFAULT_BLOCK_TIMEOUT = 5.0
+BLOCK_HARD_LIMIT = 4  # Політика block: у скільки разів черга може перевищити high_water
+
+# Неблокуючий запис без зміни режиму сокета: обробник читає з нього блокуюче
+_DONTWAIT = getattr(socket, 'MSG_DONTWAIT', 0)
+
+
+class Outbox:
+    """
+    Черга відправки одного з'єднання (рушій з потоками).
+    on_overflow(outbox, action) викликається при переповненні: action - 'drop' або 'disconnect'.
+    """
+
+    def __init__(self, sock, writer, high_water=DEFAULT_HIGH_WATER, policy='disconnect',
+                 on_overflow=None, block_timeout=DEFAULT_BLOCK_TIMEOUT):
+        self.sock = sock
+        self.writer = writer
+        self.buffer = bytearray()
+        self.lock = threading.Lock()
+        self.drained = threading.Condition(self.lock)
+        self.high_water = high_water
+        self.policy = policy
+        self.on_overflow = on_overflow
+        self.block_timeout = block_timeout
+        self.corked = 0
+        self.scheduled = False  # Черга вже передана потоку відправки
+        self.closed = False
+
+    @property
+    def low_water(self):
+        return self.high_water // 4
+
+    def __len__(self):
+        return len(self.buffer)
+
+    def push(self, frame):
+        """Кадр у чергу. False - кадр не буде відправлено (з'єднання закрито або черга переповнена)"""
+        action = None
+        with self.lock:
+            if self.closed:
+                return False
+            if len(self.buffer) + len(frame) > self.high_water and self.corked:
+                self._flush_locked()  # Закорковане накопичення не повинно саме спричиняти переповнення
+            if len(self.buffer) + len(frame) > self.high_water:
+                if self.policy == 'block':
+                    # Чекає обробник цього з'єднання (wait_writable), а не відправник
+                    if len(self.buffer) + len(frame) > self.high_water * BLOCK_HARD_LIMIT:
+                        action = 'disconnect'
+                        self._close_locked()
+                elif self.policy == 'drop':
+                    action = 'drop'
+                else:
+                    action = 'disconnect'
+                    self._close_locked()
+
+            if action is None:
+                self.buffer += frame
+                if not self.corked:
+                    self._flush_locked()
+                    if self.buffer and not self.closed:
+                        self._schedule_locked()
+
+        if action is not None:
+            if self.on_overflow is not None:
+                self.on_overflow(self, action)
+            return False
+        return True
+
+    def wait_writable(self):
+        """
+        Політика block: обробник з'єднання чекає тут (без жодних блокувань гри) перед читанням
+        наступних запитів, доки черга не спаде до low_water. False - не дочекався, з'єднання закрито
+        """
+        with self.lock:
+            if self.policy != 'block' or self.closed or len(self.buffer) <= self.high_water:
+                return not self.closed
+            self._schedule_locked()
+            drained = self.drained.wait_for(
+                lambda: self.closed or len(self.buffer) <= self.low_water, self.block_timeout)
+            if self.closed:
+                return False
+            if drained:
+                return True
+            self._close_locked()
+        if self.on_overflow is not None:
+            self.on_overflow(self, 'disconnect')
+        return False
+
+    def cork(self):
+        """Накопичувати кадри без запису до uncork() (обробка пачки вхідних кадрів)"""
+        with self.lock:
+            self.corked += 1
+
+    def uncork(self):
+        """Записує все накопичене одним send"""
+        with self.lock:
+            self.corked -= 1
+            if not self.corked and self.buffer and not self.closed:
+                self._flush_locked()
+                if self.buffer:
+                    self._schedule_locked()
+
+    def flush(self):
+        """Дозапис черги потоком відправки. True - черга порожня (або з'єднання закрито)"""
+        with self.lock:
+            self.scheduled = False
+            if self.closed:
+                return True
+            self._flush_locked()
+            if self.buffer:
+                self.scheduled = True
+                return False
+            return True
+
+    def drain(self, timeout=None):
+        """Чекає, доки черга спорожніє. False - не встигла за timeout"""
+        with self.lock:
+            if self.buffer and not self.closed:
+                self._schedule_locked()
+            return self.drained.wait_for(lambda: self.closed or not self.buffer, timeout)
+
+    def close(self):
+        """Відкидає недописаний залишок; подальші кадри не приймаються"""
+        with self.lock:
+            self._close_locked()
+
+    def _close_locked(self):
+        self.closed = True
+        self.buffer.clear()
+        self.drained.notify_all()
+        if self.scheduled:
+            # Потік відправки має забути сокет, поки його дескриптор не отримало нове з'єднання
+            self.writer.schedule(self)
+
+    def _schedule_locked(self):
+        if not self.scheduled:
+            self.scheduled = True
+            self.writer.schedule(self)
+
+    def _flush_locked(self):
+        try:
+            sent = self.sock.send(self.buffer, _DONTWAIT)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError as e:
+            # З'єднання вже мертве - обробник клієнта помітить це під час читання
+            log.debug('outbox_send_failed', "🔌 Помилка запису в сокет: {error}", error=str(e))
+            self._close_locked()
+            return
+        del self.buffer[:sent]
+        if len(self.buffer) <= self.low_water:
+            self.drained.notify_all()
+
+
+class OutboundWriter:
+    """Один потік на всі з'єднання: дописує черги, коли сокети знову готові до запису"""
+
+    def __init__(self):
+        self.selector = selectors.DefaultSelector()
+        self.wake_reader, self.wake_writer = socket.socketpair()
+        self.wake_reader.setblocking(False)
+        self.wake_writer.setblocking(False)
+        self.selector.register(self.wake_reader, selectors.EVENT_READ)
+        self.pending = []
+        self.lock = threading.Lock()
+        self.running = False
+        self.thread = None
+
+    def schedule(self, outbox):
+        """Передає чергу потоку відправки (викликається під блокуванням черги)"""
+        with self.lock:
+            self.pending.append(outbox)
+        try:
+            self.wake_writer.send(b'\0')
+        except (BlockingIOError, OSError):
+            pass  # Потік і так буде розбуджено
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self.run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def run(self):
+        while self.running:
+            for key, _ in self.selector.select(1.0):
+                if key.fileobj is self.wake_reader:
+                    try:
+                        while self.wake_reader.recv(4096):
+                            pass
+                    except (BlockingIOError, OSError):
+                        pass
+                elif key.data.flush():
+                    self._unregister(key.fileobj)
+
+            with self.lock:
+                pending, self.pending = self.pending, []
+            for outbox in pending:
+                if outbox.flush():
+                    self._unregister(outbox.sock)
+                else:
+                    self._register(outbox)
+
+    def _register(self, outbox):
+        try:
+            self.selector.register(outbox.sock, selectors.EVENT_WRITE, outbox)
+        except KeyError:
+            # Сокет уже зареєстровано, або дескриптор лишився від закритого сокета з тим самим номером
+            self.selector.unregister(outbox.sock.fileno())
+            self.selector.register(outbox.sock, selectors.EVENT_WRITE, outbox)
+        except (ValueError, OSError):
+            outbox.close()
+
+    def _unregister(self, sock):
+        try:
+            self.selector.unregister(sock)
+        except (KeyError, ValueError):
+            pass
+
+    def stop(self):
+        self.running = False
+        try:
+            self.wake_writer.send(b'\0')
+        except OSError:
+            pass
+
+
+class AsyncOutbox:
+    """
+    Черга відправки з'єднання asyncio з тим самим інтерфейсом.
+    Буфер транспорту вже дописується петлею; тут - злиття закоркованих кадрів та політика
+    переповнення. Політика block призупиняє читання від клієнта, доки його буфер не спаде
+    (не довше block_timeout), і так само розриває з'єднання понад BLOCK_HARD_LIMIT * high_water.
+    """
+
+    def __init__(self, writer, loop, high_water=DEFAULT_HIGH_WATER, policy='disconnect', on_overflow=None,
+                 block_timeout=DEFAULT_BLOCK_TIMEOUT):
+        self.sock = writer
+        self.loop = loop
+        self.frames = []
+        self.size = 0
+        self.high_water = high_water
+        self.policy = policy
+        self.on_overflow = on_overflow
+        self.block_timeout = block_timeout
+        self.corked = 0
+        self.paused = False
+        self.closed = False
+        # drain() чекає до low_water, лише якщо буфер транспорту вже перевищив high_water
+        writer.transport.set_write_buffer_limits(high=high_water, low=self.low_water)
+
+    @property
+    def low_water(self):
+        return self.high_water // 4
+
+    def __len__(self):
+        return self.size + self.sock.transport.get_write_buffer_size()
+
+    def push(self, frame):
+        writer = self.sock
+        if self.closed or writer.is_closing():
+            return False
+        if len(self) + len(frame) > self.high_water and self.frames:
+            self._write_corked()  # Закорковане накопичення не повинно саме спричиняти переповнення
+        if len(self) + len(frame) > self.high_water:
+            if self.policy == 'block' and len(self) + len(frame) <= self.high_water * BLOCK_HARD_LIMIT:
+                self.pause_reading()
+            else:
+                action = 'drop' if self.policy == 'drop' else 'disconnect'
+                if action == 'disconnect':
+                    self.close()
+                if self.on_overflow is not None:
+                    self.on_overflow(self, action)
+                return False
+
+        if self.corked:
+            self.frames.append(frame)
+            self.size += len(frame)
+        else:
+            writer.write(frame)
+        return True
+
+    def cork(self):
+        self.corked += 1
+
+    def uncork(self):
+        self.corked -= 1
+        if not self.corked and self.frames:
+            self._write_corked()
+
+    def _write_corked(self):
+        data = b''.join(self.frames)
+        self.frames.clear()
+        self.size = 0
+        if not self.closed and not self.sock.is_closing():
+            self.sock.write(data)
+
+    def pause_reading(self):
+        """Політика block: не читаємо запити клієнта, доки він не вичитає відповіді"""
+        if self.paused:
+            return
+        self.paused = True
+        self.sock.transport.pause_reading()
+        self.loop.create_task(self._resume_when_drained())
+
+    async def _resume_when_drained(self):
+        try:
+            await asyncio.wait_for(self.sock.drain(), self.block_timeout)
+        except asyncio.TimeoutError:
+            if self.closed:
+                return
+            # Клієнт так і не вичитав відповіді - розриваємо, як і рушій з потоками
+            self.close()
+            if self.on_overflow is not None:
+                self.on_overflow(self, 'disconnect')
+            return
+        except ConnectionError:
+            return
+        finally:
+            self.paused = False
+        if not self.sock.is_closing():
+            self.sock.transport.resume_reading()
+
+    def close(self):
+        self.closed = True
+        self.frames.clear()
+        self.size = 0
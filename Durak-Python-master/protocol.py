@@ -0,0 +1,380 @@
+"""
+Мережевий протокол гри Дурак.
+Підтримуються два формати кадрів, які можна змішувати в одному потоці:
+  - JSON у UTF-8, що завершується символом '\n' (формат за замовчуванням);
+  - бінарний кадр: BINARY_MAGIC, довжина (u16) та тегований компактний вміст.
+Формат відповідей сервера узгоджується в повідомленні 'join' (поле 'codecs').
+"""
+import json
+import struct
+
+from constants import SUITS, RANKS
+
+FRAME_DELIMITER = b'\n'
+MAX_FRAME_SIZE = 64 * 1024  # Максимальний розмір одного кадру
+RECV_CHUNK_SIZE = 64 * 1024  # Скільки байтів читаємо за один системний виклик
+
+# Перший байт бінарного кадру; JSON-кадр ніколи не починається з нульового байта
+BINARY_MAGIC = 0x00
+BINARY_HEADER = struct.Struct('!BH')
+MAX_BINARY_PAYLOAD = 0xFFFF
+
+
+class ProtocolError(ValueError):
+    """Кадр не відповідає протоколу"""
+
+
+class FrameTooLarge(ProtocolError):
+    """Кадр перевищує допустимий розмір"""
+
+
+class FrameDecoder:
+    """
+    Інкрементальний декодер потоку кадрів.
+    Дані накопичуються в bytearray; за одне пробудження повертаються всі повні кадри,
+    а неповний хвіст чекає наступної порції.
+    """
+
+    def __init__(self, max_frame_size=MAX_FRAME_SIZE, chunk_size=RECV_CHUNK_SIZE):
+        self.max_frame_size = max_frame_size
+        self.buffer = bytearray()
+        self._chunk = bytearray(chunk_size)
+        self._chunk_view = memoryview(self._chunk)
+        # Позиція, до якої буфер вже перевірено на роздільник
+        self._scan_pos = 0
+
+    def recv_into(self, sock):
+        """Одне читання з сокета в буфер. Повертає кількість прочитаних байтів (0 - з'єднання закрито)"""
+        received = sock.recv_into(self._chunk_view)
+        if received:
+            self.buffer += self._chunk_view[:received]
+        return received
+
+    def feed(self, data):
+        """Додає вже прочитані дані (наприклад, з asyncio.StreamReader)"""
+        self.buffer += data
+
+    def frames(self):
+        """
+        Повертає список усіх повних кадрів у буфері.
+        JSON-кадри повертаються без роздільника, бінарні - разом із заголовком.
+        """
+        buffer = self.buffer
+        size = len(buffer)
+        frames = []
+        start = 0
+
+        while start < size:
+            if buffer[start] == BINARY_MAGIC:
+                if size - start < BINARY_HEADER.size:
+                    break
+                _, length = BINARY_HEADER.unpack_from(buffer, start)
+                end = start + BINARY_HEADER.size + length
+                if end > size:
+                    break
+                frames.append(bytes(buffer[start:end]))
+                start = end
+                continue
+
+            end = buffer.find(FRAME_DELIMITER, max(start, self._scan_pos))
+            if end < 0:
+                break
+            if end - start > self.max_frame_size:
+                raise FrameTooLarge(f"Кадр перевищує {self.max_frame_size} байт")
+            if end > start:
+                frames.append(bytes(buffer[start:end]))
+            start = end + 1
+
+        if start:
+            del buffer[:start]
+        self._scan_pos = len(buffer)
+
+        if len(buffer) > self.max_frame_size:
+            raise FrameTooLarge(f"Кадр перевищує {self.max_frame_size} байт")
+
+        return frames
+
+    def pending(self):
+        """Кількість байтів неповного кадру в буфері"""
+        return len(self.buffer)
+
+
+def card_id(rank, suit):
+    """Ідентифікатор карти 0..51"""
+    return SUITS.index(suit) * len(RANKS) + (rank - RANKS[0])
+
+
+def card_from_id(cid):
+    """(rank, suit) за ідентифікатором карти"""
+    suit_index, rank_index = divmod(cid, len(RANKS))
+    return RANKS[rank_index], SUITS[suit_index]
+
+
+def card_to_dict(cid, trump_suit=None):
+    """Мережеве представлення карти за ідентифікатором"""
+    rank, suit = card_from_id(cid)
+    return {'rank': rank, 'suit': suit, 'is_trump': suit == trump_suit}
+
+
+def card_id_from_dict(data):
+    """Ідентифікатор карти з мережевих даних. Некоректна карта - ValueError"""
+    try:
+        rank, suit = data['rank'], data['suit']
+    except (KeyError, TypeError):
+        raise ProtocolError("Карта має містити 'rank' та 'suit'")
+    if suit not in SUITS or rank not in RANKS:
+        raise ProtocolError(f"Невідома карта: {rank} {suit}")
+    return card_id(rank, suit)
+
+
+class JsonCodec:
+    """Текстовий формат: JSON, один кадр на рядок"""
+    name = 'json'
+
+    def encode(self, message):
+        """Серіалізація повідомлення в кадр"""
+        return (json.dumps(message, ensure_ascii=False) + '\n').encode('utf-8')
+
+    def decode(self, frame):
+        """Десеріалізація кадру без роздільника"""
+        return json.loads(frame.decode('utf-8'))
+
+
+# Теги бінарного формату
+T_NONE, T_TRUE, T_FALSE, T_INT8, T_INT32, T_INT64, T_FLOAT, T_STR, T_ATOM, T_LIST, T_DICT, T_CARD, T_TCARD, T_CARDS = range(14)
+
+# Рядки, що передаються одним байтом. Лише додавати в кінець: порядок - частина протоколу
+ATOMS = (
+    # типи повідомлень
+    'join', 'join_success', 'ready', 'game_action', 'disconnect', 'ping', 'pong', 'error',
+    'game_created', 'card_dealt', 'trump_card', 'game_started', 'game_start_bundle',
+    'opponent_disconnected', 'server_shutdown',
+    # ключі
+    'type', 'name', 'player_id', 'codec', 'codecs', 'game_id', 'position', 'opponent_name',
+    'card', 'rank', 'suit', 'is_trump', 'round', 'trump_suit', 'deck_size', 'hand',
+    'trump_card', 'is_attacker', 'attacker_name', 'message', 'action', 'data',
+    # масті
+) + SUITS + (
+    # ігровий процес
+    'attack', 'defend', 'take', 'pass', 'action_applied', 'action_rejected', 'game_over',
+    'seat', 'target', 'bout_over', 'table', 'opponent_hand_size', 'taken', 'beaten',
+    'loser', 'loser_name', 'you_lost',
+    # синхронізація стану
+    'state_delta', 'state_snapshot', 'sync_request', 'seq', 'table_len', 'table_set',
+    'hand_add', 'hand_remove',
+    # відновлення сесії
+    'mseq', 'resume', 'resume_token', 'resume_success', 'resume_failed', 'token', 'last_mseq',
+    'replayed', 'opponent_reconnecting', 'opponent_reconnected', 'grace',
+    # глядачі
+    'spectate', 'spectate_success', 'spectate_ended', 'spectator_update', 'players', 'hand_sizes',
+    'attacker', 'reason',
+)
+
+ATOM_INDEX = {atom: index for index, atom in enumerate(ATOMS)}
+
+_U16 = struct.Struct('!H')
+_I8 = struct.Struct('!b')
+_I32 = struct.Struct('!i')
+_I64 = struct.Struct('!q')
+_F64 = struct.Struct('!d')
+_TRUMP_BIT = 0x80
+
+
+def _card_byte(value):
+    """Байт карти для словника {'rank', 'suit'[, 'is_trump']} або None, якщо це не карта"""
+    if len(value) == 2:
+        keys_ok = 'rank' in value and 'suit' in value
+    elif len(value) == 3:
+        keys_ok = 'rank' in value and 'suit' in value and isinstance(value.get('is_trump'), bool)
+    else:
+        return None
+    if not keys_ok or value['suit'] not in SUITS or value['rank'] not in RANKS:
+        return None
+    cid = card_id(value['rank'], value['suit'])
+    return cid | _TRUMP_BIT if value.get('is_trump') else cid
+
+
+class BinaryCodec:
+    """
+    Компактний бінарний формат.
+    Типи повідомлень, ключі та масті кодуються одним байтом (ATOMS), карти - одним байтом
+    ідентифікатора, рука карт - масивом байтів.
+    """
+    name = 'binary'
+
+    def encode(self, message):
+        """Серіалізація повідомлення в кадр"""
+        out = bytearray(BINARY_HEADER.size)
+        self._encode_value(message, out)
+        length = len(out) - BINARY_HEADER.size
+        if length > MAX_BINARY_PAYLOAD:
+            raise FrameTooLarge(f"Кадр перевищує {MAX_BINARY_PAYLOAD} байт")
+        BINARY_HEADER.pack_into(out, 0, BINARY_MAGIC, length)
+        return bytes(out)
+
+    def decode(self, frame):
+        """Десеріалізація кадру разом із заголовком"""
+        value, _ = self._decode_value(frame, BINARY_HEADER.size)
+        return value
+
+    def _encode_value(self, value, out):
+        if value is None:
+            out.append(T_NONE)
+        elif value is True:
+            out.append(T_TRUE)
+        elif value is False:
+            out.append(T_FALSE)
+        elif isinstance(value, int):
+            if -0x80 <= value < 0x80:
+                out.append(T_INT8)
+                out += _I8.pack(value)
+            elif -0x80000000 <= value < 0x80000000:
+                out.append(T_INT32)
+                out += _I32.pack(value)
+            else:
+                out.append(T_INT64)
+                out += _I64.pack(value)
+        elif isinstance(value, float):
+            out.append(T_FLOAT)
+            out += _F64.pack(value)
+        elif isinstance(value, str):
+            atom = ATOM_INDEX.get(value)
+            if atom is not None:
+                out.append(T_ATOM)
+                out.append(atom)
+            else:
+                data = value.encode('utf-8')
+                out.append(T_STR)
+                out += _U16.pack(len(data))
+                out += data
+        elif isinstance(value, dict):
+            card = _card_byte(value)
+            if card is not None:
+                out.append(T_TCARD if len(value) == 3 else T_CARD)
+                out.append(card)
+                return
+            out.append(T_DICT)
+            out += _U16.pack(len(value))
+            for key, item in value.items():
+                self._encode_value(key, out)
+                self._encode_value(item, out)
+        elif isinstance(value, (list, tuple)):
+            cards = self._card_bytes(value)
+            if cards is not None:
+                out.append(T_CARDS)
+                out.append(len(cards))
+                out += cards
+                return
+            out.append(T_LIST)
+            out += _U16.pack(len(value))
+            for item in value:
+                self._encode_value(item, out)
+        else:
+            raise TypeError(f"Непідтримуваний тип для бінарного формату: {type(value).__name__}")
+
+    def _card_bytes(self, values):
+        """Байти карт, якщо список складається лише з карт з полем is_trump"""
+        if not values or len(values) > 0xFF:
+            return None
+        cards = bytearray()
+        for value in values:
+            if not isinstance(value, dict) or len(value) != 3:
+                return None
+            card = _card_byte(value)
+            if card is None:
+                return None
+            cards.append(card)
+        return cards
+
+    def _decode_card(self, byte, with_trump):
+        rank, suit = card_from_id(byte & ~_TRUMP_BIT)
+        if with_trump:
+            return {'rank': rank, 'suit': suit, 'is_trump': bool(byte & _TRUMP_BIT)}
+        return {'rank': rank, 'suit': suit}
+
+    def _decode_value(self, data, pos):
+        tag = data[pos]
+        pos += 1
+        if tag == T_ATOM:
+            return ATOMS[data[pos]], pos + 1
+        if tag == T_INT8:
+            return _I8.unpack_from(data, pos)[0], pos + 1
+        if tag == T_DICT:
+            (count,) = _U16.unpack_from(data, pos)
+            pos += 2
+            result = {}
+            for _ in range(count):
+                key, pos = self._decode_value(data, pos)
+                result[key], pos = self._decode_value(data, pos)
+            return result, pos
+        if tag == T_TCARD or tag == T_CARD:
+            return self._decode_card(data[pos], tag == T_TCARD), pos + 1
+        if tag == T_CARDS:
+            count = data[pos]
+            pos += 1
+            return [self._decode_card(byte, True) for byte in data[pos:pos + count]], pos + count
+        if tag == T_STR:
+            (length,) = _U16.unpack_from(data, pos)
+            pos += 2
+            return bytes(data[pos:pos + length]).decode('utf-8'), pos + length
+        if tag == T_NONE:
+            return None, pos
+        if tag == T_TRUE:
+            return True, pos
+        if tag == T_FALSE:
+            return False, pos
+        if tag == T_INT32:
+            return _I32.unpack_from(data, pos)[0], pos + 4
+        if tag == T_INT64:
+            return _I64.unpack_from(data, pos)[0], pos + 8
+        if tag == T_FLOAT:
+            return _F64.unpack_from(data, pos)[0], pos + 8
+        if tag == T_LIST:
+            (count,) = _U16.unpack_from(data, pos)
+            pos += 2
+            result = []
+            for _ in range(count):
+                item, pos = self._decode_value(data, pos)
+                result.append(item)
+            return result, pos
+        raise ValueError(f"Невідомий тег бінарного формату: {tag}")
+
+
+JSON_CODEC = JsonCodec()
+BINARY_CODEC = BinaryCodec()
+
+# Доступні формати в порядку переваги
+CODECS = {
+    BINARY_CODEC.name: BINARY_CODEC,
+    JSON_CODEC.name: JSON_CODEC,
+}
+
+
+def check_negotiation(message):
+    """Поля 'join' та 'spectate': name - рядок, codecs - список рядків. Інакше ProtocolError"""
+    name = message.get('name')
+    if name is not None and not isinstance(name, str):
+        raise ProtocolError("поле 'name' має бути рядком")
+    codecs = message.get('codecs')
+    if codecs is not None and (not isinstance(codecs, list) or not all(isinstance(item, str) for item in codecs)):
+        raise ProtocolError("поле 'codecs' має бути списком рядків")
+
+
+def choose_codec(names):
+    """Перший підтримуваний формат зі списку клієнта (JSON, якщо спільних немає)"""
+    for name in names or ():
+        codec = CODECS.get(name)
+        if codec is not None:
+            return codec
+    return JSON_CODEC
+
+
+def decode_frame(frame):
+    """Декодування кадру будь-якого формату. Некоректний кадр - ValueError"""
+    if frame[0] == BINARY_MAGIC:
+        try:
+            return BINARY_CODEC.decode(frame)
+        except (IndexError, KeyError, TypeError, RecursionError, struct.error) as e:
+            # TypeError - незмінюваний ключ словника (напр. список), RecursionError - надто глибока вкладеність
+            raise ProtocolError(f"Некоректний бінарний кадр: {e}") from e
+    return JSON_CODEC.decode(frame)
@@ -0,0 +1,78 @@
+"""
+Обмеження частоти повідомлень від клієнта.
+Кожне з'єднання має відро токенів на тип повідомлення та спільне відро на всі типи.
+Повідомлення понад ліміт відкидається мовчки (відповідь на кожне лише посилила б навантаження)
+і рахується як порушення; некоректні кадри та невідомі типи одразу є порушеннями.
+Коли порушень забагато, з'єднання розривається.
+"""
+import time
+
+# (токенів за секунду, місткість відра)
+DEFAULT_RATE_LIMITS = {
+    'join': (1, 3),
+    'resume': (1, 3),
+    'spectate': (1, 5),
+    'ready': (2, 5),
+    'game_action': (50, 100),  # Боти навантажувального тесту ходять одразу після дельти
+    'sync_request': (5, 10),
+    'disconnect': (1, 2),
+    'ping': (2, 5),
+    'pong': (2, 5),
+    '*': (100, 200)  # Усі повідомлення з'єднання разом
+}
+VIOLATION_LIMIT = (1, 20)  # Порушень за секунду та запас до від'єднання
+
+
+class TokenBucket:
+    """Відро токенів: rate токенів за секунду, не більше burst"""
+    __slots__ = ('rate', 'burst', 'tokens', 'updated')
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def take(self, cost=1, now=None):
+        """Забирає cost токенів. False - токенів бракує (нічого не забрано)"""
+        if now is None:
+            now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens < cost:
+            return False
+        self.tokens -= cost
+        return True
+
+    def refund(self, cost=1):
+        """Повернення токенів, забраних для повідомлення, яке все одно відкинуто"""
+        self.tokens = min(self.burst, self.tokens + cost)
+
+
+class RateLimiter:
+    """Ліміти одного з'єднання. Не потокобезпечний: повідомлення з'єднання обробляються послідовно"""
+
+    def __init__(self, limits=DEFAULT_RATE_LIMITS, violation_limit=VIOLATION_LIMIT):
+        self.limits = limits
+        self.buckets = {}
+        self.total = TokenBucket(*limits['*']) if '*' in limits else None
+        self.violations = TokenBucket(*violation_limit)
+
+    def admit(self, msg_type):
+        """Чи вкладається повідомлення типу msg_type у ліміти"""
+        now = time.monotonic()
+        bucket = self.buckets.get(msg_type)
+        if bucket is None and msg_type in self.limits:
+            bucket = self.buckets[msg_type] = TokenBucket(*self.limits[msg_type])
+        # Спершу відро типу: відкинуте ним повідомлення не витрачає спільного ліміту
+        if bucket is not None and not bucket.take(1, now):
+            return False
+        if self.total is not None and not self.total.take(1, now):
+            if bucket is not None:
+                bucket.refund()
+            return False
+        return True
+
+    def violation(self):
+        """Облік некоректного або зайвого повідомлення. False - порушень забагато, клієнта слід від'єднати"""
+        return self.violations.take()
@@ -0,0 +1,100 @@
+import itertools
+import threading
+
+
+class IdGenerator:
+    """Потокобезпечний монотонний генератор унікальних ідентифікаторів"""
+
+    def __init__(self, start=0):
+        self._counter = itertools.count(start)
+        self._lock = threading.Lock()
+
+    def next_id(self):
+        """Наступний ідентифікатор"""
+        with self._lock:
+            return next(self._counter)
+
+
+class ShardedRegistry:
+    """
+    Потокобезпечний словник, розбитий на шарди.
+    Кожен шард має власне блокування, тому потоки, що працюють з різними
+    ключами (клієнтами, іграми), майже не конкурують між собою.
+    Підтримує основні операції dict; ітерація повертає знімок.
+    """
+
+    def __init__(self, shard_count=16):
+        self._shards = [{} for _ in range(shard_count)]
+        self._locks = [threading.RLock() for _ in range(shard_count)]
+
+    def _index(self, key):
+        return hash(key) % len(self._shards)
+
+    def lock_for(self, key):
+        """Блокування шарду ключа - для складених операцій над одним записом"""
+        return self._locks[self._index(key)]
+
+    def __contains__(self, key):
+        index = self._index(key)
+        with self._locks[index]:
+            return key in self._shards[index]
+
+    def __getitem__(self, key):
+        index = self._index(key)
+        with self._locks[index]:
+            return self._shards[index][key]
+
+    def __setitem__(self, key, value):
+        index = self._index(key)
+        with self._locks[index]:
+            self._shards[index][key] = value
+
+    def __delitem__(self, key):
+        index = self._index(key)
+        with self._locks[index]:
+            del self._shards[index][key]
+
+    def __len__(self):
+        return sum(len(shard) for shard in self._shards)
+
+    def __bool__(self):
+        return any(self._shards)
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def get(self, key, default=None):
+        index = self._index(key)
+        with self._locks[index]:
+            return self._shards[index].get(key, default)
+
+    def pop(self, key, *default):
+        index = self._index(key)
+        with self._locks[index]:
+            return self._shards[index].pop(key, *default)
+
+    def setdefault(self, key, value):
+        index = self._index(key)
+        with self._locks[index]:
+            return self._shards[index].setdefault(key, value)
+
+    def items(self):
+        """Знімок пар (ключ, значення)"""
+        result = []
+        for shard, lock in zip(self._shards, self._locks):
+            with lock:
+                result.extend(shard.items())
+        return result
+
+    def keys(self):
+        """Знімок ключів"""
+        return [key for key, _ in self.items()]
+
+    def values(self):
+        """Знімок значень"""
+        return [value for _, value in self.items()]
+
+    def clear(self):
+        for shard, lock in zip(self._shards, self._locks):
+            with lock:
+                shard.clear()
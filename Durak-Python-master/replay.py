@@ -0,0 +1,47 @@
+"""
+Відновлення сесій після короткого обриву зв'язку.
+Кожне повідомлення гравцю отримує номер 'mseq', а закодований кадр зберігається в кільцевому
+буфері сесії. Клієнт, що перепідключився з токеном, повідомляє останній отриманий номер
+і отримує лише пропущені кадри.
+"""
+import secrets
+from collections import deque
+
+REPLAY_BUFFER_SIZE = 256  # Кадрів на сесію; ~2 розіграші навіть у найдовшій грі
+
+# Повідомлення поза нумерацією: серцебиття та службові відповіді на resume
+UNNUMBERED_TYPES = frozenset(('ping', 'pong', 'resume_success', 'resume_failed'))
+
+
+def new_resume_token():
+    """Випадковий токен для відновлення сесії"""
+    return secrets.token_urlsafe(16)
+
+
+class ReplayBuffer:
+    """Кільцевий буфер останніх відправлених кадрів сесії з їхніми номерами"""
+    __slots__ = ('frames', 'last_seq')
+
+    def __init__(self, size=REPLAY_BUFFER_SIZE, last_seq=0):
+        self.frames = deque(maxlen=size)
+        self.last_seq = last_seq
+
+    def next_seq(self):
+        """Номер для наступного кадру"""
+        return self.last_seq + 1
+
+    def record(self, seq, frame):
+        """Запам'ятовує кадр з номером seq (найстаріший витісняється)"""
+        self.frames.append((seq, frame))
+        self.last_seq = seq
+
+    def since(self, seq):
+        """
+        Кадри з номерами після seq.
+        None - частину пропущених кадрів уже витіснено, відтворити їх неможливо.
+        """
+        if seq >= self.last_seq:
+            return []
+        if not self.frames or self.frames[0][0] > seq + 1:
+            return None
+        return [frame for frame_seq, frame in self.frames if frame_seq > seq]
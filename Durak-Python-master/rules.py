@@ -0,0 +1,286 @@
+"""
+Серверні правила гри Дурак (підкидний, 2 гравці).
+Карти представлені ідентифікаторами 0..51 (див. protocol.card_id), руки - бітовими
+масками CardSet, тому перевірка будь-якого ходу - це кілька звернень до заздалегідь
+обчислених таблиць.
+"""
+from cardset import BEATERS, CardSet, cards_of_ranks, iter_ids
+from constants import SUITS, RANKS
+
+CARD_COUNT = len(SUITS) * len(RANKS)
+HAND_SIZE = 6
+MAX_ATTACKS = 6
+
+
+def _build_beat_table(trump_index):
+    """Таблиця 52x52: table[attack * 52 + defense] == 1, якщо defense б'є attack"""
+    rank_count = len(RANKS)
+    table = bytearray(CARD_COUNT * CARD_COUNT)
+    for attack in range(CARD_COUNT):
+        attack_suit, attack_rank = divmod(attack, rank_count)
+        for defense in range(CARD_COUNT):
+            defense_suit, defense_rank = divmod(defense, rank_count)
+            if defense_suit == attack_suit:
+                beats = defense_rank > attack_rank
+            else:
+                beats = defense_suit == trump_index
+            table[attack * CARD_COUNT + defense] = beats
+    return bytes(table)
+
+
+# Окрема таблиця для кожної козирної масті
+BEAT_TABLES = tuple(_build_beat_table(trump_index) for trump_index in range(len(SUITS)))
+
+# Біт рангу карти за ідентифікатором (для підкидання карт того ж рангу)
+CARD_RANK_BITS = tuple(1 << (cid % len(RANKS)) for cid in range(CARD_COUNT))
+
+
+class RuleError(ValueError):
+    """Хід не відповідає правилам"""
+
+
+class DurakGame:
+    """
+    Стан однієї гри та застосування ходів.
+    deck_ids - порядок колоди: карти беруться з кінця, deck_ids[0] - відкритий козир.
+    Місця гравців - 0 та 1.
+    """
+
+    def __init__(self, deck_ids, first_attacker=0):
+        self.deck = list(deck_ids)
+        self.trump_card = self.deck[0]
+        self.trump_index = self.trump_card // len(RANKS)
+        self.trump_suit = SUITS[self.trump_index]
+        self.beat_table = BEAT_TABLES[self.trump_index]
+        self.beaters = BEATERS[self.trump_index]
+
+        self.hands = [CardSet(), CardSet()]
+        self.table = []  # [[attack, defense або None], ...]
+        self.table_mask = 0  # Усі карти на столі
+        self.table_ranks = 0  # Маска рангів карт на столі
+        self.unbeaten_count = 0
+        self.discard = CardSet()
+
+        self.attacker = first_attacker
+        self.bout_limit = MAX_ATTACKS
+        self.finished = False
+        self.loser = None  # Місце дурня; None після завершення - нічия
+
+    @property
+    def defender(self):
+        return 1 - self.attacker
+
+    @classmethod
+    def from_state(cls, trump_card, deck, attacker, hands, discard, table, bout_limit, finished=False, loser=None):
+        """
+        Гра з довільного стану (контрольна точка, журнал): hands та discard - маски,
+        table - пари (атака, захист або None)
+        """
+        game = cls(bytes((trump_card,)), attacker)
+        game.deck = list(deck)
+        game.hands[0].mask, game.hands[1].mask = hands
+        game.discard.mask = discard
+        for attack, defense in table:
+            game.table.append([attack, defense])
+            game._put_on_table(attack)
+            if defense is None:
+                game.unbeaten_count += 1
+            else:
+                game._put_on_table(defense)
+        game.bout_limit = bout_limit
+        game.finished = finished
+        game.loser = loser
+        return game
+
+    def copy(self):
+        """Незалежна копія стану (для пошуку ходу ботом); таблиці биття спільні"""
+        game = DurakGame.__new__(DurakGame)
+        game.__dict__.update(self.__dict__)
+        game.deck = list(self.deck)
+        game.hands = [CardSet(self.hands[0].mask), CardSet(self.hands[1].mask)]
+        game.table = [list(pair) for pair in self.table]
+        game.discard = CardSet(self.discard.mask)
+        return game
+
+    def deal_initial(self):
+        """Початкова роздача по 6 карт. Повертає руки гравців"""
+        for _ in range(HAND_SIZE):
+            for hand in self.hands:
+                if self.deck:
+                    hand.add(self.deck.pop())
+        self.start_bout()
+        return self.hands
+
+    def start_bout(self):
+        """Початок нового розіграшу"""
+        self.table = []
+        self.table_mask = 0
+        self.table_ranks = 0
+        self.unbeaten_count = 0
+        self.bout_limit = min(MAX_ATTACKS, len(self.hands[self.defender]))
+
+    def can_beat(self, attack, defense):
+        """Чи б'є карта defense карту attack"""
+        return self.beat_table[attack * CARD_COUNT + defense] == 1
+
+    def unbeaten(self):
+        """Індекси неперебитих карт на столі"""
+        return [index for index, (_, defense) in enumerate(self.table) if defense is None]
+
+    def first_unbeaten(self):
+        """Індекс першої неперебитої карти або None"""
+        if self.unbeaten_count:
+            for index, (_, defense) in enumerate(self.table):
+                if defense is None:
+                    return index
+        return None
+
+    def _put_on_table(self, card):
+        self.table_mask |= 1 << card
+        self.table_ranks |= CARD_RANK_BITS[card]
+
+    def _check_turn(self, seat, attacker):
+        if self.finished:
+            raise RuleError("Гру завершено")
+        expected = self.attacker if attacker else self.defender
+        if seat != expected:
+            raise RuleError("Зараз не ваш хід" if attacker else "Ви не захищаєтесь")
+
+    def _check_card(self, seat, card):
+        if card not in self.hands[seat]:
+            raise RuleError("Цієї карти немає у вашій руці")
+
+    def attack(self, seat, card):
+        """Напад або підкидання карти"""
+        self._check_turn(seat, attacker=True)
+        self._check_card(seat, card)
+        if len(self.table) >= self.bout_limit:
+            raise RuleError("Досягнуто ліміт карт у розіграші")
+        if self.unbeaten_count >= len(self.hands[self.defender]):
+            raise RuleError("Захисникові нічим відбиватися")
+        if self.table and not self.table_ranks & CARD_RANK_BITS[card]:
+            raise RuleError("Підкидати можна лише карти рангів, що є на столі")
+
+        self.hands[seat].remove(card)
+        self.table.append([card, None])
+        self._put_on_table(card)
+        self.unbeaten_count += 1
+        return {}
+
+    def defend(self, seat, card, target=None):
+        """Відбиття карти; target - індекс карти на столі (за замовчуванням перша неперебита)"""
+        self._check_turn(seat, attacker=False)
+        self._check_card(seat, card)
+        if not self.unbeaten_count:
+            raise RuleError("Немає карт для відбиття")
+        if target is None:
+            target = self.first_unbeaten()
+        if not isinstance(target, int) or not 0 <= target < len(self.table) or self.table[target][1] is not None:
+            raise RuleError("Цю карту вже відбито")
+        if not self.can_beat(self.table[target][0], card):
+            raise RuleError("Ця карта не б'є атакуючу")
+
+        self.hands[seat].remove(card)
+        self.table[target][1] = card
+        self._put_on_table(card)
+        self.unbeaten_count -= 1
+        return {'target': target}
+
+    def take(self, seat):
+        """Захисник забирає всі карти зі столу; нападник лишається тим самим"""
+        self._check_turn(seat, attacker=False)
+        if not self.unbeaten_count:
+            raise RuleError("Усі карти відбито - брати нічого")
+
+        self.hands[seat].update(self.table_mask)
+        return self._end_bout(defender_took=True)
+
+    def pass_turn(self, seat):
+        """Нападник завершує розіграш (бито); ролі міняються"""
+        self._check_turn(seat, attacker=True)
+        if not self.table:
+            raise RuleError("Спершу потрібно походити")
+        if self.unbeaten_count:
+            raise RuleError("Не всі карти відбито")
+
+        self.discard.update(self.table_mask)
+        return self._end_bout(defender_took=False)
+
+    def _end_bout(self, defender_took):
+        """Добір карт, зміна ролей та перевірка кінця гри"""
+        drawn = self.refill()
+        if not defender_took:
+            self.attacker = self.defender
+        self.check_game_over()
+        self.start_bout()
+        return {'bout_over': 'taken' if defender_took else 'beaten', 'drawn': drawn}
+
+    def refill(self):
+        """Добір до 6 карт: спершу нападник, потім захисник. Повертає взяті карти по місцях"""
+        drawn = [[], []]
+        for seat in (self.attacker, self.defender):
+            hand = self.hands[seat]
+            while len(hand) < HAND_SIZE and self.deck:
+                card = self.deck.pop()
+                hand.add(card)
+                drawn[seat].append(card)
+        return drawn
+
+    def check_game_over(self):
+        """Гра закінчується, коли колода порожня і хтось позбувся всіх карт"""
+        if self.deck:
+            return
+        empty = [not hand for hand in self.hands]
+        if all(empty):
+            self.finished = True
+            self.loser = None
+        elif any(empty):
+            self.finished = True
+            self.loser = empty.index(False)
+
+    def apply(self, seat, action, card=None, target=None):
+        """Застосування дії гравця. Некоректна дія - RuleError"""
+        if action == 'attack':
+            if card is None:
+                raise RuleError("Не вказано карту")
+            return self.attack(seat, card)
+        if action == 'defend':
+            if card is None:
+                raise RuleError("Не вказано карту")
+            return self.defend(seat, card, target)
+        if action == 'take':
+            return self.take(seat)
+        if action == 'pass':
+            return self.pass_turn(seat)
+        raise RuleError(f"Невідома дія: {action}")
+
+    def default_action(self, seat):
+        """Дія за гравця, що не походив вчасно: взяти, бито або напад наймолодшою некозирною картою"""
+        actions = self.legal_actions(seat)
+        for action in actions:
+            if action[0] in ('take', 'pass'):
+                return action
+        rank_count = len(RANKS)
+        return min(actions, key=lambda a: (a[1] // rank_count == self.trump_index, a[1] % rank_count))
+
+    def legal_actions(self, seat):
+        """Усі допустимі дії гравця: список (action, card, target)"""
+        if self.finished:
+            return []
+        actions = []
+        hand = self.hands[seat].mask
+        if seat == self.attacker:
+            can_add = (len(self.table) < self.bout_limit
+                       and self.unbeaten_count < len(self.hands[self.defender]))
+            if can_add:
+                candidates = hand & cards_of_ranks(self.table_ranks) if self.table else hand
+                for card in iter_ids(candidates):
+                    actions.append(('attack', card, None))
+            if self.table and not self.unbeaten_count:
+                actions.append(('pass', None, None))
+        elif self.unbeaten_count:
+            target = self.first_unbeaten()
+            for card in iter_ids(hand & self.beaters[self.table[target][0]]):
+                actions.append(('defend', card, target))
+            actions.append(('take', None, None))
+        return actions
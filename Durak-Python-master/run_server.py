@@ -1,8 +1,11 @@
 #!/usr/bin/env python3
 """
 Скрипт для запуску сервера гри Дурак
-Використання: python run_server.py [host] [port]
+Використання: python run_server.py [host] [port] [--engine threads|asyncio] [--workers N] [--metrics-port P]
+                                   [--journal FILE] [--checkpoint FILE]
+                                   [--log-level LEVEL] [--log-file FILE] [--log-sample EVENT=RATE ...]
 """
+import argparse
 import sys
 import os
 import threading
@@ -11,7 +14,17 @@ import time
 # Додаємо поточну директорію до шляху для імпортів
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
+import eventlog
 from server import GameServer
+from async_server import AsyncGameServer
+from cluster import ClusterServer
+from deckpool import DEFAULT_POOL_DEPTH
+
+# Доступні рушії сервера
+ENGINES = {
+    'threads': GameServer,  # потік на клієнта
+    'asyncio': AsyncGameServer,  # одна подієва петля на всі з'єднання
+}
 
 
 def print_banner():
@@ -22,33 +35,100 @@ def print_banner():
     print()
 
 
+def parse_args(argv=None):
+    """Розбір аргументів командного рядка"""
+    parser = argparse.ArgumentParser(description="Сервер гри Дурак")
+    parser.add_argument('host', nargs='?', default='localhost', help="адреса сервера")
+    parser.add_argument('port', nargs='?', default='12345', help="порт сервера")
+    parser.add_argument('--engine', choices=sorted(ENGINES), default='threads',
+                        help="рушій обробки з'єднань")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="кількість процесів-воркерів на одному порту (SO_REUSEPORT)")
+    parser.add_argument('--backlog', type=int, default=1024,
+                        help="черга ядра для ще не прийнятих підключень (listen)")
+    parser.add_argument('--max-clients', type=int, default=10000,
+                        help="одночасних з'єднань; понад ліміт сервер відповідає server_busy (0 - без ліміту)")
+    parser.add_argument('--accept-batch', type=int, default=64,
+                        help="скільки підключень приймати за одне пробудження")
+    parser.add_argument('--deck-pool-depth', type=int, default=DEFAULT_POOL_DEPTH,
+                        help="скільки перетасованих колод тримати напоготові")
+    parser.add_argument('--deck-seed', type=int,
+                        help="зерно тасування для відтворюваних роздач (налагодження)")
+    parser.add_argument('--journal', metavar='FILE',
+                        help="двійковий журнал ігор для відтворення (python journal.py FILE)")
+    parser.add_argument('--checkpoint', metavar='FILE',
+                        help="контрольна точка ігор та сесій: після перезапуску гравці повертаються до своїх ігор")
+    parser.add_argument('--metrics-port', type=int, default=0,
+                        help="локальний HTTP-порт метрик у форматі Prometheus (0 - вимкнено)")
+    parser.add_argument('--log-level', default='INFO', choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'],
+                        type=str.upper, help="мінімальний рівень журналу")
+    parser.add_argument('--log-file', help="файл журналу JSON-lines (з ротацією за розміром)")
+    parser.add_argument('--log-max-bytes', type=int, default=eventlog.DEFAULT_MAX_BYTES,
+                        help="розмір файлу журналу до ротації")
+    parser.add_argument('--log-sample', action='append', metavar='EVENT=RATE',
+                        help="частка записів події, що журналюються (напр. game_action=0.01)")
+    parser.add_argument('--quiet', action='store_true', help="не дублювати журнал у консоль")
+    args = parser.parse_args(argv)
+
+    try:
+        args.log_sample = eventlog.parse_sampling(args.log_sample)
+    except ValueError as e:
+        parser.error(str(e))
+
+    if args.workers < 1:
+        parser.error("--workers має бути не менше 1")
+    if args.backlog < 1 or args.accept_batch < 1 or args.max_clients < 0:
+        parser.error("--backlog та --accept-batch мають бути не менше 1, --max-clients - не менше 0")
+    if args.deck_pool_depth < 0:
+        parser.error("--deck-pool-depth не може бути від'ємним")
+    if args.workers > 1 and args.engine != 'threads':
+        parser.error("режим --workers підтримує лише рушій threads")
+
+    try:
+        args.port = int(args.port)
+    except ValueError:
+        print("❌ Помилка: порт повинен бути числом")
+        sys.exit(1)
+
+    return args
+
+
 def main():
-    # Параметри за замовчуванням
-    host = 'localhost'
-    port = 12345
-
-    # Парсимо аргументи командного рядка
-    if len(sys.argv) > 1:
-        host = sys.argv[1]
-    if len(sys.argv) > 2:
-        try:
-            port = int(sys.argv[2])
-        except ValueError:
-            print("❌ Помилка: порт повинен бути числом")
-            sys.exit(1)
+    args = parse_args()
+    host = args.host
+    port = args.port
+
+    eventlog.configure(
+        level=args.log_level,
+        console=not args.quiet,
+        json_path=args.log_file,
+        max_bytes=args.log_max_bytes,
+        sampling=args.log_sample
+    )
 
     print_banner()
     print(f"🌐 Запуск сервера на {host}:{port}")
+    print(f"⚙️  Рушій: {args.engine}, воркерів: {args.workers}")
     print("🎯 Режим гри: 2 гравці")
     print("⌨️  Команди управління:")
     print("   'status' - показати статус сервера")
+    print("   'metrics' - показати метрики сервера")
     print("   'help'   - показати довідку")
     print("   'quit'   - зупинити сервер")
     print("   Ctrl+C   - аварійна зупинка")
     print("-" * 60)
 
     # Створюємо та запускаємо сервер
-    server = GameServer(host, port)
+    options = {'backlog': args.backlog, 'max_clients': args.max_clients, 'accept_batch': args.accept_batch,
+               'deck_pool_depth': args.deck_pool_depth, 'deck_seed': args.deck_seed, 'journal_path': args.journal,
+               'checkpoint_path': args.checkpoint}
+    if args.workers > 1:
+        server = ClusterServer(host, port, args.workers, **options)
+    else:
+        server = ENGINES[args.engine](host, port, **options)
+
+    if args.metrics_port:
+        server.start_metrics_endpoint(args.metrics_port)
 
     try:
         # Запускаємо сервер в окремому потоці
@@ -75,10 +155,13 @@ def main():
                     break
                 elif command == 'status':
                     server.print_status()
+                elif command == 'metrics':
+                    server.print_metrics()
                 elif command == 'help':
                     print("\n📖 ДОВІДКА ПО КОМАНДАХ:")
                     print("-" * 30)
                     print("status  - показати детальний статус сервера")
+                    print("metrics - показати метрики (затримки, ігри, черга)")
                     print("help    - показати цю довідку")
                     print("quit    - коректно зупинити сервер")
                     print("Ctrl+C  - аварійна зупинка")
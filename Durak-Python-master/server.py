@@ -1,207 +1,938 @@
+import random
+import select
 import socket
+import struct
 import threading
-import json
 import time
-from cards import Deck
-from player import Player
+from checkpoint import (GAME_RECORD, PLAYER_RECORD, RESTORED_MSEQ_GAP, Checkpoint, DetachedSocket, pack_game,
+                        pack_player, unpack_game, unpack_player)
+from deckpool import DEFAULT_POOL_DEPTH, DeckPool
+from eventlog import get_logger
+from journal import Journal
+from protocol import (BINARY_MAGIC, CODECS, FRAME_DELIMITER, FrameDecoder, FrameTooLarge, JSON_CODEC, ProtocolError,
+                      card_from_id, card_id_from_dict, card_to_dict, check_negotiation, choose_codec, decode_frame)
+from rules import DurakGame, RuleError
+from ratelimit import DEFAULT_RATE_LIMITS, RateLimiter
+from matchmaking import MatchQueue
+from metrics import MetricsEndpoint, MetricsRegistry
+from outbox import DEFAULT_HIGH_WATER, OutboundWriter, Outbox
+from registry import IdGenerator, ShardedRegistry
+from replay import REPLAY_BUFFER_SIZE, UNNUMBERED_TYPES, ReplayBuffer, new_resume_token
+from state_sync import build_delta, build_public_delta, build_public_snapshot, build_snapshot, capture_view
+from timers import TimerWheel
+
+# Типи повідомлень, для яких ведеться окрема гістограма затримки обробки
+MESSAGE_TYPES = ('join', 'resume', 'spectate', 'ready', 'game_action', 'sync_request', 'disconnect', 'ping', 'pong')
+
+log = get_logger('server')
 
 
 class GameServer:
-    def __init__(self, host='localhost', port=12345):
+    def __init__(self, host='localhost', port=12345, reuse_port=False, backlog=1024, max_clients=10000, accept_batch=64,
+                 deck_pool_depth=DEFAULT_POOL_DEPTH, deck_seed=None, journal_path=None, checkpoint_path=None):
         self.host = host
         self.port = port
         self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-
-        # Ігрові дані
-        self.clients = {}  # {socket: player_data}
-        self.games = {}  # {game_id: game_data}
-        self.waiting_players = []
+        if reuse_port:
+            # Кілька процесів-воркерів слухають один порт, ядро розподіляє підключення
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+
+        # Прийом підключень: під час масового перепідключення черга ядра має вміщати всіх
+        self.backlog = backlog  # Довжина черги ще не прийнятих підключень (listen)
+        self.accept_batch = accept_batch  # Скільки підключень приймати за одне пробудження
+        self.max_clients = max_clients  # Одночасних з'єднань; понад ліміт - відповідь server_busy (0 - без ліміту)
+        self.busy_retry_after = 5  # Підказка клієнту, через скільки секунд повторити спробу
+
+        # Метрики (див. metrics.py); HTTP-доступ вмикається start_metrics_endpoint
+        self.metrics = MetricsRegistry()
+        self.metrics_endpoint = None
+        self.setup_metrics()
+
+        # Ігрові дані (реєстри спільні для всіх потоків-обробників)
+        self.clients = ShardedRegistry()  # {socket: player_data}
+        self.games = ShardedRegistry()  # {game_id: game_data}
+        self.waiting_players = MatchQueue(on_matched=self.matchmaking_wait.observe)
+
+        # Генератори унікальних ідентифікаторів
+        self.client_ids = IdGenerator()
+        self.player_ids = IdGenerator()
+        self.game_ids = IdGenerator(1)
+        self.game_id_prefix = 'game_'
+
+        # Зв'язок з координатором кластера (режим --workers), див. cluster.py
+        self.cluster = None
+        self.poll_interval = None  # Як часто обробник перевіряє запити на передачу гравця
 
         self.running = True
-        self.client_counter = 0
+
+        # Живість сесій та дедлайни ходів - одне колесо таймерів на весь сервер
+        self.timers = TimerWheel()
+        self.sessions = ShardedRegistry()  # {socket: {'addr', 'last_activity', 'timer', 'outbox', 'limiter'}}
+        self.heartbeat_interval = 30  # Тиша, після якої сервер пінгує клієнта
+        self.client_timeout = 90  # Тиша, після якої з'єднання вважається мертвим
+        self.turn_timeout = 60  # Час на хід, після якого сервер ходить за гравця
+
+        # Захист від клієнтів, що засипають сервер повідомленнями (див. ratelimit.py)
+        self.rate_limits = DEFAULT_RATE_LIMITS
+        self.max_frame_size = 4 * 1024  # Повідомлення клієнтів - кількасот байтів
+
+        # Відновлення сесій (див. replay.py): гравець з обірваним з'єднанням лишається в грі
+        self.resume_grace = 60  # Скільки чекати на перепідключення (0 - не чекати)
+        self.replay_buffer_size = REPLAY_BUFFER_SIZE
+        self.resume_tokens = ShardedRegistry()  # {токен: player_data}
+        self.resume_lock = threading.Lock()  # Заміна сокета гравця та завершення очікування
+
+        # Черги відправки (див. outbox.py): обробник не чекає на клієнта, що повільно читає
+        self.outbound_writer = OutboundWriter()
+        self.outbound_high_water = DEFAULT_HIGH_WATER  # Байтів у черзі з'єднання до спрацювання політики
+        self.outbound_policy = 'disconnect'  # disconnect, drop або block
+
+        # Глядачі: {socket: {'address', 'codec', 'game_id'}}
+        self.spectators = ShardedRegistry()
+        self.spectator_buffer_limit = 256 * 1024  # Байтів у черзі повільного глядача до його від'єднання
+
+        # Готові перетасовані колоди (див. deckpool.py); seed - для відтворюваних роздач
+        self.deck_pool = DeckPool(deck_pool_depth, deck_seed)
+
+        # Двійковий журнал ігор для відтворення (див. journal.py); None - не вести
+        self.journal = Journal(journal_path, on_sync=self.journal_sync.observe) if journal_path else None
+
+        # Контрольна точка ігор та сесій для перезапуску (див. checkpoint.py); None - не вести
+        self.checkpoint = None
+        if checkpoint_path:
+            self.checkpoint = Checkpoint(checkpoint_path, self.checkpoint_records,
+                                         on_write=self.checkpoint_write.observe)
 
         # Статистика
+        self.stats_lock = threading.Lock()
         self.total_connections = 0
         self.active_games = 0
 
+    def setup_metrics(self):
+        """Реєстрація метрик сервера"""
+        metrics = self.metrics
+        self.message_latency = metrics.histogram(
+            'durak_message_handle_seconds', "Час обробки вхідного повідомлення", ('type',))
+        self.send_latency = metrics.histogram(
+            'durak_send_seconds', "Час серіалізації та відправки повідомлення клієнту")
+        self.frame_queue_wait = metrics.histogram(
+            'durak_frame_queue_wait_seconds', "Час від отримання кадру до початку його обробки")
+        self.matchmaking_wait = metrics.histogram(
+            'durak_matchmaking_wait_seconds', "Час очікування гравця в черзі до створення гри")
+        self.connections_counter = metrics.counter(
+            'durak_connections_total', "Прийнятих підключень")
+        self.connections_rejected = metrics.counter(
+            'durak_connections_rejected_total', "Підключень, відхилених через переповнений сервер")
+        self.games_created = metrics.counter(
+            'durak_games_created_total', "Створених ігор")
+        metrics.gauge('durak_deck_pool_size', "Готових колод у запасі", function=lambda: len(self.deck_pool))
+        metrics.gauge('durak_deck_pool_misses', "Ігор, для яких запас колод був порожній",
+                      function=lambda: self.deck_pool.misses)
+        self.journal_sync = metrics.histogram(
+            'durak_journal_sync_seconds', "Час групового запису журналу ігор (write та fsync)")
+        metrics.gauge('durak_journal_pending_bytes', "Байтів журналу ігор, ще не записаних на диск",
+                      function=lambda: len(self.journal) if self.journal is not None else 0)
+        self.checkpoint_write = metrics.histogram(
+            'durak_checkpoint_write_seconds', "Час запису змінених слотів контрольної точки")
+        self.games_finished = metrics.counter(
+            'durak_games_finished_total', "Завершених ігор", ('outcome',))
+        metrics.gauge('durak_active_clients', "Активних клієнтів", function=lambda: len(self.clients))
+        metrics.gauge('durak_waiting_players', "Гравців у черзі", function=lambda: len(self.waiting_players))
+        metrics.gauge('durak_active_games', "Активних ігор", function=lambda: len(self.games))
+        metrics.gauge('durak_suspended_players', "Гравців, що чекають на перепідключення",
+                      function=lambda: sum(1 for player_data in self.clients.values() if not player_data['connected']))
+        self.sessions_resumed = metrics.counter(
+            'durak_session_resumes_total', "Спроб відновлення сесії", ('result',))
+        metrics.gauge('durak_spectators', "Підключених глядачів", function=lambda: len(self.spectators))
+        metrics.gauge('durak_outbound_queued_bytes', "Байтів у чергах відправки клієнтам",
+                      function=lambda: sum(len(session['outbox']) for session in self.sessions.values()))
+        self.outbound_overflows = metrics.counter(
+            'durak_outbound_overflows_total', "Переповнень черги відправки з'єднання", ('action',))
+        self.messages_limited = metrics.counter(
+            'durak_messages_limited_total', "Відкинутих повідомлень понад ліміт або некоректних", ('type',))
+        self.abusers_disconnected = metrics.counter(
+            'durak_abusive_clients_total', "З'єднань, розірваних через перевищення лімітів")
+
+    def start_metrics_endpoint(self, port, host='127.0.0.1'):
+        """Віддача метрик у форматі Prometheus на http://host:port/metrics"""
+        try:
+            self.metrics_endpoint = MetricsEndpoint(self.metrics.render, host, port)
+            self.metrics_endpoint.start()
+            log.info('metrics_endpoint', "📈 Метрики доступні на http://{host}:{port}/metrics", host=host, port=port)
+            return True
+        except OSError as e:
+            log.error('metrics_endpoint_failed', "❌ Не вдалося запустити HTTP-порт метрик {host}:{port}: {error}",
+                      host=host, port=port, error=str(e))
+            self.metrics_endpoint = None
+            return False
+
     def start(self):
         """Запуск сервера"""
         try:
             self.socket.bind((self.host, self.port))
-            self.socket.listen(5)
-            print(f"🎮 Сервер Дурак запущено на {self.host}:{self.port}")
-            print("Очікуємо підключення гравців...")
-            print("-" * 50)
+            self.socket.listen(self.backlog)
+            self.socket.setblocking(False)
+            log.info('server_started', "🎮 Сервер Дурак запущено на {host}:{port}. Очікуємо підключення гравців...",
+                     host=self.host, port=self.port)
+            self.restore_checkpoint()
+            if self.cluster:
+                # Координатор дізнається про відновлені сесії пакетами, а не по одній
+                self.cluster.report_restored(self.resume_tokens.keys())
+            self.start_timers()
 
             while self.running:
                 try:
-                    client_socket, addr = self.socket.accept()
-                    self.total_connections += 1
-                    print(f"📱 Новий клієнт підключився: {addr} (Загалом: {self.total_connections})")
-
-                    # Створюємо окремий потік для кожного клієнта
-                    client_thread = threading.Thread(
-                        target=self.handle_client,
-                        args=(client_socket, addr)
-                    )
-                    client_thread.daemon = True
-                    client_thread.start()
-
-                except socket.error as e:
+                    ready, _, _ = select.select([self.socket], [], [], 1.0)
+                except (OSError, ValueError):
+                    # Слухаючий сокет закрито під час зупинки
                     if self.running:
-                        print(f"Помилка прийняття підключення: {e}")
+                        raise
+                    break
+                if ready:
+                    self.accept_connections()
 
         except Exception as e:
-            print(f"Критична помилка сервера: {e}")
+            log.exception('server_crashed', "Критична помилка сервера: {error}", error=str(e))
         finally:
             self.cleanup()
 
-    def handle_client(self, client_socket, addr):
-        """Обробка підключення клієнта"""
-        client_id = self.client_counter
-        self.client_counter += 1
+    def accept_connections(self):
+        """Приймає до accept_batch підключень, що вже чекають у черзі ядра"""
+        active = len(self.sessions)
+        for _ in range(self.accept_batch):
+            try:
+                client_socket, addr = self.socket.accept()
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError as e:
+                if self.running:
+                    log.error('accept_failed', "Помилка прийняття підключення: {error}", error=str(e))
+                return
+
+            with self.stats_lock:
+                self.total_connections += 1
+            self.connections_counter.inc()
+            if self.max_clients and active >= self.max_clients:
+                self.reject_connection(client_socket, addr)
+                continue
+            active += 1
+            log.debug('client_connected', "📱 Новий клієнт підключився: {addr} (Загалом: {total})",
+                      addr=addr, total=self.total_connections)
+
+            # Створюємо окремий потік для кожного клієнта
+            client_thread = threading.Thread(
+                target=self.handle_client,
+                args=(client_socket, addr)
+            )
+            client_thread.daemon = True
+            client_thread.start()
+
+    def busy_message(self):
+        """Відповідь переповненого сервера; випадковий розкид retry_after розтягує хвилю повторних спроб"""
+        return {
+            'type': 'server_busy',
+            'message': 'Сервер переповнений, спробуйте пізніше',
+            'retry_after': round(self.busy_retry_after * random.uniform(1, 2), 1)
+        }
+
+    def reject_connection(self, client_socket, addr):
+        """Явна відмова замість мовчазного обриву: клієнт знає, коли повторити спробу"""
+        self.connections_rejected.inc()
+        log.debug('client_rejected', "🚧 Сервер переповнений - відхилено підключення {addr}", addr=addr)
+        try:
+            # Буфер відправки щойно прийнятого сокета порожній - короткий кадр піде без очікування
+            client_socket.send(JSON_CODEC.encode(self.busy_message()))
+            client_socket.shutdown(socket.SHUT_WR)
+        except OSError:
+            pass
+        # Закриття з непрочитаним join клієнта скинуло б з'єднання (RST) разом з відповіддю
+        self.timers.schedule(1.0, client_socket.close)
 
-        print(f"🔄 Запуск обробника для клієнта {addr} (ID: {client_id})")
+    def handle_client(self, client_socket, addr, player_data=None, pending=b'', resume=None):
+        """
+        Обробка підключення клієнта.
+        player_data та pending передаються, коли гравця прийнято від іншого воркера кластера,
+        resume - запит відновлення сесії, який координатор переслав воркеру-власнику.
+        """
+        client_id = self.client_ids.next_id()
+
+        log.debug('handler_started', "🔄 Запуск обробника для клієнта {addr} (ID: {client_id})",
+                  addr=addr, client_id=client_id)
 
         try:
-            # Встановлюємо таймаут для сокета
-            client_socket.settimeout(300)  # 5 хвилин таймауту
+            # Читання блокуюче: живість перевіряє колесо таймерів, а таймаут потрібен лише
+            # воркеру кластера, щоб помічати запити на передачу гравця
+            client_socket.settimeout(self.poll_interval)
+            # Дрібні кадри зливає черга відправки, тож алгоритм Нейгла лише додає затримку
+            client_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            session = self.open_session(client_socket, addr)
+
+            decoder = FrameDecoder(self.max_frame_size)
+            if player_data is not None:
+                self.adopt_player(client_socket, player_data)
+            if resume is not None:
+                session['resume_routed'] = True  # Координатор уже знайшов власника - вдруге не пересилаємо
+                self.handle_resume(client_socket, resume, addr)
+            if pending:
+                decoder.feed(pending)
+                if not self.handle_frames(client_socket, decoder, addr):
+                    return
 
             while self.running:
                 try:
-                    data = client_socket.recv(1024)
-                    if not data:
-                        print(f"📤 Клієнт {addr} закрив з'єднання")
+                    # Політика block: клієнт, що не читає відповіді, не отримує нових
+                    if not session['outbox'].wait_writable():
+                        break
+                    if not decoder.recv_into(client_socket):
+                        log.debug('client_closed', "📤 Клієнт {addr} закрив з'єднання", addr=addr)
                         break
+                    session['last_activity'] = time.monotonic()
 
-                    try:
-                        decoded_data = data.decode('utf-8')
-                        message = json.loads(decoded_data)
-                        self.process_message(client_socket, message, addr)
-                    except json.JSONDecodeError as e:
-                        print(f"❌ Некоректні дані від {addr}: {e}")
-                        error_response = {
-                            'type': 'error',
-                            'message': 'Некоректний формат повідомлення'
-                        }
-                        self.send_message(client_socket, error_response)
-                    except UnicodeDecodeError as e:
-                        print(f"❌ Помилка кодування від {addr}: {e}")
+                    if not self.handle_frames(client_socket, decoder, addr):
+                        break
+                    if 'route_resume' in session and self.route_resume(client_socket, session, decoder):
+                        return
 
                 except socket.timeout:
-                    # Перевіряємо пінг
-                    if client_socket in self.clients:
-                        ping_message = {'type': 'ping'}
-                        if not self.send_message(client_socket, ping_message):
-                            print(f"⏰ Таймаут з'єднання з {addr}")
-                            break
+                    if self.hand_off_if_requested(client_socket, decoder):
+                        return
                 except socket.error as e:
-                    print(f"🔌 Помилка сокета з клієнтом {addr}: {e}")
+                    log.info('socket_error', "🔌 Помилка сокета з клієнтом {addr}: {error}", addr=addr, error=str(e))
                     break
 
         except Exception as e:
-            print(f"💥 Необроблена помилка з клієнтом {addr}: {e}")
+            log.exception('handler_crashed', "💥 Необроблена помилка з клієнтом {addr}: {error}", addr=addr, error=str(e))
         finally:
             self.disconnect_client(client_socket, addr)
 
+    def handle_frames(self, client_socket, decoder, addr):
+        """Обробка всіх повних кадрів з буфера. Повертає False, якщо з'єднання слід закрити"""
+        try:
+            frames = decoder.frames()
+        except FrameTooLarge as e:
+            log.warning('frame_too_large', "❌ Завеликий кадр від {addr}: {error}", addr=addr, error=str(e))
+            error_response = {
+                'type': 'error',
+                'message': 'Повідомлення занадто велике'
+            }
+            self.send_message(client_socket, error_response)
+            return False
+
+        # Відповіді на всю порцію кадрів ідуть клієнту одним записом
+        session = self.sessions.get(client_socket)
+        outbox = session['outbox'] if session is not None else None
+        if outbox is not None:
+            outbox.cork()
+        try:
+            received_at = time.perf_counter()
+            for index, frame in enumerate(frames):
+                # Кадри, що прийшли однією порцією, чекають на обробку попередніх
+                self.frame_queue_wait.observe(time.perf_counter() - received_at)
+                if not self.handle_data(client_socket, frame, addr):
+                    return False
+                if session is not None and 'route_resume' in session:
+                    # Решту кадрів обробить воркер, якому належить сесія
+                    session['route_pending'] = frames[index + 1:]
+                    break
+        finally:
+            if outbox is not None:
+                outbox.uncork()
+        return True
+
+    def handle_data(self, client_socket, data, addr):
+        """Декодування одного кадру та передача повідомлення на обробку. False - клієнта слід від'єднати"""
+        try:
+            message = decode_frame(data)
+            if not isinstance(message, dict):
+                raise ValueError("повідомлення має бути об'єктом")
+            if message.get('type') in ('join', 'spectate'):
+                check_negotiation(message)
+        except UnicodeDecodeError as e:
+            if not self.register_violation(client_socket, 'invalid', addr):
+                return False
+            log.warning('bad_encoding', "❌ Помилка кодування від {addr}: {error}", addr=addr, error=str(e))
+            return True
+        except ValueError as e:
+            if not self.register_violation(client_socket, 'invalid', addr):
+                return False
+            log.warning('bad_message', "❌ Некоректні дані від {addr}: {error}", addr=addr, error=str(e))
+            error_response = {
+                'type': 'error',
+                'message': 'Некоректний формат повідомлення'
+            }
+            self.send_message(client_socket, error_response)
+            return True
+
+        msg_type = message.get('type')
+        if msg_type not in MESSAGE_TYPES:
+            # Невідомий тип - лише порушення, без подальшої обробки
+            return self.register_violation(client_socket, 'invalid', addr)
+        if not self.admit_message(client_socket, msg_type):
+            # Повідомлення понад ліміт відкидається без відповіді
+            return self.register_violation(client_socket, msg_type, addr)
+
+        started = time.perf_counter()
+        self.process_message(client_socket, message, addr)
+        self.message_latency.labels(msg_type).observe(time.perf_counter() - started)
+        return True
+
+    def admit_message(self, client_socket, msg_type):
+        """Чи вкладається повідомлення в ліміти з'єднання"""
+        session = self.sessions.get(client_socket)
+        return session is None or session['limiter'].admit(msg_type)
+
+    def register_violation(self, client_socket, label, addr):
+        """Облік некоректного або зайвого повідомлення. False - порушень забагато, клієнта слід від'єднати"""
+        self.messages_limited.labels(label).inc()
+        session = self.sessions.get(client_socket)
+        if session is None or session['limiter'].violation():
+            return True
+
+        self.abusers_disconnected.inc()
+        log.warning('client_abusive', "🚫 Клієнт {addr} перевищує ліміти повідомлень - від'єднуємо", addr=addr)
+        player_data = self.clients.get(client_socket)
+        if player_data is not None:
+            player_data['leaving'] = True  # Сесію порушника не зберігаємо
+        return False
+
+    def ping_client(self, client_socket):
+        """Пінг клієнта після періоду тиші. Повертає False, якщо з'єднання мертве"""
+        if client_socket in self.clients or client_socket in self.spectators:
+            ping_message = {'type': 'ping'}
+            return self.send_message(client_socket, ping_message)
+        return True
+
+    def start_timers(self):
+        """Запуск колеса таймерів, потоку дозапису черг відправки, запасу колод та журналу ігор"""
+        self.timers.start()
+        self.outbound_writer.start()
+        self.deck_pool.start()
+        if self.journal is not None:
+            self.journal.start()
+        if self.checkpoint is not None:
+            self.checkpoint.start()
+
+    def open_session(self, client_socket, addr):
+        """Реєструє з'єднання для перевірки живості та створює його чергу відправки. Повертає словник сесії"""
+        session = {'addr': addr, 'last_activity': time.monotonic(), 'timer': None,
+                   'outbox': self.create_outbox(client_socket), 'limiter': RateLimiter(self.rate_limits)}
+        self.sessions[client_socket] = session
+        session['timer'] = self.timers.schedule(self.heartbeat_interval, self.check_session, client_socket)
+        return session
+
+    def close_session(self, client_socket):
+        session = self.sessions.pop(client_socket, None)
+        if session is not None:
+            if session['timer'] is not None:
+                session['timer'].cancel()
+            session['outbox'].close()
+
+    def create_outbox(self, client_socket):
+        return Outbox(client_socket, self.outbound_writer, self.outbound_high_water,
+                      self.outbound_policy, self.outbound_overflow)
+
+    def get_outbox(self, client_socket):
+        session = self.sessions.get(client_socket)
+        return session['outbox'] if session is not None else None
+
+    def outbound_overflow(self, outbox, action):
+        """Черга з'єднання переповнена: клієнт не встигає читати"""
+        self.outbound_overflows.labels(action).inc()
+        if action == 'disconnect':
+            session = self.sessions.get(outbox.sock)
+            log.warning('client_too_slow', "🐢 Клієнт {addr} не встигає читати (черга понад {limit} байтів) - від'єднуємо",
+                        addr=session['addr'] if session else None, limit=outbox.high_water)
+            self.reap_session(outbox.sock)
+
+    def check_session(self, client_socket):
+        """Серцебиття сесії: пінг після тиші, закриття з'єднання, що мовчить довше client_timeout"""
+        session = self.sessions.get(client_socket)
+        if session is None:
+            return
+        idle = time.monotonic() - session['last_activity']
+        if idle >= self.client_timeout:
+            log.info('client_timeout', "⏰ Таймаут з'єднання з {addr}", addr=session['addr'])
+            self.reap_session(client_socket)
+            return
+        if idle >= self.heartbeat_interval:
+            self.ping_client(client_socket)
+        session['timer'] = self.timers.schedule(self.heartbeat_interval, self.check_session, client_socket)
+
+    def reap_session(self, client_socket):
+        """Розриває мертве з'єднання; обробник клієнта прокидається і виконує звичайне від'єднання"""
+        try:
+            client_socket.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+    def close_client(self, client_socket):
+        """
+        Закриття з'єднання під час зупинки сервера. Сам close() не перериває recv обробника в
+        іншому потоці, тож клієнт не дізнався б про розрив; FIN після вже відправлених кадрів
+        будить і клієнта, і обробник
+        """
+        try:
+            client_socket.shutdown(socket.SHUT_WR)
+        except OSError:
+            pass
+        try:
+            client_socket.close()
+        except OSError:
+            pass
+
     def process_message(self, client_socket, message, addr):
         """Обробка повідомлень від клієнтів"""
         msg_type = message.get('type')
 
         if msg_type == 'join':
             self.handle_join(client_socket, message, addr)
+        elif msg_type == 'resume':
+            self.handle_resume(client_socket, message, addr)
+        elif msg_type == 'spectate':
+            self.handle_spectate(client_socket, message, addr)
         elif msg_type == 'ready':
             self.handle_ready(client_socket, message)
         elif msg_type == 'game_action':
             self.handle_game_action(client_socket, message)
+        elif msg_type == 'sync_request':
+            self.handle_sync_request(client_socket)
         elif msg_type == 'disconnect':
-            print(f"📤 Клієнт {addr} відправив сигнал від'єднання")
+            log.debug('client_disconnect_signal', "📤 Клієнт {addr} відправив сигнал від'єднання", addr=addr)
+            # Гравець іде сам - сесію не зберігаємо
+            player_data = self.clients.get(client_socket)
+            if player_data is not None:
+                player_data['leaving'] = True
         elif msg_type == 'ping':
             # Відповідаємо на пінг
             pong_message = {'type': 'pong'}
             self.send_message(client_socket, pong_message)
+        elif msg_type == 'pong':
+            # Відповідь на наш пінг - активність вже враховано при читанні
+            pass
         else:
-            print(f"❓ Невідомий тип повідомлення від {addr}: {msg_type}")
+            log.warning('unknown_message', "❓ Невідомий тип повідомлення від {addr}: {msg_type}",
+                        addr=addr, msg_type=msg_type)
 
     def handle_join(self, client_socket, message, addr):
         """Обробка підключення гравця"""
         player_name = message.get('name', f'Player_{len(self.clients)}')
 
         # Перевіряємо, чи не підключений вже цей клієнт
-        if client_socket in self.clients:
-            print(f"⚠️ Клієнт {addr} вже підключений")
+        if client_socket in self.clients or client_socket in self.spectators:
+            log.warning('duplicate_join', "⚠️ Клієнт {addr} вже підключений", addr=addr)
             return
 
         # Створюємо дані гравця
         player_data = {
             'socket': client_socket,
             'name': player_name,
-            'id': len(self.clients),
+            'id': self.player_ids.next_id(),
             'address': addr,
             'game_id': None,
             'ready': False,
-            'join_time': time.time()
+            'join_time': time.time(),
+            # Формат кадрів для відповідей цьому клієнту
+            'codec': choose_codec(message.get('codecs'))
         }
+        self.start_replay(player_data)
 
         self.clients[client_socket] = player_data
-        self.waiting_players.append(client_socket)
+        self.waiting_players.push(client_socket)
 
-        print(f"👤 Гравець '{player_name}' приєднався (адреса: {addr})")
-        print(f"📊 Гравців в черзі: {len(self.waiting_players)}, Активних ігор: {len(self.games)}")
+        log.info('player_joined', "👤 Гравець '{name}' приєднався (адреса: {addr}). Гравців в черзі: {waiting}",
+                 name=player_name, addr=addr, waiting=len(self.waiting_players))
 
         # Відправляємо підтвердження
         response = {
             'type': 'join_success',
             'player_id': player_data['id'],
-            'name': player_name
+            'name': player_name,
+            'codec': player_data['codec'].name,
+            'resume_token': player_data['resume_token']
         }
         self.send_message(client_socket, response)
 
         # Перевіряємо, чи можна створити гру
         self.check_for_game_creation()
+        self.report_waiting()
+
+    def start_replay(self, player_data, token=None, last_seq=0, report=True):
+        """Стан відновлення сесії гравця: токен, буфер відправлених кадрів, блокування відправки"""
+        player_data['connected'] = True
+        player_data['send_lock'] = threading.Lock()  # Номер кадру та порядок відправки збігаються
+        player_data['replay'] = ReplayBuffer(self.replay_buffer_size, last_seq)
+        player_data['resume_token'] = token or new_resume_token()
+        player_data['resume_timer'] = None
+        self.resume_tokens[player_data['resume_token']] = player_data
+        if self.cluster and report:
+            self.cluster.report_session(player_data['resume_token'], opened=True)
+
+    def forget_resume_token(self, player_data):
+        """Сесію більше не відновити на цьому воркері"""
+        token = player_data['resume_token']
+        if self.resume_tokens.pop(token, None) is not None and self.cluster and self.running:
+            # Під час зупинки координатор і так забуде всі сесії воркера
+            self.cluster.report_session(token, opened=False)
+
+    def handle_resume(self, client_socket, message, addr):
+        """
+        Перепідключення з токеном: новий сокет замінює старий, пропущені кадри відтворюються.
+        У кластері перепідключення може потрапити на інший воркер - тоді сокет передається
+        власнику сесії через координатора (див. route_resume).
+        """
+        token = message.get('token')
+        last_seq = message.get('last_mseq')
+        if not isinstance(last_seq, int):
+            last_seq = 0
+
+        with self.resume_lock:
+            player_data = self.resume_tokens.get(token) if isinstance(token, str) else None
+            if player_data is None and self.cluster and isinstance(token, str) and client_socket not in self.clients:
+                session = self.sessions.get(client_socket)
+                if session is not None and not session.get('resume_routed'):
+                    # Обробник передасть сокет, щойно дочитає поточну порцію кадрів
+                    session['route_resume'] = message
+                    return
+            if player_data is None or client_socket in self.clients:
+                self.sessions_resumed.labels('rejected').inc()
+                log.info('resume_rejected', "🚫 Невідомий або прострочений токен сесії від {addr}", addr=addr)
+                self.send_message(client_socket, {'type': 'resume_failed', 'message': 'Сесію не знайдено'})
+                return
+
+            old_socket = player_data['socket']
+            if player_data['connected']:
+                # Старе з'єднання ще не помічене мертвим (напіввідкрите) - розриваємо його
+                self.reap_session(old_socket)
+            elif player_data['resume_timer'] is not None:
+                player_data['resume_timer'].cancel()
+                player_data['resume_timer'] = None
+
+            self.clients.pop(old_socket, None)
+            self.waiting_players.remove(old_socket)
+            player_data['socket'] = client_socket
+            player_data['address'] = addr
+            game = self.games.get(player_data.get('game_id'))
+            if game is not None:
+                with game['lock']:
+                    game['players'][player_data['position']] = client_socket
+            self.clients[client_socket] = player_data
+
+            with player_data['send_lock']:
+                frames = player_data['replay'].since(last_seq)
+                player_data['connected'] = True
+                response = {
+                    'type': 'resume_success',
+                    'player_id': player_data['id'],
+                    'name': player_data['name'],
+                    'codec': player_data['codec'].name,
+                    'game_id': player_data.get('game_id'),
+                    'replayed': len(frames) if frames is not None else None
+                }
+                self.send_message(client_socket, response)
+                for frame in frames or ():
+                    self.send_frame(client_socket, frame)
+
+        log.info('player_resumed', "🔁 Гравець '{name}' відновив сесію ({addr}), відтворено кадрів: {replayed}",
+                 name=player_data['name'], addr=addr, replayed=response['replayed'])
+
+        if game is None:
+            self.sessions_resumed.labels('replayed').inc()
+            self.waiting_players.push(client_socket)
+            self.check_for_game_creation()
+            self.report_waiting()
+            return
+
+        if frames is None:
+            # Буфер переповнився - замість кадрів надсилаємо повний стан гри
+            self.sessions_resumed.labels('snapshot').inc()
+            self.handle_sync_request(client_socket)
+        else:
+            self.sessions_resumed.labels('replayed').inc()
+        self.notify_opponents(game, client_socket, {'type': 'opponent_reconnected'})
+
+    def suspend_player(self, client_socket, player_data):
+        """Обрив з'єднання: гравець лишається в грі до resume_grace секунд, чекаючи на перепідключення"""
+        with self.resume_lock:
+            if self.clients.get(client_socket) is not player_data:
+                return
+            player_data['connected'] = False
+            player_data['resume_timer'] = self.timers.schedule(
+                self.resume_grace, self.resume_grace_expired, client_socket)
+
+        log.info('player_suspended', "⏸️ Гравець '{name}' втратив з'єднання, чекаємо {grace} с на перепідключення",
+                 name=player_data['name'], grace=self.resume_grace)
+
+        if self.waiting_players.remove(client_socket):
+            self.report_waiting()
+
+        game = self.games.get(player_data.get('game_id'))
+        if game is not None:
+            response = {
+                'type': 'opponent_reconnecting',
+                'message': f"Гравець {player_data['name']} втратив з'єднання",
+                'grace': self.resume_grace
+            }
+            self.notify_opponents(game, client_socket, response)
+
+    def checkpoint_records(self):
+        """Записи контрольної точки: гравці з сесією та ігри, що тривають (див. Checkpoint)"""
+        for player_data in self.clients.values():
+            if player_data.get('leaving'):
+                continue
+            yield ((PLAYER_RECORD, player_data['resume_token']),
+                   (player_data.get('game_id'), player_data.get('position')),
+                   lambda player_data=player_data: (PLAYER_RECORD, pack_player(player_data)))
+        for game in self.games.values():
+            if game['state'] != 'playing':
+                continue
+            yield ((GAME_RECORD, game['id']), (game['seq'], game['moves']),
+                   lambda game=game: (GAME_RECORD, self.pack_game_record(game)))
+
+    def pack_game_record(self, game):
+        """Стан гри для контрольної точки (під блокуванням гри - між ходами)"""
+        with game['lock']:
+            player_ids = [self.clients.get(player_socket, {}).get('id', 0) for player_socket in game['players']]
+            return pack_game(game, player_ids)
+
+    def restore_checkpoint(self):
+        """
+        Відновлення ігор та сесій з контрольної точки після перезапуску.
+        Гравці повертаються без з'єднання (як після обриву зв'язку) і мають resume_grace секунд,
+        щоб відновити сесію своїм токеном.
+        """
+        if self.checkpoint is None:
+            return
+        started = time.perf_counter()
+        players = {}
+        games = []
+        for kind, payload in self.checkpoint.load():
+            if kind == PLAYER_RECORD:
+                record = unpack_player(payload)
+                players[record['id']] = record
+            else:
+                games.append(unpack_game(payload))
+
+        restored = {}  # {id гравця: player_data}
+        for record in players.values():
+            client_socket = DetachedSocket(record['resume_token'])
+            player_data = {
+                'socket': client_socket,
+                'name': record['name'],
+                'id': record['id'],
+                'address': None,
+                'game_id': None,
+                'ready': False,
+                'join_time': record['join_time'],
+                'codec': CODECS.get(record['codec'], JSON_CODEC)
+            }
+            self.start_replay(player_data, record['resume_token'], record['mseq'] + RESTORED_MSEQ_GAP, report=False)
+            player_data['connected'] = False
+            self.clients[client_socket] = player_data
+            restored[record['id']] = player_data
+
+        restored_games = 0
+        game_numbers = []
+        for record in games:
+            seats = [restored.get(player_id) for player_id in record['player_ids']]
+            if None in seats:
+                continue  # Гравця гри в контрольній точці немає - гру не відновити
+            game = self.new_game_data(record['id'], [player_data['socket'] for player_data in seats],
+                                      record['rules'], record['deck_seed'])
+            game.update(state=record['state'], created_time=record['created_time'],
+                        seq=record['seq'], moves=record['moves'])
+            game['view'] = capture_view(game['rules'])
+            if self.journal is not None:
+                # Журнал продовжує гру з відновленого стану (попередній сегмент обірвався на перезапуску)
+                game['journal_id'] = self.journal.game_resumed(game['id'], game['rules'])
+            self.games[game['id']] = game
+            for seat, player_data in enumerate(seats):
+                player_data['game_id'] = game['id']
+                player_data['position'] = seat
+            self.schedule_turn_deadline(game)
+            restored_games += 1
+            number = game['id'][len(self.game_id_prefix):]
+            if game['id'].startswith(self.game_id_prefix) and number.isdigit():
+                game_numbers.append(int(number))
+
+        with self.stats_lock:
+            self.active_games += restored_games
+        # Один таймер на всіх: гравець, що вже відновив сесію, не має запису з DetachedSocket у clients
+        self.timers.schedule(self.resume_grace, self.restored_grace_expired,
+                             [player_data['socket'] for player_data in restored.values()])
+        # Нові ідентифікатори не повинні збігтися з відновленими
+        self.player_ids = IdGenerator(max(players, default=0) + 1)
+        if game_numbers:
+            self.game_ids = IdGenerator(max(game_numbers) + 1)
+
+        if players or games:
+            log.info('checkpoint_restored', "💾 Відновлено з контрольної точки: ігор {games}, гравців {players} за {elapsed} мс",
+                     games=restored_games, players=len(players),
+                     elapsed=round((time.perf_counter() - started) * 1000, 1))
+
+    def restored_grace_expired(self, client_sockets):
+        """Гравці з контрольної точки, що не перепідключились вчасно"""
+        for client_socket in client_sockets:
+            self.resume_grace_expired(client_socket)
+
+    def resume_grace_expired(self, client_socket):
+        """Гравець не перепідключився вчасно - видаляємо його остаточно"""
+        with self.resume_lock:
+            player_data = self.clients.get(client_socket)
+            if player_data is None or player_data['connected']:
+                return
+            player_data['resume_timer'] = None
+            self.sessions_resumed.labels('expired').inc()
+            self.remove_player(client_socket, player_data)
+
+    def notify_opponents(self, game, client_socket, message):
+        """Повідомлення всім іншим гравцям гри"""
+        for player_socket in game['players']:
+            if player_socket != client_socket and player_socket in self.clients:
+                self.send_message(player_socket, message)
 
     def check_for_game_creation(self):
         """Перевіряє, чи можна створити нову гру"""
-        if len(self.waiting_players) >= 2:
-            # Беремо двох гравців з черги
-            player1_socket = self.waiting_players.pop(0)
-            player2_socket = self.waiting_players.pop(0)
-
-            # Перевіряємо, що обидва гравці ще підключені
-            if player1_socket in self.clients and player2_socket in self.clients:
-                # Створюємо гру
-                game_id = f"game_{int(time.time())}"
-                self.create_game(game_id, [player1_socket, player2_socket])
-            else:
-                # Якщо хтось від'єднався, повертаємо інших в чергу
-                if player1_socket in self.clients:
-                    self.waiting_players.insert(0, player1_socket)
-                if player2_socket in self.clients:
-                    self.waiting_players.insert(0, player2_socket)
+        if len(self.waiting_players) < 2:
+            return
+
+        # Забираємо з черги всі пари одразу; від'єднані гравці відкидаються
+        pairs = self.waiting_players.pop_pairs(is_alive=lambda player_socket: player_socket in self.clients)
+
+        # Створюємо ігри поза блокуванням черги
+        for player1_socket, player2_socket in pairs:
+            game_id = self.new_game_id()
+            self.create_game(game_id, [player1_socket, player2_socket])
+
+    def new_game_id(self):
+        """Унікальний ідентифікатор нової гри"""
+        return f"{self.game_id_prefix}{self.game_ids.next_id()}"
+
+    def attach_cluster(self, cluster_link, poll_interval=0.5):
+        """Підключення воркера до координатора кластера"""
+        self.cluster = cluster_link
+        self.poll_interval = poll_interval
+        self.game_id_prefix = f"game_w{cluster_link.worker_id}_"
+        cluster_link.attach(self)
+
+    def report_waiting(self):
+        """Повідомляє координатору кластера кількість гравців у черзі"""
+        if self.cluster:
+            self.cluster.report_waiting(len(self.waiting_players))
+
+    def request_handoff(self, target_worker):
+        """Позначає найдовше очікуючого гравця для передачі іншому воркеру"""
+        client_socket = self.waiting_players.pop()
+        player_data = self.clients.get(client_socket) if client_socket is not None else None
+        if player_data is None:
+            return False
+        # Сокет передасть власний потік-обробник при наступному пробудженні
+        player_data['handoff_to'] = target_worker
+        return True
+
+    def hand_off_if_requested(self, client_socket, decoder):
+        """Передає сокет гравця іншому воркеру, якщо це запитано. True - обробник має завершитись"""
+        player_data = self.clients.get(client_socket)
+        if not player_data or player_data.get('handoff_to') is None:
+            return False
+
+        target_worker = player_data.pop('handoff_to')
+        self.clients.pop(client_socket, None)
+        # Недописані кадри мають дійти до клієнта раніше за кадри нового воркера
+        outbox = self.get_outbox(client_socket)
+        if outbox is not None:
+            outbox.drain(self.poll_interval)
+        try:
+            self.cluster.hand_off(client_socket, player_data, target_worker, bytes(decoder.buffer))
+        except OSError as e:
+            log.error('handoff_failed', "❌ Не вдалося передати гравця '{name}' воркеру {worker}: {error}",
+                      name=player_data['name'], worker=target_worker, error=str(e))
+            self.clients[client_socket] = player_data
+            self.waiting_players.push_front(client_socket)
+            self.report_waiting()
+            return False
+
+        self.forget_resume_token(player_data)
+        log.info('player_handed_off', "🔀 Гравця '{name}' передано воркеру {worker}",
+                 name=player_data['name'], worker=target_worker)
+        # Копія дескриптора вже в іншому процесі, тож закриття не розриває з'єднання
+        try:
+            client_socket.close()
+        except OSError:
+            pass
+        return True
+
+    def route_resume(self, client_socket, session, decoder):
+        """
+        Передає сокет з невідомим воркеру токеном сесії координатору, який знає воркера-власника.
+        Непрочитані кадри їдуть разом із сокетом. True - обробник має завершитись
+        """
+        message = session.pop('route_resume')
+        frames = session.pop('route_pending', ())
+        pending = b''.join(frame if frame[0] == BINARY_MAGIC else frame + FRAME_DELIMITER for frame in frames)
+        session['outbox'].drain(self.poll_interval)
+        try:
+            self.cluster.route_resume(client_socket, message, session['addr'], pending + bytes(decoder.buffer))
+        except OSError as e:
+            # Без координатора воркер однаково зупиняється - відмовляємо, як невідомому токену
+            log.error('resume_route_failed', "❌ Не вдалося передати відновлення сесії координатору: {error}",
+                      error=str(e))
+            session['resume_routed'] = True
+            self.handle_resume(client_socket, message, session['addr'])
+            for frame in frames:
+                if not self.handle_data(client_socket, frame, session['addr']):
+                    return True
+            return False
+
+        log.debug('resume_routed', "🔀 Відновлення сесії від {addr} передано координатору", addr=session['addr'])
+        return True
+
+    def adopt_client(self, client_socket, player_data, pending=b''):
+        """Приймає гравця, переданого іншим воркером кластера"""
+        client_thread = threading.Thread(
+            target=self.handle_client,
+            args=(client_socket, player_data['address'], player_data, pending)
+        )
+        client_thread.daemon = True
+        client_thread.start()
+
+    def adopt_resume(self, client_socket, addr, message, pending=b''):
+        """Приймає перепідключення до сесії цього воркера, що потрапило на інший воркер кластера"""
+        client_thread = threading.Thread(
+            target=self.handle_client,
+            args=(client_socket, addr, None, pending, message)
+        )
+        client_thread.daemon = True
+        client_thread.start()
+
+    def adopt_player(self, client_socket, player_data):
+        """Реєструє прийнятого гравця та ставить його в чергу"""
+        player_data['socket'] = client_socket
+        player_data['id'] = self.player_ids.next_id()
+        player_data['game_id'] = None
+        player_data['ready'] = False
+        self.start_replay(player_data, player_data.get('resume_token'), player_data.get('mseq', 0))
+        self.clients[client_socket] = player_data
+        self.waiting_players.push(client_socket)
+
+        log.info('player_adopted', "👤 Гравець '{name}' прийнятий від іншого воркера", name=player_data['name'])
+        self.check_for_game_creation()
+        self.report_waiting()
 
     def create_game(self, game_id, player_sockets):
         """Створення нової гри"""
-        print(f"🎲 Створення нової гри: {game_id}")
 
         try:
-            # Створюємо колоду
-            deck = Deck()
+            # Готова колода з запасу; правила працюють з ідентифікаторами карт
+            deck_seed, deck_ids = self.deck_pool.take()
+            rules = DurakGame(deck_ids)
 
             # Створюємо гру
-            game_data = {
-                'id': game_id,
-                'players': player_sockets,
-                'deck': deck,
-                'state': 'dealing',  # waiting, dealing, playing, finished
-                'current_attacker': 0,
-                'attack_cards': [],
-                'defense_cards': [],
-                'created_time': time.time()
-            }
-
+            game_data = self.new_game_data(game_id, player_sockets, rules, deck_seed)
             self.games[game_id] = game_data
-            self.active_games += 1
+            with self.stats_lock:
+                self.active_games += 1
+            self.games_created.inc()
 
             # Оновлюємо дані гравців
             player_names = []
@@ -211,118 +942,113 @@ class GameServer:
                     self.clients[socket]['position'] = i
                     player_names.append(self.clients[socket]['name'])
 
-            print(f"👥 Гравці в грі {game_id}: {' vs '.join(player_names)}")
+            log.info('game_created', "🎲 Нова гра {game_id}: {players}", game_id=game_id, players=' vs '.join(player_names),
+                     deck_seed=deck_seed)
 
-            # Повідомляємо гравців про створення гри
-            for i, socket in enumerate(player_sockets):
-                if socket in self.clients:
-                    opponent_socket = player_sockets[1 - i]
-                    opponent_name = self.clients[opponent_socket][
-                        'name'] if opponent_socket in self.clients else "Невідомий"
-
-                    response = {
-                        'type': 'game_created',
-                        'game_id': game_id,
-                        'position': i,
-                        'opponent_name': opponent_name
-                    }
-                    self.send_message(socket, response)
-
-            # Починаємо роздавання карт
+            # Роздаємо карти і надсилаємо кожному гравцеві весь початковий стан одним кадром
             self.deal_initial_cards(game_id)
 
         except Exception as e:
-            print(f"❌ Помилка створення гри: {e}")
+            log.exception('game_create_failed', "❌ Помилка створення гри: {error}", error=str(e))
             # Повертаємо гравців в чергу
             for socket in player_sockets:
                 if socket in self.clients:
-                    self.waiting_players.append(socket)
+                    self.waiting_players.push(socket)
+
+    def new_game_data(self, game_id, player_sockets, rules, deck_seed):
+        """Запис гри в реєстрі games"""
+        return {
+            'id': game_id,
+            'players': player_sockets,
+            'rules': rules,
+            # Дії в одній грі застосовуються послідовно; повторний вхід - кінець гри після ходу (end_game)
+            'lock': threading.RLock(),
+            'state': 'dealing',  # waiting, dealing, playing, finished
+            'created_time': time.time(),
+            'deck_seed': deck_seed,  # deckpool.shuffled_deck(deck_seed) відтворює колоду гри
+            'journal_id': None,  # Номер гри в журналі
+            'moves': 0,  # Лічильник застосованих дій (для дедлайну ходу)
+            'turn_timer': None,
+            'seq': 0,  # Версія стану, відомого гравцям
+            'view': None,  # Стан на момент останньої розсилки (state_sync.GameView)
+            'spectators': set()  # Сокети глядачів; змінюється під блокуванням гри
+        }
 
     def deal_initial_cards(self, game_id):
-        """Роздавання початкових карт"""
+        """Роздавання початкових карт та надсилання стартового пакета гри"""
         if game_id not in self.games:
-            print(f"❌ Гра {game_id} не знайдена для роздавання карт")
+            log.error('game_not_found', "❌ Гра {game_id} не знайдена для роздавання карт", game_id=game_id)
             return
 
         game = self.games[game_id]
-        deck = game['deck']
-
-        print(f"🃏 Роздавання карт для гри {game_id}")
+        rules = game['rules']
 
         try:
-            # Роздаємо по 6 карт кожному гравцеві
-            for round_num in range(6):
-                for player_socket in game['players']:
-                    if player_socket in self.clients and len(deck) > 0:
-                        card = deck.pop()
-
-                        # Відправляємо карту гравцеві
-                        response = {
-                            'type': 'card_dealt',
-                            'card': {
-                                'rank': card.rank,
-                                'suit': card.suit,
-                                'is_trump': card.uber == card.suit
-                            },
-                            'round': round_num + 1
-                        }
-                        if not self.send_message(player_socket, response):
-                            print(f"❌ Не вдалося надіслати карту гравцеві")
-                            return
-
-            # Відправляємо інформацію про козирну карту
-            trump_card = deck.top_card
-            trump_info = {
-                'type': 'trump_card',
-                'card': {
-                    'rank': trump_card.rank,
-                    'suit': trump_card.suit
-                },
-                'trump_suit': deck.uber,
-                'deck_size': len(deck)
-            }
-
-            for player_socket in game['players']:
-                if player_socket in self.clients:
-                    self.send_message(player_socket, trump_info)
-
-            # Визначаємо першого нападника
+            # Визначаємо першого нападника і роздаємо по 6 карт кожному гравцеві
             self.determine_first_attacker(game_id)
+            if self.journal is not None:
+                game['journal_id'] = self.journal.game_started(game_id, rules)
+            hands = rules.deal_initial()
 
             # Змінюємо стан гри
             game['state'] = 'playing'
+            game['view'] = capture_view(rules)
+
+            trump_rank, trump_suit = card_from_id(rules.trump_card)
+            attacker_socket = game['players'][rules.attacker]
+            attacker_name = self.clients[attacker_socket]['name'] if attacker_socket in self.clients else "Невідомий"
 
-            # Повідомляємо про початок гри
+            # Один кадр на гравця: дані гри, рука, козир та хто нападає
             for i, player_socket in enumerate(game['players']):
-                if player_socket in self.clients:
-                    attacker_name = self.clients[game['players'][game['current_attacker']]]['name']
-                    response = {
-                        'type': 'game_started',
-                        'is_attacker': i == game['current_attacker'],
-                        'attacker_name': attacker_name
-                    }
-                    self.send_message(player_socket, response)
+                if player_socket not in self.clients:
+                    continue
 
-            print(f"✅ Гра {game_id} успішно запущена")
+                opponent_socket = game['players'][1 - i]
+                opponent_name = self.clients[opponent_socket][
+                    'name'] if opponent_socket in self.clients else "Невідомий"
+
+                response = {
+                    'type': 'game_start_bundle',
+                    'game_id': game_id,
+                    'position': i,
+                    'opponent_name': opponent_name,
+                    'hand': [card_to_dict(card, trump_suit) for card in hands[i]],
+                    'trump_card': {
+                        'rank': trump_rank,
+                        'suit': trump_suit
+                    },
+                    'trump_suit': trump_suit,
+                    'deck_size': len(rules.deck),
+                    'is_attacker': i == rules.attacker,
+                    'attacker_name': attacker_name,
+                    'seq': game['seq']
+                }
+                if not self.send_message(player_socket, response):
+                    log.warning('start_bundle_failed', "❌ Не вдалося надіслати стартовий пакет гравцеві гри {game_id}",
+                                game_id=game_id)
+                    self.end_game(game_id, "Не вдалося надіслати стартовий пакет")
+                    return
+
+            log.debug('game_started', "✅ Гра {game_id} успішно запущена, нападник - місце {attacker}",
+                      game_id=game_id, attacker=rules.attacker)
+            self.schedule_turn_deadline(game)
 
         except Exception as e:
-            print(f"❌ Помилка при роздаванні карт: {e}")
+            log.exception('deal_failed', "❌ Помилка при роздаванні карт: {error}", error=str(e))
             self.end_game(game_id, "Помилка при роздаванні карт")
 
     def determine_first_attacker(self, game_id):
         """Визначає першого нападника"""
-        import random
         game = self.games.get(game_id)
         if game:
-            game['current_attacker'] = random.randint(0, 1)
-            print(f"🎯 Перший нападник в грі {game_id}: гравець {game['current_attacker']}")
+            game['rules'].attacker = random.randint(0, 1)
 
     def handle_ready(self, client_socket, message):
         """Обробка готовності гравця"""
         if client_socket in self.clients:
             self.clients[client_socket]['ready'] = True
             player_name = self.clients[client_socket]['name']
-            print(f"✅ Гравець {player_name} готовий")
+            log.debug('player_ready', "✅ Гравець {name} готовий", name=player_name)
 
     def handle_game_action(self, client_socket, message):
         """Обробка ігрових дій"""
@@ -341,37 +1067,232 @@ class GameServer:
             return
 
         action = message.get('action')
-        print(f"🎮 Ігрова дія від {player_data['name']}: {action}")
+        data = message.get('data')
+        if not isinstance(data, dict):
+            data = {}
+        log.debug('game_action', "🎮 Ігрова дія від {name}: {action}", name=player_data['name'], action=action)
 
-        # Тут буде логіка обробки ігрових ходів
-        # Поки що просто логуємо
+        game = self.games.get(game_id)
+        if game is None:
+            return
 
-    def send_message(self, client_socket, message):
-        """Відправка повідомлення клієнту"""
+        with game['lock']:
+            seat = player_data['position']
+            try:
+                card = card_id_from_dict(data['card']) if data.get('card') is not None else None
+                target = data.get('target')
+                if target is not None and not isinstance(target, int):
+                    raise RuleError("Некоректний індекс карти на столі")
+                self.apply_action(game, seat, action, card, target)
+            except ValueError as e:
+                # RuleError або некоректна карта - хід відхилено
+                response = {
+                    'type': 'action_rejected',
+                    'action': action,
+                    'message': str(e)
+                }
+                self.send_message(client_socket, response)
+
+    def apply_action(self, game, seat, action, card=None, target=None, forced=False):
+        """Застосування дії під блокуванням гри: розсилка стану, кінець гри, новий дедлайн ходу"""
+        rules = game['rules']
+        result = rules.apply(seat, action, card, target)
+        game['moves'] += 1
+        if game['journal_id'] is not None:
+            self.journal.action(game['journal_id'], seat, action, card, result.get('target', target), forced)
+
+        self.send_game_update(game, seat, action, card, result)
+
+        if rules.finished:
+            self.finish_game(game['id'])
+        else:
+            self.schedule_turn_deadline(game)
+
+    def schedule_turn_deadline(self, game):
+        """Перезапуск таймера ходу гри"""
+        if game['turn_timer'] is not None:
+            game['turn_timer'].cancel()
+        game['turn_timer'] = self.timers.schedule(
+            self.turn_timeout, self.turn_deadline_expired, game['id'], game['moves'])
+
+    def turn_deadline_expired(self, game_id, moves):
+        """Гравець не походив вчасно - сервер виконує дію за замовчуванням за нього"""
+        game = self.games.get(game_id)
+        if game is None:
+            return
+        with game['lock']:
+            rules = game['rules']
+            if game['moves'] != moves or rules.finished:
+                return
+            seat = rules.defender if rules.unbeaten_count else rules.attacker
+            action, card, target = rules.default_action(seat)
+            log.info('turn_timeout', "⏰ Час ходу в грі {game_id} вичерпано: місце {seat} - {action}",
+                     game_id=game_id, seat=seat, action=action)
+            self.apply_action(game, seat, action, card, target, forced=True)
+
+    def send_game_update(self, game, seat, action, card, result):
+        """Розсилає обом гравцям застосовану дію та дельту стану з новою версією"""
+        rules = game['rules']
+        trump_suit = rules.trump_suit
+        previous = game['view']
+        current = capture_view(rules)
+        game['view'] = current
+        game['seq'] += 1
+
+        for i, player_socket in enumerate(game['players']):
+            if player_socket not in self.clients:
+                continue
+            response = {
+                'type': 'state_delta',
+                'seq': game['seq'],
+                'seat': seat,
+                'action': action,
+                'card': card_to_dict(card, trump_suit) if card is not None else None,
+                'target': result.get('target'),
+                'bout_over': result.get('bout_over')
+            }
+            response.update(build_delta(previous, current, i, trump_suit))
+            self.send_message(player_socket, response)
+
+        if game['spectators']:
+            update = {
+                'type': 'spectator_update',
+                'seq': game['seq'],
+                'seat': seat,
+                'action': action,
+                'card': card_to_dict(card, trump_suit) if card is not None else None,
+                'target': result.get('target'),
+                'bout_over': result.get('bout_over')
+            }
+            update.update(build_public_delta(previous, current, trump_suit))
+            self.broadcast_to_spectators(game, update)
+
+    def handle_sync_request(self, client_socket):
+        """Клієнт пропустив версію стану - надсилаємо повний знімок"""
+        player_data = self.clients.get(client_socket)
+        game = self.games.get(player_data.get('game_id')) if player_data else None
+        if game is None or game['view'] is None:
+            self.send_message(client_socket, {'type': 'error', 'message': 'Ви не в грі'})
+            return
+
+        # Під блокуванням гри: знімок не може обігнати дельту наступної версії
+        with game['lock']:
+            snapshot = build_snapshot(game['view'], player_data['position'], game['seq'], game['rules'].trump_suit)
+            self.send_message(client_socket, snapshot)
+        log.debug('state_resync', "🔄 Повний знімок стану гри {game_id} для {name} (версія {seq})",
+                  game_id=game['id'], name=player_data['name'], seq=snapshot['seq'])
+
+    def finish_game(self, game_id):
+        """Завершення гри за правилами: оголошення дурня"""
+        game = self.games.get(game_id)
+        if game is None:
+            return
+
+        rules = game['rules']
+        game['state'] = 'finished'
+        loser_name = None
+        if rules.loser is not None:
+            loser_socket = game['players'][rules.loser]
+            loser_name = self.clients.get(loser_socket, {}).get('name', 'Невідомий')
+
+        for i, player_socket in enumerate(game['players']):
+            player_data = self.clients.get(player_socket)
+            if player_data is None:
+                continue
+            player_data['game_id'] = None
+            response = {
+                'type': 'game_over',
+                'loser': rules.loser,
+                'loser_name': loser_name,
+                'you_lost': rules.loser == i
+            }
+            self.send_message(player_socket, response)
+
+        self.broadcast_to_spectators(game, {'type': 'game_over', 'loser': rules.loser, 'loser_name': loser_name})
+
+        reason = f"Дурень - {loser_name}" if loser_name else "Нічия"
+        self.end_game(game_id, reason, outcome='completed')
+
+    def encode_message(self, client_socket, message):
+        """Серіалізація повідомлення у формат, узгоджений з клієнтом"""
+        player_data = self.clients.get(client_socket)
+        codec = player_data['codec'] if player_data else JSON_CODEC
+        return self.encode_frame(codec, message)
+
+    def encode_frame(self, codec, message):
+        """Кадр повідомлення у форматі codec. None - повідомлення не вміщується у формат"""
         try:
-            json_message = json.dumps(message, ensure_ascii=False) + '\n'
-            client_socket.send(json_message.encode('utf-8'))
-            return True
-        except BrokenPipeError:
-            print(f"🔌 З'єднання розірвано при відправці повідомлення")
+            return codec.encode(message)
+        except (ProtocolError, struct.error) as e:
+            # Завеликий кадр або значення поза діапазоном полів формату - не привід валити обробник
+            log.error('encode_failed', "❌ Не вдалося закодувати '{msg_type}' у формат {codec}: {error}",
+                      msg_type=message.get('type'), codec=codec.name, error=str(e))
+            return None
+
+    def send_message(self, client_socket, message):
+        """
+        Відправка повідомлення клієнту.
+        Повідомлення гравцю отримує номер 'mseq' і зберігається в буфері відтворення сесії -
+        навіть якщо гравець зараз без з'єднання і чекає на перепідключення.
+        """
+        started = time.perf_counter()
+        player_data = self.clients.get(client_socket)
+        if player_data is None:
+            spectator = self.spectators.get(client_socket)
+            if spectator is not None:
+                return self.send_frame(client_socket, self.encode_frame(spectator['codec'], message))
+        if player_data is None or message.get('type') in UNNUMBERED_TYPES:
+            sent = self.send_frame(client_socket, self.encode_message(client_socket, message))
+        else:
+            with player_data['send_lock']:
+                replay = player_data['replay']
+                seq = replay.next_seq()
+                frame = self.encode_frame(player_data['codec'], dict(message, mseq=seq))
+                if frame is None:
+                    return False
+                replay.record(seq, frame)
+                sent = player_data['connected'] and self.send_frame(client_socket, frame)
+        if sent:
+            self.send_latency.observe(time.perf_counter() - started)
+        return sent
+
+    def send_frame(self, client_socket, frame):
+        """Готовий кадр у чергу відправки з'єднання (без очікування на клієнта)"""
+        if frame is None:
             return False
-        except Exception as e:
-            print(f"❌ Помилка відправки повідомлення: {e}")
+        outbox = self.get_outbox(client_socket)
+        if outbox is None:
+            log.debug('send_no_session', "🔌 Відправка на вже закрите з'єднання")
             return False
+        return outbox.push(frame)
 
     def disconnect_client(self, client_socket, addr):
-        """Від'єднання клієнта"""
-        if client_socket not in self.clients:
-            return
+        """Від'єднання клієнта: обрив зв'язку гравця лише призупиняє його сесію"""
+        self.close_session(client_socket)
+        player_data = self.clients.get(client_socket)
+        if player_data is None:
+            self.remove_spectator(client_socket)
+        else:
+            if self.running and self.resume_grace > 0 and not player_data.get('leaving'):
+                self.suspend_player(client_socket, player_data)
+            else:
+                self.remove_player(client_socket, player_data)
 
-        player_data = self.clients[client_socket]
+        # Закриваємо сокет
+        try:
+            client_socket.close()
+        except OSError:
+            pass
+
+    def remove_player(self, client_socket, player_data):
+        """Остаточне видалення гравця: черга очікування, гра, реєстр клієнтів"""
         player_name = player_data['name']
-        print(f"📤 Гравець '{player_name}' від'єднався ({addr})")
+        log.info('player_left', "📤 Гравець '{name}' від'єднався ({addr})", name=player_name, addr=player_data['address'])
 
         # Видаляємо з черги очікування
-        if client_socket in self.waiting_players:
-            self.waiting_players.remove(client_socket)
-            print(f"🚫 Видалено з черги очікування: {player_name}")
+        if self.waiting_players.remove(client_socket):
+            log.debug('player_dequeued', "🚫 Видалено з черги очікування: {name}", name=player_name)
+            self.report_waiting()
 
         # Обробляємо від'єднання в грі
         game_id = player_data.get('game_id')
@@ -379,15 +1300,87 @@ class GameServer:
             self.handle_player_disconnect_in_game(game_id, client_socket)
 
         # Видаляємо клієнта
-        del self.clients[client_socket]
+        self.clients.pop(client_socket, None)
+        self.forget_resume_token(player_data)
 
-        # Закриваємо сокет
-        try:
-            client_socket.close()
-        except:
-            pass
+    def handle_spectate(self, client_socket, message, addr):
+        """Підключення глядача до гри (game_id або будь-яка активна гра)"""
+        if client_socket in self.clients:
+            self.send_message(client_socket, {'type': 'error', 'message': 'Гравець не може бути глядачем'})
+            return
+
+        game_id = message.get('game_id')
+        if game_id is None:
+            game_id = next((key for key, game_data in self.games.items() if game_data['state'] == 'playing'), None)
+        game = self.games.get(game_id) if isinstance(game_id, str) else None
 
-        print(f"📊 Активних клієнтів: {len(self.clients)}, Гравців в черзі: {len(self.waiting_players)}")
+        spectator = self.spectators.get(client_socket)
+        if game is None or game['view'] is None:
+            error_response = {'type': 'error', 'message': 'Гру не знайдено'}
+            if spectator is not None:
+                self.send_message(client_socket, error_response)
+            else:
+                self.send_frame(client_socket, self.encode_frame(choose_codec(message.get('codecs')), error_response))
+            return
+
+        if spectator is None:
+            spectator = {'address': addr, 'codec': choose_codec(message.get('codecs')), 'game_id': None}
+            # Повільного глядача не чекаємо і не пропускаємо йому кадри - лише від'єднуємо
+            outbox = self.get_outbox(client_socket)
+            if outbox is not None:
+                outbox.high_water = self.spectator_buffer_limit
+                outbox.policy = 'disconnect'
+            self.spectators[client_socket] = spectator
+        else:
+            self.detach_spectator(client_socket, spectator)
+
+        with game['lock']:
+            rules = game['rules']
+            trump_rank, trump_suit = card_from_id(rules.trump_card)
+            response = build_public_snapshot(game['view'], game['seq'], trump_suit)
+            response.update({
+                'type': 'spectate_success',
+                'game_id': game_id,
+                'players': [self.clients.get(player_socket, {}).get('name', 'Невідомий')
+                            for player_socket in game['players']],
+                'trump_card': {'rank': trump_rank, 'suit': trump_suit},
+                'trump_suit': trump_suit
+            })
+            spectator['game_id'] = game_id
+            game['spectators'].add(client_socket)
+            self.send_message(client_socket, response)
+
+        log.info('spectator_joined', "👀 Глядач {addr} дивиться гру {game_id} (глядачів гри: {count})",
+                 addr=addr, game_id=game_id, count=len(game['spectators']))
+
+    def broadcast_to_spectators(self, game, message):
+        """Розсилка події глядачам гри: повідомлення кодується один раз для кожного формату"""
+        frames = {}
+        for spectator_socket in list(game['spectators']):
+            spectator = self.spectators.get(spectator_socket)
+            if spectator is None:
+                continue
+            codec = spectator['codec']
+            if codec.name not in frames:
+                frames[codec.name] = self.encode_frame(codec, message)
+            self.send_frame(spectator_socket, frames[codec.name])
+
+    def detach_spectator(self, client_socket, spectator):
+        """Глядач перестає дивитися свою поточну гру"""
+        game = self.games.get(spectator['game_id']) if spectator['game_id'] else None
+        spectator['game_id'] = None
+        if game is not None:
+            with game['lock']:
+                game['spectators'].discard(client_socket)
+
+    def remove_spectator(self, client_socket):
+        """Від'єднання глядача. False - це не глядач"""
+        spectator = self.spectators.pop(client_socket, None)
+        if spectator is None:
+            return False
+        self.detach_spectator(client_socket, spectator)
+        log.debug('spectator_left', "👀 Глядач {addr} від'єднався", addr=spectator['address'])
+        return True
 
     def handle_player_disconnect_in_game(self, game_id, disconnected_socket):
         """Обробка від'єднання гравця під час гри"""
@@ -396,7 +1389,8 @@ class GameServer:
             return
 
         disconnected_player = self.clients.get(disconnected_socket, {}).get('name', 'Невідомий')
-        print(f"🎲 Гравець {disconnected_player} від'єднався від гри {game_id}")
+        log.info('player_left_game', "🎲 Гравець {name} від'єднався від гри {game_id}",
+                 name=disconnected_player, game_id=game_id)
 
         # Повідомляємо іншого гравця
         for player_socket in game['players']:
@@ -407,42 +1401,79 @@ class GameServer:
                 }
                 self.send_message(player_socket, response)
 
-                # Повертаємо гравця в чергу очікування
-                if player_socket not in self.waiting_players:
-                    self.waiting_players.append(player_socket)
-                    self.clients[player_socket]['game_id'] = None
-                    self.clients[player_socket]['ready'] = False
+                # Повертаємо гравця в чергу очікування (гравець без з'єднання стане в неї після відновлення)
+                self.clients[player_socket]['game_id'] = None
+                self.clients[player_socket]['ready'] = False
+                if self.clients[player_socket]['connected']:
+                    self.waiting_players.push(player_socket)
+                    self.report_waiting()
 
         # Видаляємо гру
-        self.end_game(game_id, f"Гравець {disconnected_player} від'єднався")
-
-    def end_game(self, game_id, reason=""):
-        """Завершення гри"""
-        if game_id in self.games:
-            del self.games[game_id]
-            self.active_games = max(0, self.active_games - 1)
-            print(f"🏁 Гру {game_id} завершено. Причина: {reason}")
-            print(f"📊 Активних ігор: {self.active_games}")
+        self.end_game(game_id, f"Гравець {disconnected_player} від'єднався", outcome='abandoned')
+
+    def end_game(self, game_id, reason="", outcome='aborted'):
+        """Завершення гри; outcome - мітка для метрики завершених ігор"""
+        game = self.games.pop(game_id, None)
+        if game is not None:
+            if game['turn_timer'] is not None:
+                game['turn_timer'].cancel()
+            with self.stats_lock:
+                self.active_games = max(0, self.active_games - 1)
+            self.games_finished.labels(outcome).inc()
+            if game['journal_id'] is not None:
+                self.journal.game_ended(game['journal_id'], outcome, game['rules'].loser)
+
+            # Глядачі лишаються підключеними і можуть обрати іншу гру
+            with game['lock']:
+                self.broadcast_to_spectators(game, {'type': 'spectate_ended', 'game_id': game_id, 'reason': reason})
+                for spectator_socket in game['spectators']:
+                    spectator = self.spectators.get(spectator_socket)
+                    if spectator is not None and spectator['game_id'] == game_id:
+                        spectator['game_id'] = None
+                game['spectators'].clear()
+            log.info('game_finished', "🏁 Гру {game_id} завершено. Причина: {reason}. Активних ігор: {active}",
+                     game_id=game_id, reason=reason, outcome=outcome, active=self.active_games)
 
     def cleanup(self):
         """Очищення ресурсів сервера"""
-        print("\n🧹 Очищення ресурсів сервера...")
+        log.info('cleanup_started', "🧹 Очищення ресурсів сервера...")
 
         # Повідомляємо всіх клієнтів про зупинку сервера
         shutdown_message = {
             'type': 'server_shutdown',
             'message': 'Сервер зупиняється'
         }
+        if self.checkpoint is not None:
+            # Стан на момент зупинки - у контрольну точку; клієнти відновлять сесії після перезапуску
+            self.checkpoint.close()
+            # Ігри продовжаться після перезапуску (запис RESUME у журналі), тож обрив з'єднань
+            # під час зупинки не повинен записати їм кінець
+            for game in self.games.values():
+                game['journal_id'] = None
+            shutdown_message = {
+                'type': 'server_restarting',
+                'message': 'Сервер перезапускається',
+                'retry_after': 1
+            }
 
         for client_socket in list(self.clients.keys()):
             self.send_message(client_socket, shutdown_message)
-            try:
-                client_socket.close()
-            except:
-                pass
+            self.close_client(client_socket)
+
+        for client_socket in self.spectators.keys():
+            self.send_message(client_socket, shutdown_message)
+            self.close_client(client_socket)
 
         # Очищуємо дані
+        self.timers.stop()
+        self.deck_pool.stop()
+        if self.journal is not None:
+            self.journal.close()
+        self.outbound_writer.stop()
         self.clients.clear()
+        self.resume_tokens.clear()
+        self.spectators.clear()
+        self.sessions.clear()
         self.waiting_players.clear()
         self.games.clear()
 
@@ -452,11 +1483,15 @@ class GameServer:
         except:
             pass
 
-        print("✅ Ресурси сервера очищено")
+        if self.metrics_endpoint is not None:
+            self.metrics_endpoint.stop()
+            self.metrics_endpoint = None
+
+        log.info('cleanup_finished', "✅ Ресурси сервера очищено")
 
     def stop(self):
         """Зупинка сервера"""
-        print("\n🛑 Отримано сигнал зупинки сервера...")
+        log.info('server_stopping', "🛑 Отримано сигнал зупинки сервера...")
         self.running = False
         self.cleanup()
 
@@ -503,6 +1538,17 @@ class GameServer:
 
         print()
 
+    def print_metrics(self):
+        """Виведення метрик сервера"""
+        print("\n" + "=" * 50)
+        print("📈 МЕТРИКИ СЕРВЕРА")
+        print("=" * 50)
+        for line in self.metrics.summary_lines():
+            print(f"  {line}")
+        if self.metrics_endpoint is not None:
+            print(f"\n🌐 Prometheus: http://{self.metrics_endpoint.host}:{self.metrics_endpoint.port}/metrics")
+        print("=" * 50)
+
 
 if __name__ == '__main__':
     server = GameServer()
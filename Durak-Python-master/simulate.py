@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+Безголовий симулятор для вимірювання продуктивності ігрової логіки.
+Грає N повних ігор між ботами в процесі - без pygame та сокетів.
+Використання: python simulate.py [--games N] [--processes P] [--seed S] [--alloc-sample K]
+                          [--bots simple,mcts] [--budget MS] [--search-workers W]
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import ismcts
+from non_playable_character import mctsBot, simpleBot
+from rules import CARD_COUNT, DurakGame
+
+MAX_MOVES = 10000  # Запобіжник від нескінченної гри
+BOT_KINDS = ('simple', 'mcts')
+
+
+def make_bots(kinds=('simple', 'simple'), time_budget=ismcts.DEFAULT_TIME_BUDGET, pool=None, workers=None):
+    """Боти для місць 0 та 1 за назвами з BOT_KINDS"""
+    bots = []
+    for seat, kind in enumerate(kinds):
+        if kind == 'mcts':
+            bots.append(mctsBot(f"bot_{seat}", seat, time_budget, pool=pool, workers=workers, seed=seat))
+        else:
+            bots.append(simpleBot(f"bot_{seat}", seat))
+    return tuple(bots)
+
+
+def play_game(seed, bots=None):
+    """Одна повна гра між ботами. Повертає (кількість ходів, місце дурня)"""
+    rng = random.Random(seed)
+    deck_ids = list(range(CARD_COUNT))
+    rng.shuffle(deck_ids)
+
+    game = DurakGame(deck_ids, first_attacker=rng.randint(0, 1))
+    game.deal_initial()
+    if bots is None:
+        bots = (simpleBot("bot_0", 0), simpleBot("bot_1", 1))
+
+    moves = 0
+    while not game.finished:
+        # Поки є неперебиті карти - хід захисника, інакше нападника
+        seat = game.defender if game.unbeaten_count else game.attacker
+        action, card, target = bots[seat].choose_action(game, seat)
+        game.apply(seat, action, card, target)
+        moves += 1
+        if moves >= MAX_MOVES:
+            raise RuntimeError(f"Гра з seed={seed} не завершилась за {MAX_MOVES} ходів")
+
+    return moves, game.loser
+
+
+def play_batch(seeds, kinds=('simple', 'simple'), time_budget=ismcts.DEFAULT_TIME_BUDGET, search_workers=0):
+    """Серія ігор. Повертає (ігор, ходів, нічиїх, [поразок місця 0, поразок місця 1])"""
+    pool = ismcts.make_pool(search_workers) if search_workers else None
+    try:
+        bots = make_bots(kinds, time_budget, pool, search_workers)
+        moves = 0
+        draws = 0
+        losses = [0, 0]
+        for seed in seeds:
+            game_moves, loser = play_game(seed, bots)
+            moves += game_moves
+            if loser is None:
+                draws += 1
+            else:
+                losses[loser] += 1
+    finally:
+        if pool is not None:
+            pool.terminate()
+    return len(seeds), moves, draws, losses
+
+
+def measure_allocations(seeds):
+    """Середній пік пам'яті, виділеної за одну гру (tracemalloc), у байтах"""
+    bots = (simpleBot("bot_0", 0), simpleBot("bot_1", 1))
+    peak_total = 0
+    tracemalloc.start()
+    try:
+        for seed in seeds:
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+            play_game(seed, bots)
+            peak_total += tracemalloc.get_traced_memory()[1] - baseline
+    finally:
+        tracemalloc.stop()
+    return peak_total / max(len(seeds), 1)
+
+
+def split_seeds(seeds, parts):
+    """Розбиття seed-ів на приблизно рівні частини для процесів"""
+    return [seeds[index::parts] for index in range(parts) if seeds[index::parts]]
+
+
+def run_simulation(games, processes=1, seed=0, kinds=('simple', 'simple'),
+                   time_budget=ismcts.DEFAULT_TIME_BUDGET, search_workers=0):
+    """Запуск симуляції. Повертає словник з результатами"""
+    seeds = list(range(seed, seed + games))
+    start = time.perf_counter()
+    if processes > 1:
+        with multiprocessing.Pool(processes) as pool:
+            results = pool.starmap(play_batch, [(part, kinds, time_budget)
+                                                for part in split_seeds(seeds, processes)])
+    else:
+        results = [play_batch(seeds, kinds, time_budget, search_workers)]
+    elapsed = time.perf_counter() - start
+
+    played = sum(result[0] for result in results)
+    moves = sum(result[1] for result in results)
+    draws = sum(result[2] for result in results)
+    return {
+        'games': played,
+        'moves': moves,
+        'draws': draws,
+        'losses': [sum(result[3][seat] for result in results) for seat in (0, 1)],
+        'processes': processes,
+        'elapsed': elapsed,
+        'games_per_sec': played / elapsed if elapsed else 0.0,
+        'moves_per_sec': moves / elapsed if elapsed else 0.0,
+        'moves_per_game': moves / played if played else 0.0,
+    }
+
+
+def parse_args(argv=None):
+    """Розбір аргументів командного рядка"""
+    parser = argparse.ArgumentParser(description="Безголовий симулятор гри Дурак")
+    parser.add_argument('--games', type=int, default=10000, help="кількість ігор")
+    parser.add_argument('--processes', type=int, default=1,
+                        help="кількість процесів (0 - за кількістю ядер)")
+    parser.add_argument('--seed', type=int, default=0, help="початковий seed тасування")
+    parser.add_argument('--alloc-sample', type=int, default=100,
+                        help="скільки ігор окремо прогнати під tracemalloc (0 - не вимірювати)")
+    parser.add_argument('--bots', default='simple,simple',
+                        help=f"боти на місцях 0 та 1 через кому ({', '.join(BOT_KINDS)})")
+    parser.add_argument('--budget', type=float, default=ismcts.DEFAULT_TIME_BUDGET * 1000,
+                        help="час на хід mcts-бота, мс")
+    parser.add_argument('--search-workers', type=int, default=0,
+                        help="процесів root-parallel пошуку mcts-бота (лише з --processes 1)")
+    args = parser.parse_args(argv)
+
+    if args.games < 1:
+        parser.error("--games має бути не менше 1")
+    if args.processes < 0:
+        parser.error("--processes не може бути від'ємним")
+    if args.processes == 0:
+        args.processes = os.cpu_count() or 1
+    args.bots = tuple(kind.strip() for kind in args.bots.split(','))
+    if len(args.bots) != 2 or any(kind not in BOT_KINDS for kind in args.bots):
+        parser.error(f"--bots - дві назви з {', '.join(BOT_KINDS)} через кому")
+    if args.budget <= 0:
+        parser.error("--budget має бути додатним")
+    if args.search_workers < 0:
+        parser.error("--search-workers не може бути від'ємним")
+    if args.search_workers and args.processes > 1:
+        # Процеси пулу симуляції - демонічні й не можуть мати власних дочірніх процесів
+        parser.error("--search-workers можна використовувати лише з --processes 1")
+    return args
+
+
+def main():
+    args = parse_args()
+
+    print("=" * 50)
+    print("🤖 СИМУЛЯЦІЯ ІГОР ДУРАК")
+    print("=" * 50)
+    print(f"🎮 Ігор: {args.games}, процесів: {args.processes}, seed: {args.seed}")
+    print(f"🤖 Боти: {args.bots[0]} проти {args.bots[1]}")
+
+    stats = run_simulation(args.games, args.processes, args.seed, args.bots, args.budget / 1000,
+                           args.search_workers)
+
+    print(f"⏱️  Час: {stats['elapsed']:.2f} с")
+    print(f"🏁 Ігор за секунду: {stats['games_per_sec']:.1f}")
+    print(f"🃏 Ходів за секунду: {stats['moves_per_sec']:.0f}")
+    print(f"📏 Ходів на гру: {stats['moves_per_game']:.1f}")
+    print(f"🤝 Нічиїх: {stats['draws']}")
+    print(f"🤡 Дурнів: {args.bots[0]} (місце 0) - {stats['losses'][0]}, "
+          f"{args.bots[1]} (місце 1) - {stats['losses'][1]}")
+
+    if args.alloc_sample > 0:
+        # Окремий прохід: tracemalloc сповільнює гру і спотворив би швидкість
+        sample = list(range(args.seed, args.seed + min(args.alloc_sample, args.games)))
+        peak = measure_allocations(sample)
+        print(f"🧠 Виділено пам'яті на гру (пік): {peak / 1024:.1f} КБ (вибірка {len(sample)} ігор)")
+    print("=" * 50)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,175 @@
+"""
+Синхронізація стану гри дельтами з номерами версій.
+Сервер пам'ятає, що гравці вже знають (GameView), і після кожного ходу надсилає лише
+змінені поля ('state_delta') з номером версії гри 'seq'. Клієнт застосовує дельту, якщо її
+номер рівно на одиницю більший за його власний; при пропуску версії він просить повний
+знімок ('sync_request') і отримує 'state_snapshot'.
+
+Поля дельти (кожне - лише якщо змінилося):
+    table_len          - довжина столу; клієнт спершу обрізає стіл до неї
+    table_set          - [[індекс, атака, захист або None], ...] для нових та змінених пар
+    hand_add, hand_remove - карти, що додались до руки гравця або пішли з неї
+    opponent_hand_size, deck_size, is_attacker
+
+Глядачі отримують публічну дельту ('spectator_update'): стіл, hand_sizes, deck_size, attacker.
+"""
+from cardset import iter_ids
+from protocol import card_to_dict
+
+
+class GameView:
+    """Стан гри на момент останньої розсилки: стіл, маски рук, розмір колоди, нападник"""
+    __slots__ = ('table', 'hand_masks', 'deck_size', 'attacker')
+
+    def __init__(self, table, hand_masks, deck_size, attacker):
+        self.table = table
+        self.hand_masks = hand_masks
+        self.deck_size = deck_size
+        self.attacker = attacker
+
+
+def capture_view(rules):
+    """Знімок стану правил, потрібний для наступної дельти"""
+    return GameView(
+        [tuple(pair) for pair in rules.table],
+        (rules.hands[0].mask, rules.hands[1].mask),
+        len(rules.deck),
+        rules.attacker
+    )
+
+
+def _pair_to_list(index, pair, trump_suit):
+    attack, defense = pair
+    return [index, card_to_dict(attack, trump_suit),
+            card_to_dict(defense, trump_suit) if defense is not None else None]
+
+
+def _table_delta(previous, current, trump_suit):
+    """Зміни столу: table_len та нові або змінені пари"""
+    delta = {}
+    old_table, new_table = previous.table, current.table
+    common = min(len(old_table), len(new_table))
+    changed = [_pair_to_list(index, new_table[index], trump_suit)
+               for index in range(len(new_table))
+               if index >= common or old_table[index] != new_table[index]]
+    if len(old_table) != len(new_table) or changed:
+        delta['table_len'] = len(new_table)
+        if changed:
+            delta['table_set'] = changed
+    return delta
+
+
+def build_delta(previous, current, seat, trump_suit):
+    """Змінені між двома знімками поля з погляду гравця на місці seat"""
+    delta = _table_delta(previous, current, trump_suit)
+
+    old_hand, new_hand = previous.hand_masks[seat], current.hand_masks[seat]
+    if old_hand != new_hand:
+        added = new_hand & ~old_hand
+        removed = old_hand & ~new_hand
+        if added:
+            delta['hand_add'] = [card_to_dict(cid, trump_suit) for cid in iter_ids(added)]
+        if removed:
+            delta['hand_remove'] = [card_to_dict(cid, trump_suit) for cid in iter_ids(removed)]
+
+    opponent_size = current.hand_masks[1 - seat].bit_count()
+    if previous.hand_masks[1 - seat].bit_count() != opponent_size:
+        delta['opponent_hand_size'] = opponent_size
+    if previous.deck_size != current.deck_size:
+        delta['deck_size'] = current.deck_size
+    if previous.attacker != current.attacker:
+        delta['is_attacker'] = current.attacker == seat
+    return delta
+
+
+def build_snapshot(view, seat, seq, trump_suit):
+    """Повний стан гри з погляду гравця на місці seat ('state_snapshot')"""
+    return {
+        'type': 'state_snapshot',
+        'seq': seq,
+        'table': [_pair_to_list(index, pair, trump_suit)[1:] for index, pair in enumerate(view.table)],
+        'hand': [card_to_dict(cid, trump_suit) for cid in iter_ids(view.hand_masks[seat])],
+        'opponent_hand_size': view.hand_masks[1 - seat].bit_count(),
+        'deck_size': view.deck_size,
+        'is_attacker': view.attacker == seat
+    }
+
+
+def build_public_delta(previous, current, trump_suit):
+    """Змінені поля для глядачів: замість карт у руках - лише їхня кількість (hand_sizes)"""
+    delta = _table_delta(previous, current, trump_suit)
+    hand_sizes = [mask.bit_count() for mask in current.hand_masks]
+    if [mask.bit_count() for mask in previous.hand_masks] != hand_sizes:
+        delta['hand_sizes'] = hand_sizes
+    if previous.deck_size != current.deck_size:
+        delta['deck_size'] = current.deck_size
+    if previous.attacker != current.attacker:
+        delta['attacker'] = current.attacker
+    return delta
+
+
+def build_public_snapshot(view, seq, trump_suit):
+    """Повний публічний стан гри для глядача"""
+    return {
+        'seq': seq,
+        'table': [_pair_to_list(index, pair, trump_suit)[1:] for index, pair in enumerate(view.table)],
+        'hand_sizes': [mask.bit_count() for mask in view.hand_masks],
+        'deck_size': view.deck_size,
+        'attacker': view.attacker
+    }
+
+
+def _card_key(card):
+    return card['rank'], card['suit']
+
+
+def apply_delta(state, message):
+    """
+    Застосування 'state_delta' до стану клієнта - об'єкта з атрибутами seq, table, hand,
+    opponent_hand_size, deck_size та is_attacker.
+    Повертає False, якщо пропущено версію (дельту не застосовано - потрібен знімок).
+    """
+    seq = message.get('seq')
+    if seq is None or state.seq is None:
+        return False
+    if seq <= state.seq:
+        return True  # Повтор уже застосованої версії
+    if seq != state.seq + 1:
+        return False
+
+    if 'table_len' in message:
+        table = state.table[:message['table_len']]
+        for index, attack, defense in message.get('table_set', ()):
+            if index < len(table):
+                table[index] = [attack, defense]
+            else:
+                table.append([attack, defense])
+        state.table = table
+
+    removed = message.get('hand_remove')
+    if removed:
+        removed_keys = {_card_key(card) for card in removed}
+        state.hand = [card for card in state.hand if _card_key(card) not in removed_keys]
+    added = message.get('hand_add')
+    if added:
+        state.hand = state.hand + list(added)
+
+    if 'opponent_hand_size' in message:
+        state.opponent_hand_size = message['opponent_hand_size']
+    if 'deck_size' in message:
+        state.deck_size = message['deck_size']
+    if 'is_attacker' in message:
+        state.is_attacker = message['is_attacker']
+
+    state.seq = seq
+    return True
+
+
+def apply_snapshot(state, message):
+    """Заміна стану клієнта повним знімком"""
+    state.table = [list(pair) for pair in message.get('table', [])]
+    state.hand = list(message.get('hand', []))
+    state.opponent_hand_size = message.get('opponent_hand_size', 0)
+    state.deck_size = message.get('deck_size', 0)
+    state.is_attacker = message.get('is_attacker')
+    state.seq = message.get('seq')
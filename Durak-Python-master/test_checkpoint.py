@@ -0,0 +1,50 @@
+"""
+Перевірка контрольної точки: гра після pack_game/unpack_game допускає ті самі ходи.
+Запуск: python -m unittest test_checkpoint
+"""
+import random
+import unittest
+
+from checkpoint import pack_game, unpack_game
+from rules import CARD_COUNT, DurakGame
+
+
+def round_trip(rules):
+    game = {'id': 'game_1', 'state': 'playing', 'rules': rules, 'seq': 0, 'moves': 0,
+            'created_time': 0.0, 'deck_seed': 0}
+    return unpack_game(pack_game(game, (1, 2)))['rules']
+
+
+class CheckpointRoundTripTest(unittest.TestCase):
+
+    def test_defended_pair_keeps_throw_ins(self):
+        """Ранг карти захисту лишається серед рангів, які можна підкидати"""
+        checked = 0
+        for seed in range(50):
+            rng = random.Random(seed)
+            deck = list(range(CARD_COUNT))
+            rng.shuffle(deck)
+            rules = DurakGame(deck)
+            rules.deal_initial()
+            while not rules.finished:
+                seat = rules.defender if rules.unbeaten_count else rules.attacker
+                action, card, target = rng.choice(rules.legal_actions(seat))
+                rules.apply(seat, action, card, target)
+                if action != 'defend' or rules.finished:
+                    continue
+                restored = round_trip(rules)
+                self.assertEqual(restored.table_ranks, rules.table_ranks)
+                for player in (0, 1):
+                    self.assertEqual(restored.legal_actions(player), rules.legal_actions(player))
+                checked += 1
+        self.assertGreater(checked, 0)
+
+    def test_restored_table(self):
+        """Стіл [[19, 22]]: підкинути можна карти обох рангів"""
+        rules = DurakGame.from_state(0, [0], 0, (1 << 48, 1 << 1), 0, [(19, 22)], 6)
+        self.assertEqual(rules.table_ranks, (1 << 6) | (1 << 9))
+        self.assertIn(('attack', 48, None), round_trip(rules).legal_actions(0))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+"""
+Хешоване колесо таймерів для всіх сесій сервера.
+Таймер потрапляє в слот (deadline mod кількість слотів), тож планування та скасування - O(1),
+а кожен тік переглядає лише один слот. Таймери з дедлайном далі за один оберт
+лишаються в слоті до свого оберту.
+"""
+import math
+import threading
+import time
+
+from eventlog import get_logger
+
+log = get_logger('timers')
+
+
+class Timer:
+    """Запланований виклик; cancel() лише позначає таймер - слот очиститься на своєму тіку"""
+    __slots__ = ('deadline', 'callback', 'args', 'cancelled')
+
+    def __init__(self, deadline, callback, args):
+        self.deadline = deadline
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class TimerWheel:
+    """
+    Колесо з slot_count слотів по tick секунд.
+    advance() виконує всі таймери, чий тік настав; callback викликаються поза блокуванням колеса.
+    """
+
+    def __init__(self, tick=0.5, slot_count=512):
+        self.tick = tick
+        self.slots = [[] for _ in range(slot_count)]
+        self.current_tick = 0
+        self.started = time.monotonic()
+        self.lock = threading.Lock()
+        self.thread = None
+        self.running = False
+
+    def schedule(self, delay, callback, *args):
+        """Виклик callback(*args) не раніше ніж через delay секунд (з точністю до тіку)"""
+        ticks = max(1, math.ceil(delay / self.tick))
+        with self.lock:
+            timer = Timer(self.current_tick + ticks, callback, args)
+            self.slots[timer.deadline % len(self.slots)].append(timer)
+        return timer
+
+    def advance(self, now=None):
+        """Просуває колесо до моменту now. Повертає кількість виконаних таймерів"""
+        if now is None:
+            now = time.monotonic()
+        target = int((now - self.started) / self.tick)
+
+        due = []
+        with self.lock:
+            slot_count = len(self.slots)
+            while self.current_tick < target:
+                self.current_tick += 1
+                index = self.current_tick % slot_count
+                slot = self.slots[index]
+                if not slot:
+                    continue
+                pending = []
+                for timer in slot:
+                    if timer.cancelled:
+                        continue
+                    if timer.deadline <= self.current_tick:
+                        due.append(timer)
+                    else:
+                        pending.append(timer)
+                self.slots[index] = pending
+
+        for timer in due:
+            if timer.cancelled:
+                continue
+            try:
+                timer.callback(*timer.args)
+            except Exception as e:
+                log.exception('timer_failed', "❌ Помилка в таймері {callback}: {error}",
+                              callback=getattr(timer.callback, '__name__', timer.callback), error=str(e))
+        return len(due)
+
+    def __len__(self):
+        with self.lock:
+            return sum(1 for slot in self.slots for timer in slot if not timer.cancelled)
+
+    def start(self):
+        """Окремий потік, що просуває колесо кожен тік"""
+        self.running = True
+        self.thread = threading.Thread(target=self.run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def run(self):
+        while self.running:
+            time.sleep(self.tick)
+            self.advance()
+
+    def stop(self):
+        self.running = False